@@ -0,0 +1,404 @@
+"""
+ชั้นฐานข้อมูลแบบ async สำหรับโหมด ASGI (asgi.py) — รัน flow เดียวกับโหมด sync (ดู flows.py)
+
+เลือก driver ด้วย DB_ASYNC_DRIVER:
+  aiomysql   non-blocking จริง (pip install aiomysql) — ค่าเริ่มต้นถ้าติดตั้งไว้
+  thread     ใช้ pool เดิมของ db.py ผ่าน thread pool ขนาดเท่า DB_POOL_SIZE (ไม่ต้องติดตั้งอะไรเพิ่ม)
+  sqlite     SQLite ในเครื่อง สำหรับทดสอบโดยไม่มี MySQL
+             SQLITE_PATH (ค่าเริ่มต้น :memory:) สร้างตารางจาก sql/sqlite_dev.sql ให้อัตโนมัติ
+             แปลง SQL แบบ MySQL ที่ flow ใช้ (%s, IF, GREATEST, DATE_FORMAT, ON DUPLICATE KEY ...) ให้
+
+ทุก driver มี connection() เป็น async context manager คืน connection ที่มี
+  await conn.run(step)     รันคำสั่งหนึ่งคำสั่งของ flow
+  await conn.rollback()
+"""
+import asyncio
+import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, AsyncExitStack
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import db
+import metrics
+import sql_trace
+from flows import Done, BEGIN, COMMIT, DB_UNAVAILABLE, DBUnavailable, execute_step
+
+try:
+    import aiomysql
+except ImportError:          # ไม่บังคับติดตั้ง
+    aiomysql = None
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", ":memory:")
+SQLITE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql", "sqlite_dev.sql")
+
+
+# ---------- aiomysql ----------
+class _AiomysqlConnection:
+    def __init__(self, raw):
+        self._raw = raw
+
+    async def run(self, step):
+        op = step[0]
+        if op == "begin":
+            await self._raw.begin()
+            return None
+        if op == "commit":
+            await self._raw.commit()
+            return None
+        sql, params = step[1], step[2]
+        if params:
+            # PyMySQL ใช้ sql % args → % ตัวอื่น (เช่น '%Y-%m-%d') ต้องเป็น %%
+            sql = re.sub(r"%(?!s)", "%%", sql)
+        async with self._raw.cursor(aiomysql.DictCursor) as cur:
+            if op == "many":
+                await cur.executemany(sql, params)
+                return Done(cur.lastrowid, cur.rowcount)
+            await cur.execute(sql, params or None)
+            if op == "one":
+                return await cur.fetchone()
+            if op == "all":
+                return list(await cur.fetchall())
+            return Done(cur.lastrowid, cur.rowcount)
+
+    async def rollback(self):
+        await self._raw.rollback()
+
+
+class AiomysqlDriver:
+    def __init__(self, config=db.DB_CONFIG, size=db.POOL_SIZE):
+        self.config = config
+        self.size = size
+        self._pool = None
+        self._lock = asyncio.Lock()
+
+    async def _get_pool(self):
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await aiomysql.create_pool(
+                        host=self.config["host"],
+                        user=self.config["user"],
+                        password=self.config["password"],
+                        db=self.config["database"],
+                        charset=self.config.get("charset", "utf8mb4"),
+                        autocommit=True,
+                        minsize=1,
+                        maxsize=self.size,
+                    )
+        return self._pool
+
+    @asynccontextmanager
+    async def connection(self):
+        pool = await self._get_pool()
+        async with pool.acquire() as raw:
+            yield _AiomysqlConnection(raw)
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+
+# ---------- connection แบบ sync ที่เรียกผ่าน thread (driver thread / sqlite) ----------
+class _ThreadedConnection:
+    def __init__(self, cursor, executor=None):
+        self._cursor = cursor
+        self._executor = executor
+
+    async def run(self, step):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, execute_step, self._cursor, step)
+
+    async def rollback(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._cursor.connection.rollback)
+
+
+class ThreadDriver:
+    """
+    ใช้ db.pool เดิม: คำสั่ง SQL รันใน thread pool แยก (ขนาดเท่า pool) event loop จึงไม่ถูก block
+    การรอยืม connection รันใน thread ของ asyncio เอง ไม่แย่ง thread ของคนที่ถือ connection อยู่
+    """
+
+    def __init__(self, pool=None):
+        self._pool = pool or db.pool
+        self._executor = ThreadPoolExecutor(max_workers=self._pool.size, thread_name_prefix="aiodb")
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await asyncio.to_thread(self._pool.connection)
+        cursor = db.PooledCursor(conn, conn.cursor(dictionary=True, traced=False))
+        try:
+            yield _ThreadedConnection(cursor, self._executor)
+        finally:
+            await asyncio.get_running_loop().run_in_executor(self._executor, cursor.close)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+
+# ---------- sqlite ----------
+_SQLITE_REWRITES = [
+    (re.compile(r"\bIF\("), "iif("),
+    (re.compile(r"\bGREATEST\("), "max("),
+    (re.compile(r"\bTIMESTAMPDIFF\((\w+),"), r"TIMESTAMPDIFF('\1',"),
+    (re.compile(r"\bON DUPLICATE KEY UPDATE\b"), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)"), r"excluded.\1"),
+    (re.compile(r"\s+FOR UPDATE\b"), ""),
+]
+
+_PLACEHOLDER_RE = re.compile(r"'(?:[^']|'')*'|%s")
+
+_MYSQL_FORMATS = {"%Y": "%Y", "%m": "%m", "%d": "%d", "%H": "%H", "%i": "%M", "%s": "%S", "%S": "%S"}
+
+
+def _sqlite_sql(sql):
+    for pattern, repl in _SQLITE_REWRITES:
+        sql = pattern.sub(repl, sql)
+    # %s นอกเครื่องหมายคำพูด → ?
+    return _PLACEHOLDER_RE.sub(lambda m: "?" if m.group(0) == "%s" else m.group(0), sql)
+
+
+def _sqlite_param(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, timedelta):
+        seconds = int(value.total_seconds())
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _parse_temporal(value):
+    if value is None:
+        return None
+    text = str(value)
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def _date_format(value, fmt):
+    parsed = _parse_temporal(value)
+    if parsed is None or fmt is None:
+        return None
+    return re.sub(r"%[a-zA-Z]", lambda m: parsed.strftime(_MYSQL_FORMATS.get(m.group(0), m.group(0))), fmt)
+
+
+def _timestampdiff(unit, start, end):
+    a, b = _parse_temporal(start), _parse_temporal(end)
+    if a is None or b is None:
+        return None
+    if unit == "YEAR":
+        return b.year - a.year - ((b.month, b.day) < (a.month, a.day))
+    if unit == "MONTH":
+        return (b.year - a.year) * 12 + b.month - a.month - (b.day < a.day)
+    if unit == "DAY":
+        return (b.date() - a.date()).days
+    return int((b - a).total_seconds() // 60) if unit == "MINUTE" else None
+
+
+def _concat(*args):
+    if any(a is None for a in args):
+        return None
+    return "".join(str(a) for a in args)
+
+
+def _concat_ws(sep, *args):
+    return str(sep).join(str(a) for a in args if a is not None)
+
+
+def _lpad(value, length, pad):
+    if value is None:
+        return None
+    text = str(value)
+    if len(text) >= length:
+        return text[:length]
+    return (str(pad) * length)[:length - len(text)] + text
+
+
+class _SqliteConnectionAdapter:
+    """ให้ sqlite3 connection มี start_transaction / commit / rollback แบบ mysql-connector"""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def start_transaction(self):
+        self._raw.execute("BEGIN")
+
+    def commit(self):
+        if self._raw.in_transaction:
+            self._raw.execute("COMMIT")
+
+    def rollback(self):
+        if self._raw.in_transaction:
+            self._raw.execute("ROLLBACK")
+
+
+class _SqliteCursor:
+    def __init__(self, raw):
+        self.connection = _SqliteConnectionAdapter(raw)
+        self._raw = raw
+        self._cur = None
+
+    def execute(self, sql, params=()):
+        self._cur = self._raw.execute(_sqlite_sql(sql), [_sqlite_param(p) for p in params])
+
+    def executemany(self, sql, seq_of_params):
+        self._cur = self._raw.executemany(_sqlite_sql(sql),
+                                          [[_sqlite_param(p) for p in params] for params in seq_of_params])
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+
+def _dict_row(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class SqliteDriver:
+    """
+    connection เดียว ใช้ทีละคำขอ (asyncio.Lock) — พอสำหรับทดสอบ ไม่ได้มีไว้รับโหลดจริง
+    ค่า DATE / TIME คืนเป็นสตริง (MySQL คืนเป็น date / timedelta)
+    """
+
+    def __init__(self, path=SQLITE_PATH, schema=SQLITE_SCHEMA):
+        self.path = path
+        self.schema = schema
+        self._raw = None
+        self._lock = asyncio.Lock()
+
+    def _open(self):
+        raw = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        raw.row_factory = _dict_row
+        raw.create_function("CONCAT", -1, _concat, deterministic=True)
+        raw.create_function("CONCAT_WS", -1, _concat_ws, deterministic=True)
+        raw.create_function("LPAD", 3, _lpad, deterministic=True)
+        raw.create_function("DATE_FORMAT", 2, _date_format, deterministic=True)
+        raw.create_function("TIME_FORMAT", 2, _date_format, deterministic=True)
+        raw.create_function("TIMESTAMPDIFF", 3, _timestampdiff, deterministic=True)
+        raw.create_function("CURDATE", 0, lambda: date.today().isoformat())
+        raw.create_function("LAST_INSERT_ID", 1, lambda value: value, deterministic=True)
+        raw.create_function("NOW", 0, lambda: datetime.now().isoformat(sep=" ", timespec="seconds"))
+        if self.schema and os.path.exists(self.schema):
+            with open(self.schema, encoding="utf-8") as f:
+                raw.executescript(f.read())
+        return raw
+
+    def execute_script(self, sql):
+        """ใส่ข้อมูลตัวอย่าง / สร้างตารางเพิ่ม (sync, เรียกก่อนเริ่มรับคำขอ)"""
+        if self._raw is None:
+            self._raw = self._open()
+        self._raw.executescript(sql)
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self._lock:
+            if self._raw is None:
+                self._raw = await asyncio.to_thread(self._open)
+            yield _ThreadedConnection(_SqliteCursor(self._raw))
+
+    async def close(self):
+        if self._raw is not None:
+            self._raw.close()
+            self._raw = None
+
+
+def create_driver(name=None):
+    name = (name or os.getenv("DB_ASYNC_DRIVER") or ("aiomysql" if aiomysql else "thread")).lower()
+    if name == "aiomysql":
+        if aiomysql is None:
+            raise RuntimeError("DB_ASYNC_DRIVER=aiomysql แต่ยังไม่ได้ติดตั้ง (pip install aiomysql)")
+        return AiomysqlDriver()
+    if name == "thread":
+        return ThreadDriver()
+    if name == "sqlite":
+        return SqliteDriver()
+    raise RuntimeError(f"ไม่รู้จัก DB_ASYNC_DRIVER={name} (aiomysql / thread / sqlite)")
+
+
+# ---------- ตัวรัน flow แบบ async ----------
+def _trace_step(step, result, elapsed):
+    # บันทึกเองที่นี่ทุก driver (cursor ของ ThreadDriver ปิด trace ไว้ ไม่ให้นับซ้ำ)
+    op, sql, params = step
+    if op == "many":
+        params_count = sum(len(p) for p in params)
+    else:
+        params_count = len(params)
+    if op == "one":
+        rows = 0 if result is None else 1
+    elif op == "all":
+        rows = len(result)
+    else:
+        rows = max(result.rowcount or 0, 0)
+    sql_trace.record(sql, params_count, rows, elapsed)
+
+
+async def run_flow(flow, driver, unavailable=DB_UNAVAILABLE):
+    """เหมือน flows.run_flow แต่รอ I/O แบบ async และรันคำสั่ง call() ใน thread"""
+    loop = asyncio.get_running_loop()
+    async with AsyncExitStack() as stack:
+        conn = None
+        in_tx = False
+        result = error = None
+        try:
+            while True:
+                try:
+                    step = flow.send(result) if error is None else flow.throw(error)
+                except StopIteration as stop:
+                    return stop.value
+                result = error = None
+                try:
+                    if step[0] == "call":
+                        result = await asyncio.to_thread(step[1], *step[2])
+                        continue
+                    if conn is None:
+                        try:
+                            conn = await stack.enter_async_context(driver.connection())
+                        except Exception as e:
+                            print(">>> ยืม connection (async) ไม่สำเร็จ:", e)
+                            flow.close()
+                            if unavailable is None:
+                                raise DBUnavailable()
+                            return unavailable
+                    started = loop.time()
+                    try:
+                        result = await conn.run(step)
+                    finally:
+                        elapsed = loop.time() - started
+                        metrics.add_db_time(elapsed)
+                    if step[0] in ("one", "all", "run", "many"):
+                        _trace_step(step, result, elapsed)
+                    if step is BEGIN:
+                        in_tx = True
+                    elif step is COMMIT:
+                        in_tx = False
+                except DBUnavailable:
+                    raise
+                except Exception as e:
+                    error = e
+        finally:
+            if conn is not None and in_tx:
+                try:
+                    await conn.rollback()
+                except Exception:
+                    pass
@@ -1,34 +1,112 @@
-from flask import Flask, request, jsonify
+import health                      # ก่อนอย่างอื่น: จับเวลาเริ่ม import (ดู health.py)
+from flask import Flask, Response, request, jsonify, stream_with_context
 from bot_routes import bot_bp
 from flask_cors import CORS
-import mysql.connector
 from datetime import date
+import db
+from db import get_cursor
+from schedule_index import schedule, to_minutes, ACTIVE_STATUSES
+from working_hours import hours
+import availability
+import visit_summary
+import cache
+from patient_search import patient_index
+import flows
+import appointment_import
+import payment_settlement
+import change_feed
+import versions
+import metrics
+import sql_trace
+import compression
+from flows import run_flow
+from json_provider import ClinicJSONProvider
 
 app = Flask(__name__)
+app.json = ClinicJSONProvider(app)   # date / timedelta / Decimal จากฐานข้อมูล + orjson (ดู json_provider.py)
 app.register_blueprint(bot_bp)
 CORS(app) 
+db.init_app(app)
+metrics.init_app(app)
+sql_trace.init_app(app)
+health.init_app(app)
+compression.init_app(app)
+metrics.add_gauges("clinic_db_pool", db.pool.stats)
+metrics.add_gauges("clinic_cache", cache.all_stats, label="cache")
+metrics.add_gauges("clinic_feed", change_feed.feed.stats)
+metrics.add_gauges("clinic_startup", health.startup)
 
-try:
-    mydb = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="root",
-        database="clinic_db",
-        autocommit=True,             
-        charset="utf8mb4",
-        use_pure=True
-    )
-    print(">>> เชื่อมต่อฐานข้อมูล MySQL สำเร็จ")
-except Exception as e:
-    print(f">>> เกิดข้อผิดพลาดในการเชื่อมต่อฐานข้อมูล: {e}")
-    mydb = None
-
-
-def get_cursor():
-    """คืน cursor แบบ dictionary=True สำหรับแต่ละคำขอ"""
-    if not mydb:
-        return None
-    return mydb.cursor(dictionary=True)
+
+@app.get("/healthz")
+def healthz():
+    """liveness: process ยังตอบได้ (ไม่แตะ DB)"""
+    body, status = health.liveness()
+    return jsonify(body), status
+
+
+@app.get("/readyz")
+def readyz():
+    """readiness: DB ใช้ได้ + warm-up ดัชนีครบ → 200 ไม่งั้น 503 (ดู health.py)"""
+    body, status = health.readiness()
+    return jsonify(body), status
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """สถิติทั้งหมดแบบ Prometheus text format (ต่อ process) ดู metrics.py"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.get("/db/stats")
+def db_stats():
+    """สถิติของ connection pool (in_use / waits / wait_time ...) สำหรับ monitoring"""
+    return jsonify({'status': 'success', 'data': db.pool.stats()}), 200
+
+
+@app.get("/sql/stats")
+def sql_stats():
+    """คำสั่ง SQL ที่ใช้เวลารวมมากที่สุด (?order=count / max_ms / avg_ms, ?limit=) ดู sql_trace.py"""
+    order = request.args.get("order", "total_ms")
+    if order not in ("total_ms", "count", "max_ms", "avg_ms", "rows", "slow"):
+        return jsonify({'status': 'error', 'message': 'order ต้องเป็น total_ms / count / max_ms / avg_ms / rows / slow'}), 400
+    limit = request.args.get("limit", 50, type=int)
+    return jsonify({'status': 'success', 'data': sql_trace.statements.top(max(1, min(limit, 500)), order)}), 200
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """hit / miss / eviction ของ cache ข้อมูลคนไข้"""
+    return jsonify({'status': 'success', 'data': cache.all_stats()}), 200
+
+
+@app.get("/search/stats")
+def search_stats():
+    """ขนาดดัชนีค้นหาคนไข้"""
+    return jsonify({'status': 'success', 'data': patient_index.stats()}), 200
+
+@app.get("/events")
+def stream_events():
+    """
+    change feed ของใบนัด / การชำระเงินแบบ server-sent events (ใช้แทนการ poll) ดู change_feed.py
+    ?topics= / ?doctor_id= / ?date= / ?status=  และ header Last-Event-ID ตอนต่อใหม่
+    """
+    try:
+        match = change_feed.parse_filter(request.args)
+    except change_feed.BadFilter as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    last_id = change_feed.parse_last_event_id(
+        request.headers.get("Last-Event-ID") or request.args.get("last_event_id"))
+    return Response(stream_with_context(change_feed.sse_stream(match, last_id)),
+                    mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/events/stats")
+def events_stats():
+    """จำนวน event / subscriber ของ change feed และตัวนับเวอร์ชันของ ETag"""
+    data = dict(change_feed.feed.stats(), versions=versions.versions.stats())
+    return jsonify({'status': 'success', 'data': data}), 200
 
 @app.route('/login', methods=['POST'])
 def login():
@@ -91,252 +169,95 @@ def login():
         print("Error during login:", e)
         return jsonify({'status': 'error', 'message': 'เกิดข้อผิดพลาดภายในระบบ'}), 500
 
+def _conditional(key, respond):
+    """
+    GET แบบมี ETag (ดู versions.py): If-None-Match ตรงกับเวอร์ชันปัจจุบัน → 304 ก่อน query ใด ๆ
+    respond() คืน (body, status) หรือ response ของ Flask; key = None → ไม่ทำ ETag
+    """
+    if key is None:
+        rv = respond()
+        return (jsonify(rv[0]), rv[1]) if isinstance(rv[0], dict) else rv
+
+    tag = versions.etag(key, request.query_string)
+    if versions.matches(request.headers.get("If-None-Match"), tag):
+        return Response(status=304, headers={"ETag": tag, "Cache-Control": "no-cache"})
+
+    rv = respond()
+    resp = app.make_response((jsonify(rv[0]), rv[1]) if isinstance(rv[0], dict) else rv)
+    if resp.status_code == 200:
+        resp.headers["ETag"] = tag
+        resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
 @app.get("/patients")
 def list_patients():
-    cur = get_cursor()
-    if not cur:
-        return jsonify({'status':'error','message':'DB error'}), 500
+    """รายชื่อคนไข้ (?q= / ?limit= / ?cursor= / ?fields=) ดู flows.list_patients"""
+    return _conditional(versions.PATIENTS, lambda: run_flow(
+        flows.list_patients(request.args), get_cursor,
+        unavailable=({'status': 'error', 'message': 'DB error'}, 500)))
 
-    q = (request.args.get("q") or "").strip()
-    cur.execute("""
-      SELECT 
-        p.patient_id AS id,
-        CONCAT_WS(' ', p.first_name, p.last_name) AS name,
-        CONCAT('HN', LPAD(p.patient_id,3,'0')) AS hn,
-        TIMESTAMPDIFF(YEAR, p.birth_date, CURDATE()) AS age,
-        p.phone AS tel,
-        COALESCE(DATE_FORMAT(MAX(t.treatment_date),'%Y-%m-%d'), '') AS lastVisit
-      FROM patient p
-      LEFT JOIN treatment t ON t.patient_id = p.patient_id
-      WHERE (%s = '' 
-           OR p.first_name LIKE CONCAT('%',%s,'%') 
-           OR p.last_name  LIKE CONCAT('%',%s,'%')
-           OR CONCAT('HN', LPAD(p.patient_id,3,'0')) LIKE CONCAT('%',%s,'%')
-           OR p.phone LIKE CONCAT('%',%s,'%'))
-      GROUP BY p.patient_id
-      ORDER BY p.patient_id DESC
-    """, (q, q, q, q, q))
-    rows = cur.fetchall()
-    cur.close()
-    return jsonify({'status':'success','data':rows}), 200
 
 @app.route("/patients/<int:pid>/records", methods=["GET"])
 def patient_records(pid):
-    cur = get_cursor()
-    if not cur:
-        return jsonify({'status':'error','message':'DB error'}), 500
-
-    cur.execute("""
-      SELECT 
-        t.treatment_id AS id,
-        DATE_FORMAT(t.treatment_date,'%Y-%m-%d') AS date,
-        t.diagnosis,
-        t.advice AS treatment,
-        CONCAT_WS(' ', d.first_name, d.last_name) AS doctor
-      FROM treatment t
-      JOIN doctor d ON d.doctor_id = t.doctor_id
-      WHERE t.patient_id = %s
-      ORDER BY t.treatment_date DESC, t.treatment_id DESC
-    """, (pid,))
-    rows = cur.fetchall()
-    cur.close()
-    return jsonify({'status':'success','data':rows}), 200
+    """ประวัติการรักษา (ล่าสุดก่อน) ดู flows.patient_records"""
+    return _conditional(versions.records_key(pid), lambda: run_flow(
+        flows.patient_records(pid, request.args), get_cursor,
+        unavailable=({'status': 'error', 'message': 'DB error'}, 500)))
 
 
 @app.post("/treatments")
 def create_treatment():
-    """
-    หมอกดบันทึกการรักษา:
-      - ใช้ appointment_id จาก front
-      - ดึง patient_id / doctor_id จาก appointment
-      - สร้าง treatment
-      - set appointment.status = 'completed'
-      - ถ้ายังไม่มี payment -+ สร้าง payment = unpaid
-    """
-    cur = get_cursor()
-    if not cur:
-        return jsonify({'status': 'error', 'message': 'DB connection error'}), 500
-
+    """หมอกดบันทึกการรักษา (transaction เดียว, รองรับ header Idempotency-Key) ดู flows.create_treatment"""
     data = request.get_json(silent=True) or {}
+    body, status = run_flow(flows.create_treatment(data, request.headers.get("Idempotency-Key")),
+                            get_cursor)
+    return jsonify(body), status
 
-    appointment_id = data.get('appointment_id')
-    symptom       = (data.get('symptom') or '').strip()
-    diagnosis     = (data.get('diagnosis') or '').strip()
-    advice        = (data.get('advice') or '').strip()
-
-    # ต้องมี appointment_id + diagnosis + advice อย่างน้อย
-    if not appointment_id or not diagnosis or not advice:
-        cur.close()
-        return jsonify({
-            'status': 'error',
-            'message': 'ต้องส่ง appointment_id, diagnosis, advice มาครบ'
-        }), 400
-
-    try:
-        appointment_id = int(appointment_id)
-    except Exception:
-        cur.close()
-        return jsonify({
-            'status': 'error',
-            'message': 'appointment_id ต้องเป็นตัวเลข'
-        }), 400
-
-    try:
-        # 1) ดึงข้อมูลใบนัดจาก appointment
-        cur.execute("""
-            SELECT
-              appointment_id,
-              patient_id,
-              doctor_id,
-              status
-            FROM appointment
-            WHERE appointment_id = %s
-            LIMIT 1
-        """, (appointment_id,))
-        appt = cur.fetchone()
-
-        if not appt:
-            cur.close()
-            return jsonify({
-                'status': 'error',
-                'message': 'ไม่พบใบนัดนี้ในระบบ'
-            }), 404
-
-        patient_id = appt["patient_id"]
-        doctor_id  = appt["doctor_id"]
-
-        # 2) เช็คว่ามี treatment ของใบนัดนี้อยู่แล้วหรือยัง
-        cur.execute("""
-            SELECT treatment_id
-            FROM treatment
-            WHERE appointment_id = %s
-            LIMIT 1
-        """, (appointment_id,))
-        existing = cur.fetchone()
-        if existing:
-            cur.close()
-            return jsonify({
-                'status': 'error',
-                'message': 'ใบนัดนี้มีการบันทึกการรักษาแล้ว',
-                'treatment_id': existing["treatment_id"]
-            }), 400
 
-        # 3) สร้าง treatment ใหม่
-        cur.execute("""
-            INSERT INTO treatment (
-                patient_id,
-                doctor_id,
-                appointment_id,
-                symptom,
-                diagnosis,
-                advice,
-                treatment_date
-            ) VALUES (
-                %s, %s, %s,
-                %s, %s, %s,
-                %s
-            )
-        """, (
-            patient_id,
-            doctor_id,
-            appointment_id,
-            symptom,
-            diagnosis,
-            advice,
-            date.today()
-        ))
-        treatment_id = cur.lastrowid
-
-        # 4) อัปเดตสถานะนัดเป็น completed
-        cur.execute("""
-            UPDATE appointment
-            SET status = 'completed'
-            WHERE appointment_id = %s
-        """, (appointment_id,))
-
-        # 5) ถ้ายังไม่มี payment ของใบนัดนี้ → สร้างใหม่ status = unpaid
-        cur.execute("""
-            SELECT payment_id
-            FROM payment
-            WHERE appointment_id = %s
-            LIMIT 1
-        """, (appointment_id,))
-        pay = cur.fetchone()
-
-        if not pay:
-            cur.execute("""
-                INSERT INTO payment (
-                    patient_id,
-                    appointment_id,
-                    amount,
-                    payment_method,
-                    payment_date,
-                    status
-                ) VALUES (
-                    %s, %s,
-                    %s, %s, %s, %s
-                )
-            """, (
-                patient_id,
-                appointment_id,
-                0.00,      # ยังไม่คิดเงิน
-                'cash',    # default method; ตอนจ่ายจริงค่อยแก้
-                None,
-                'unpaid'
-            ))
-            payment_id = cur.lastrowid
-        else:
-            payment_id = pay["payment_id"]
-
-        cur.close()
-        return jsonify({
-            'status': 'success',
-            'message': 'บันทึกการรักษาและสร้างข้อมูลชำระเงินเรียบร้อย',
-            'data': {
-                'treatment_id': treatment_id,
-                'appointment_id': appointment_id,
-                'payment_id': payment_id
-            }
-        }), 201
-
-    except Exception as e:
-        print("create_treatment error:", e)
-        try:
-            cur.close()
-        except Exception:
-            pass
-        return jsonify({
-            'status': 'error',
-            'message': 'เกิดข้อผิดพลาดในการบันทึกการรักษา'
-        }), 500
-    
 @app.get("/payments/unpaid")
 def list_unpaid_payments():
     """
     ดึงรายการ payment ที่ status = 'unpaid'
     ใช้สำหรับหน้าพนักงาน (เคาน์เตอร์) เวลาดูคิวที่ต้องจ่ายเงิน
+      - ?payment_id=1,2,3  เฉพาะรายการเหล่านี้ (ดึงเฉพาะแถวที่ได้ event จาก /events)
+    รองรับ If-None-Match (ETag) → 304 ถ้าไม่มีการเปลี่ยนแปลง
     """
+    return _conditional(versions.PAYMENTS, _list_unpaid_payments)
+
+
+# {ids_sql} = เงื่อนไข ?payment_id= เพิ่มเติม (ว่างได้) — ใช้ index payment (status) ดู migrations.py
+UNPAID_PAYMENTS_SQL = """
+    SELECT
+      pay.payment_id,
+      pay.amount,
+      pay.status,
+      a.appointment_id,
+      a.appointment_date,
+      a.appointment_time,
+      p.patient_id,
+      CONCAT_WS(' ', p.first_name, p.last_name) AS patient_name
+    FROM payment pay
+    JOIN appointment a ON a.appointment_id = pay.appointment_id
+    JOIN patient p ON p.patient_id = pay.patient_id
+    WHERE pay.status = 'unpaid'
+      {ids_sql}
+    ORDER BY a.appointment_date, a.appointment_time
+"""
+
+
+def _list_unpaid_payments():
+    ids = [p.strip() for p in (request.args.get("payment_id") or "").split(",") if p.strip()]
+    if not all(p.isdigit() for p in ids):
+        return jsonify({'status': 'error', 'message': 'payment_id ต้องเป็นตัวเลข'}), 400
+    ids_sql = f"AND pay.payment_id IN ({', '.join(['%s'] * len(ids))})" if ids else ""
+
     cur = get_cursor()
     if not cur:
         return jsonify({'status': 'error', 'message': 'DB connection error'}), 500
 
     try:
-        cur.execute("""
-            SELECT
-              pay.payment_id,
-              pay.amount,
-              pay.status,
-              a.appointment_id,
-              a.appointment_date,
-              a.appointment_time,
-              p.patient_id,
-              CONCAT_WS(' ', p.first_name, p.last_name) AS patient_name
-            FROM payment pay
-            JOIN appointment a ON a.appointment_id = pay.appointment_id
-            JOIN patient p ON p.patient_id = pay.patient_id
-            WHERE pay.status = 'unpaid'
-            ORDER BY a.appointment_date, a.appointment_time
-        """)
+        cur.execute(UNPAID_PAYMENTS_SQL.format(ids_sql=ids_sql), tuple(int(p) for p in ids))
         rows = cur.fetchall()
         cur.close()
         return jsonify({'status': 'success', 'data': rows}), 200
@@ -394,15 +315,19 @@ def pay_payment(payment_id):
         }), 400
 
     try:
-        # เช็คว่ามี payment นี้จริงไหม
+        cur.connection.start_transaction()
+
+        # เช็คว่ามี payment นี้จริงไหม (ล็อกแถวไว้จน commit)
         cur.execute("""
-            SELECT payment_id
+            SELECT payment_id, patient_id, appointment_id, amount, status
             FROM payment
             WHERE payment_id = %s
             LIMIT 1
+            FOR UPDATE
         """, (payment_id,))
         row = cur.fetchone()
         if not row:
+            cur.connection.rollback()
             cur.close()
             return jsonify({
                 'status': 'error',
@@ -419,7 +344,14 @@ def pay_payment(payment_id):
             WHERE payment_id = %s
         """, (amount, method, payment_id))
 
+        if row["status"] == 'unpaid':
+            visit_summary.record_paid(cur, row["patient_id"], row["amount"])
+
+        cur.connection.commit()
         cur.close()
+        cache.invalidate_patient(row["patient_id"])
+        change_feed.publish_payment('paid', payment_id, row["patient_id"], 'paid', amount,
+                                    row["appointment_id"], row["status"])
         return jsonify({
             'status': 'success',
             'message': 'บันทึกการชำระเงินเรียบร้อย'
@@ -428,6 +360,7 @@ def pay_payment(payment_id):
     except Exception as e:
         print("pay_payment error:", e)
         try:
+            cur.connection.rollback()
             cur.close()
         except Exception:
             pass
@@ -437,76 +370,95 @@ def pay_payment(payment_id):
         }), 500
 
 
-# APPOINTMENT APIs
-@app.route("/appointments", methods=["GET"])
-def list_appointments():
+@app.route("/payments/settle", methods=["POST"])
+def settle_payments():
     """
-    ดึงรายการนัด:
-      - รองรับ ?date=2025-11-13
-      - รองรับ ?doctor_id=1
-      - รองรับ ?status=scheduled
+    ปิดยอดหลายรายการใน transaction เดียว ตอบผลรายรายการ ดู payment_settlement.py
+    body: {"payments": [{"payment_id", "amount", "payment_method"}, ...]} (หรือ list เปล่า ๆ)
     """
-    cur = get_cursor()
-    if not cur:
-        return jsonify({'status': 'error', 'message': 'DB connection error'}), 500
-
-    date_str   = (request.args.get("date") or "").strip()
-    doctor_id  = (request.args.get("doctor_id") or "").strip()
-    status     = (request.args.get("status") or "").strip()
+    data = request.get_json(silent=True)
+    entries = data.get("payments") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return jsonify({
+            'status': 'error',
+            'message': 'ต้องส่ง payments เป็น list'
+        }), 400
 
-    where_clauses = []
-    params = []
+    records = list(enumerate(entries, start=1))
+    body, status = run_flow(payment_settlement.settle_payments(records), get_cursor)
+    return jsonify(body), status
 
-    if date_str:
-        where_clauses.append("a.appointment_date = %s")
-        params.append(date_str)
 
-    if doctor_id:
-        try:
-            doctor_id_int = int(doctor_id)
-            where_clauses.append("a.doctor_id = %s")
-            params.append(doctor_id_int)
-        except Exception:
-            cur.close()
-            return jsonify({
-                'status': 'error',
-                'message': 'doctor_id ต้องเป็นตัวเลข'
-            }), 400
+@app.route("/payments/settle/statement", methods=["POST"])
+def settle_statement():
+    """
+    ปิดยอดจากไฟล์ bank statement (CSV) อ่านแบบ stream ไม่โหลดทั้งไฟล์ก่อน
+    ส่งเป็น body ตรง ๆ (Content-Type: text/csv) หรือ multipart ช่อง file ก็ได้
+    """
+    upload = request.files.get("file")
+    stream = upload.stream if upload else request.stream
+    try:
+        records = payment_settlement.read_statement(stream)
+    except payment_settlement.BadStatement as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
 
-    if status:
-        where_clauses.append("a.status = %s")
-        params.append(status)
+    body, status = run_flow(payment_settlement.settle_payments(records, default_method='transfer'),
+                            get_cursor)
+    return jsonify(body), status
 
-    where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
 
+# APPOINTMENT APIs
+def _appointment_row(cur, appointment_id):
+    cur.execute("""
+        SELECT
+          patient_id,
+          doctor_id,
+          appointment_date,
+          appointment_time,
+          status
+        FROM appointment
+        WHERE appointment_id = %s
+        LIMIT 1
+    """, (appointment_id,))
+    return cur.fetchone()
+
+
+def _publish_status_change(appointment_id, current, status):
+    """ส่ง event เปลี่ยนสถานะใบนัด (cancelled / no_show) ให้ change feed"""
+    change_feed.publish_appointment(status, appointment_id, current["doctor_id"],
+                                    current["appointment_date"], current["appointment_time"],
+                                    status, current["patient_id"], current)
+
+
+def _reserve_slot(doctor_id, appointment_date, appointment_time, exclude_id=None):
+    """
+    ตรวจว่าจองเวลานี้ได้ไหม (อยู่ในเวลาออกตรวจของหมอ + ไม่ชนคิวอื่น) แล้วจองที่ไว้ใน schedule index
+    คืน (token, None, None) ถ้าจองได้ หรือ (None, ข้อความ error, เวลาว่างที่แนะนำ)
+    """
     try:
-        cur.execute(f"""
-            SELECT
-              a.appointment_id AS id,
-              DATE_FORMAT(a.appointment_date, '%Y-%m-%d') AS date,
-              TIME_FORMAT(a.appointment_time, '%H:%i') AS time,
-              a.status,
-              p.patient_id,
-              CONCAT_WS(' ', p.first_name, p.last_name) AS patient_name,
-              d.doctor_id,
-              CONCAT_WS(' ', d.first_name, d.last_name) AS doctor_name
-            FROM appointment a
-            JOIN patient p ON p.patient_id = a.patient_id
-            JOIN doctor  d ON d.doctor_id  = a.doctor_id
-            {where_sql}
-            ORDER BY a.appointment_date, a.appointment_time
-        """, tuple(params))
-        rows = cur.fetchall()
-        cur.close()
-        return jsonify({'status': 'success', 'data': rows}), 200
+        plan = hours.plan_for(doctor_id, appointment_date)
+        minute = to_minutes(appointment_time)
+    except ValueError:
+        return None, 'รูปแบบ appointment_date / appointment_time ไม่ถูกต้อง', None
+
+    if not plan.is_open(minute):
+        suggested = availability.nearest_free(doctor_id, appointment_date, minute)
+        return None, 'แพทย์ไม่ได้ออกตรวจในวัน/เวลานี้', suggested
+
+    token, clash = schedule.reserve(doctor_id, appointment_date, minute,
+                                    exclude_id=exclude_id, gap=plan.step)
+    if clash is not None:
+        suggested = availability.nearest_free(doctor_id, appointment_date, minute)
+        return None, f'มีคิวของหมอคนนี้ในช่วงเวลาใกล้กันแล้ว (ต้องห่างอย่างน้อย {plan.step} นาที)', suggested
+
+    return token, None, None
 
-    except Exception as e:
-        print("list_appointments error:", e)
-        try:
-            cur.close()
-        except Exception:
-            pass
-        return jsonify({'status': 'error', 'message': 'ไม่สามารถดึงข้อมูลงานนัดหมายได้'}), 500
+
+@app.route("/appointments", methods=["GET"])
+def list_appointments():
+    """รายการนัด (?date= / ?doctor_id= / ?status= / ?limit= / ?cursor= / ?fields=) ดู flows.list_appointments"""
+    return _conditional(versions.appointments_key(request.args),
+                        lambda: run_flow(flows.list_appointments(request.args), get_cursor))
 
 
 @app.route("/appointments", methods=["POST"])
@@ -555,41 +507,42 @@ def create_appointment():
         }), 400
 
     try:
-        # 1) เช็คว่ามีคิวชนในช่วง 15 นาทีของหมอคนนี้หรือยัง
-        cur.execute("""
-            SELECT
-              appointment_id,
-              appointment_time
-            FROM appointment
-            WHERE doctor_id = %s
-              AND appointment_date = %s
-              AND status IN ('scheduled','rescheduled')
-              AND ABS(TIMESTAMPDIFF(MINUTE, appointment_time, %s)) < 15
-            LIMIT 1
-        """, (doctor_id, appointment_date, appointment_time))
-        clash = cur.fetchone()
-        if clash:
-            cur.close()
-            return jsonify({
-                'status': 'error',
-                'message': 'มีคิวของหมอคนนี้ในช่วงเวลาใกล้กันแล้ว (ต้องห่างอย่างน้อย 15 นาที)'
-            }), 400
+        # 1) เช็คเวลาออกตรวจ + ชนคิวจาก schedule index (ในหน่วยความจำ) แล้วจองที่ไว้ก่อน INSERT
+        token = None
+        if status in ACTIVE_STATUSES:
+            token, error, suggested = _reserve_slot(doctor_id, appointment_date, appointment_time)
+            if error:
+                cur.close()
+                return jsonify({
+                    'status': 'error',
+                    'message': error,
+                    'suggested_time': suggested
+                }), 400
 
         # 2) แทรกใบนัดใหม่
-        cur.execute("""
-            INSERT INTO appointment (
-                patient_id,
-                doctor_id,
-                appointment_date,
-                appointment_time,
-                status
-            ) VALUES (
-                %s, %s, %s, %s, %s
-            )
-        """, (patient_id, doctor_id, appointment_date, appointment_time, status))
+        try:
+            cur.execute("""
+                INSERT INTO appointment (
+                    patient_id,
+                    doctor_id,
+                    appointment_date,
+                    appointment_time,
+                    status
+                ) VALUES (
+                    %s, %s, %s, %s, %s
+                )
+            """, (patient_id, doctor_id, appointment_date, appointment_time, status))
+        except Exception:
+            if token is not None:
+                schedule.cancel(token)
+            raise
 
         new_id = cur.lastrowid
+        if token is not None:
+            schedule.confirm(token, new_id)
         cur.close()
+        change_feed.publish_appointment('created', new_id, doctor_id, appointment_date, appointment_time,
+                                        status, patient_id)
 
         return jsonify({
             'status': 'success',
@@ -613,6 +566,19 @@ def create_appointment():
         return jsonify({'status': 'error', 'message': 'ไม่สามารถสร้างใบนัดได้'}), 500
 
 
+@app.route("/appointments/import", methods=["POST"])
+def import_appointments():
+    """
+    นำเข้าใบนัดจำนวนมาก (CSV หรือ JSON lines) ตอบเป็นรายงานรายแถว ดู appointment_import.py
+      - ?dry_run=1  ตรวจอย่างเดียว ไม่บันทึก
+    """
+    dry_run = request.args.get("dry_run") in ("1", "true")
+    body, status = run_flow(
+        appointment_import.import_appointments(request.get_data(), request.content_type, dry_run),
+        get_cursor)
+    return jsonify(body), status
+
+
 @app.route("/appointments/<int:appointment_id>", methods=["PUT"])
 def update_appointment(appointment_id):
     """
@@ -680,62 +646,33 @@ def update_appointment(appointment_id):
     params.append(appointment_id)
 
     try:
-        cur.execute("""
-            SELECT appointment_id
-            FROM appointment
-            WHERE appointment_id = %s
-            LIMIT 1
-        """, (appointment_id,))
-        row = cur.fetchone()
-        if not row:
+        current = _appointment_row(cur, appointment_id)
+        if not current:
             cur.close()
             return jsonify({
                 'status': 'error',
                 'message': 'ไม่พบใบนัดนี้'
             }), 404
 
-        # ถ้าแก้วันที่/เวลา/หมอ → ตรวจชนคิว 15 นาทีอีกที
-        if appointment_date or appointment_time or doctor_id is not None:
-            # ดึงค่าใหม่ที่จะใช้เช็ค (ถ้าไม่ส่งมา ใช้ค่าปัจจุบัน)
-            cur.execute("""
-                SELECT
-                  doctor_id,
-                  appointment_date,
-                  appointment_time,
-                  status
-                FROM appointment
-                WHERE appointment_id = %s
-            """, (appointment_id,))
-            current = cur.fetchone()
-            if not current:
-                cur.close()
-                return jsonify({
-                    'status': 'error',
-                    'message': 'ไม่พบใบนัดนี้'
-                }), 404
-
-            new_doctor_id  = int(doctor_id) if doctor_id is not None else current["doctor_id"]
-            new_date       = appointment_date or str(current["appointment_date"])
-            new_time       = appointment_time or str(current["appointment_time"])
-
-            # เช็คชนคิว
-            cur.execute("""
-                SELECT
-                  appointment_id
-                FROM appointment
-                WHERE doctor_id = %s
-                  AND appointment_date = %s
-                  AND status IN ('scheduled','rescheduled')
-                  AND ABS(TIMESTAMPDIFF(MINUTE, appointment_time, %s)) < 15
-                  AND appointment_id <> %s
-                LIMIT 1
-            """, (new_doctor_id, new_date, new_time, appointment_id))
-            clash = cur.fetchone()
-            if clash:
+        # ค่าหลังแก้ (ถ้าไม่ส่งมา ใช้ค่าปัจจุบัน)
+        new_doctor_id = int(doctor_id) if doctor_id is not None else current["doctor_id"]
+        new_date      = appointment_date or current["appointment_date"]
+        new_time      = appointment_time or current["appointment_time"]
+        new_status    = status or current["status"]
+
+        # ถ้าแก้วันที่/เวลา/หมอ หรือเปิดนัดกลับมา active → ตรวจเวลาออกตรวจ + ชนคิวอีกที
+        token = None
+        moved = appointment_date or appointment_time or doctor_id is not None
+        reactivated = new_status in ACTIVE_STATUSES and current["status"] not in ACTIVE_STATUSES
+        if new_status in ACTIVE_STATUSES and (moved or reactivated):
+            token, error, suggested = _reserve_slot(new_doctor_id, new_date, new_time,
+                                                    exclude_id=appointment_id)
+            if error:
                 cur.close()
                 return jsonify({
                     'status': 'error',
-                    'message': 'มีคิวของหมอคนนี้ในช่วงเวลาใกล้กันแล้ว (ต้องห่างอย่างน้อย 15 นาที)'
+                    'message': error,
+                    'suggested_time': suggested
                 }), 400
 
         # อัปเดตจริง
@@ -744,9 +681,24 @@ def update_appointment(appointment_id):
             SET {", ".join(fields)}
             WHERE appointment_id = %s
         """
-        cur.execute(sql, tuple(params))
+        try:
+            cur.execute(sql, tuple(params))
+        except Exception:
+            if token is not None:
+                schedule.cancel(token)
+            raise
         cur.close()
 
+        if token is not None:
+            schedule.confirm(token, appointment_id)
+        elif new_status not in ACTIVE_STATUSES:
+            schedule.remove(appointment_id)
+        action = 'updated'
+        if new_status != current["status"] and new_status in ('cancelled', 'no_show', 'completed'):
+            action = new_status
+        change_feed.publish_appointment(action, appointment_id, new_doctor_id, new_date, new_time,
+                                        new_status, current["patient_id"], current)
+
         return jsonify({
             'status': 'success',
             'message': 'อัปเดตใบนัดเรียบร้อย'
@@ -771,19 +723,24 @@ def cancel_appointment(appointment_id):
         return jsonify({'status': 'error', 'message': 'DB connection error'}), 500
 
     try:
-        cur.execute("""
-            UPDATE appointment
-            SET status = 'cancelled'
-            WHERE appointment_id = %s
-        """, (appointment_id,))
-        if cur.rowcount == 0:
+        # ค่าเดิมของใบนัด (หมอ / วัน / สถานะ) ใช้ประกอบ event ของ change feed
+        current = _appointment_row(cur, appointment_id)
+        if not current:
             cur.close()
             return jsonify({
                 'status': 'error',
                 'message': 'ไม่พบใบนัดนี้'
             }), 404
 
+        cur.execute("""
+            UPDATE appointment
+            SET status = 'cancelled'
+            WHERE appointment_id = %s
+        """, (appointment_id,))
+
         cur.close()
+        schedule.remove(appointment_id)
+        _publish_status_change(appointment_id, current, 'cancelled')
         return jsonify({
             'status': 'success',
             'message': 'ยกเลิกใบนัดเรียบร้อย'
@@ -808,19 +765,24 @@ def mark_no_show(appointment_id):
         return jsonify({'status': 'error', 'message': 'DB connection error'}), 500
 
     try:
-        cur.execute("""
-            UPDATE appointment
-            SET status = 'no_show'
-            WHERE appointment_id = %s
-        """, (appointment_id,))
-        if cur.rowcount == 0:
+        # ค่าเดิมของใบนัด (หมอ / วัน / สถานะ) ใช้ประกอบ event ของ change feed
+        current = _appointment_row(cur, appointment_id)
+        if not current:
             cur.close()
             return jsonify({
                 'status': 'error',
                 'message': 'ไม่พบใบนัดนี้'
             }), 404
 
+        cur.execute("""
+            UPDATE appointment
+            SET status = 'no_show'
+            WHERE appointment_id = %s
+        """, (appointment_id,))
+
         cur.close()
+        schedule.remove(appointment_id)
+        _publish_status_change(appointment_id, current, 'no_show')
         return jsonify({
             'status': 'success',
             'message': 'บันทึกว่าไม่มาตามนัดเรียบร้อย'
@@ -835,7 +797,233 @@ def mark_no_show(appointment_id):
         return jsonify({'status': 'error', 'message': 'ไม่สามารถบันทึก no_show ได้'}), 500
 
 
+# DOCTOR SCHEDULE APIs (เวลาออกตรวจ / ลา / วันหยุด)
+@app.route("/doctors/<int:doctor_id>/schedule", methods=["GET"])
+def get_doctor_schedule(doctor_id):
+    """
+    ดูเทมเพลตเวลาออกตรวจรายสัปดาห์ + ข้อยกเว้นตั้งแต่วันนี้เป็นต้นไป
+    (ถ้ายังไม่ตั้งเทมเพลต ระบบใช้ 09:00–17:15 ทุกวัน ช่องละ 15 นาที)
+    """
+    cur = get_cursor()
+    if not cur:
+        return jsonify({'status': 'error', 'message': 'DB connection error'}), 500
+
+    try:
+        cur.execute("""
+            SELECT
+              weekday,
+              TIME_FORMAT(start_time, '%H:%i') AS start,
+              TIME_FORMAT(end_time, '%H:%i') AS end,
+              kind,
+              slot_minutes
+            FROM doctor_schedule
+            WHERE doctor_id = %s
+            ORDER BY weekday, start_time
+        """, (doctor_id,))
+        windows = cur.fetchall()
+
+        cur.execute("""
+            SELECT
+              exception_id AS id,
+              doctor_id,
+              DATE_FORMAT(exception_date, '%Y-%m-%d') AS date,
+              kind,
+              TIME_FORMAT(start_time, '%H:%i') AS start,
+              TIME_FORMAT(end_time, '%H:%i') AS end,
+              note
+            FROM doctor_schedule_exception
+            WHERE (doctor_id = %s OR doctor_id IS NULL)
+              AND exception_date >= CURDATE()
+            ORDER BY exception_date
+        """, (doctor_id,))
+        exceptions = cur.fetchall()
+        cur.close()
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'doctor_id': doctor_id,
+                'slot_minutes': hours.slot_minutes(doctor_id),
+                'windows': windows,
+                'exceptions': exceptions
+            }
+        }), 200
+
+    except Exception as e:
+        print("get_doctor_schedule error:", e)
+        try:
+            cur.close()
+        except Exception:
+            pass
+        return jsonify({'status': 'error', 'message': 'ไม่สามารถดึงตารางเวลาออกตรวจได้'}), 500
+
+
+@app.route("/doctors/<int:doctor_id>/schedule", methods=["PUT"])
+def put_doctor_schedule(doctor_id):
+    """
+    ตั้งเทมเพลตเวลาออกตรวจรายสัปดาห์ (แทนที่ของเดิมทั้งหมด):
+      {
+        "slot_minutes": 15,
+        "windows": [
+          {"weekday": 0, "start": "09:00", "end": "12:00"},
+          {"weekday": 0, "start": "13:00", "end": "17:00"},
+          {"weekday": 2, "start": "09:00", "end": "17:00"},
+          {"weekday": 2, "start": "12:00", "end": "13:00", "kind": "break"}
+        ]
+      }
+      weekday: 0 = จันทร์ ... 6 = อาทิตย์ / วันที่ไม่มีช่วง work = ไม่ออกตรวจ
+    """
+    data = request.get_json(silent=True) or {}
+    windows = data.get("windows")
+
+    try:
+        slot_minutes = int(data.get("slot_minutes") or 15)
+    except Exception:
+        return jsonify({'status': 'error', 'message': 'slot_minutes ต้องเป็นตัวเลข'}), 400
+    if not 5 <= slot_minutes <= 240:
+        return jsonify({'status': 'error', 'message': 'slot_minutes ต้องอยู่ระหว่าง 5–240'}), 400
+
+    if not isinstance(windows, list):
+        return jsonify({'status': 'error', 'message': 'ต้องส่ง windows เป็นรายการช่วงเวลา'}), 400
+
+    rows = []
+    for w in windows:
+        try:
+            weekday = int(w.get("weekday"))
+            start = to_minutes(w.get("start"))
+            end = to_minutes(w.get("end"))
+        except Exception:
+            return jsonify({'status': 'error', 'message': 'ทุกช่วงต้องมี weekday, start, end ที่ถูกต้อง'}), 400
+        kind = w.get("kind") or "work"
+        if not 0 <= weekday <= 6 or start >= end or kind not in ("work", "break"):
+            return jsonify({'status': 'error', 'message': 'weekday ต้องเป็น 0–6, start < end และ kind เป็น work / break'}), 400
+        rows.append((doctor_id, weekday, w["start"], w["end"], kind, slot_minutes))
+
+    cur = get_cursor()
+    if not cur:
+        return jsonify({'status': 'error', 'message': 'DB connection error'}), 500
+
+    try:
+        cur.connection.start_transaction()
+        cur.execute("DELETE FROM doctor_schedule WHERE doctor_id = %s", (doctor_id,))
+        if rows:
+            cur.executemany("""
+                INSERT INTO doctor_schedule (doctor_id, weekday, start_time, end_time, kind, slot_minutes)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, rows)
+        cur.connection.commit()
+        cur.close()
+        hours.invalidate()
+
+        return jsonify({'status': 'success', 'message': 'บันทึกตารางเวลาออกตรวจเรียบร้อย'}), 200
+
+    except Exception as e:
+        print("put_doctor_schedule error:", e)
+        try:
+            cur.connection.rollback()
+            cur.close()
+        except Exception:
+            pass
+        return jsonify({'status': 'error', 'message': 'ไม่สามารถบันทึกตารางเวลาออกตรวจได้'}), 500
+
+
+@app.route("/schedule/exceptions", methods=["POST"])
+def create_schedule_exception():
+    """
+    เพิ่มข้อยกเว้นรายวัน:
+      - ลาทั้งวัน      {"doctor_id": 1, "date": "2025-11-20"}
+      - ลาครึ่งวัน      {"doctor_id": 1, "date": "2025-11-20", "start": "13:00", "end": "17:15"}
+      - เปิดตรวจพิเศษ   {"doctor_id": 1, "date": "2025-11-22", "kind": "work", "start": "09:00", "end": "12:00"}
+      - วันหยุดทุกคน    {"date": "2025-12-05", "note": "วันพ่อแห่งชาติ"}   (ไม่ส่ง doctor_id)
+    """
+    data = request.get_json(silent=True) or {}
+
+    doctor_id = data.get("doctor_id")
+    exception_date = (data.get("date") or "").strip()
+    kind = data.get("kind") or "off"
+    start = data.get("start") or None
+    end = data.get("end") or None
+    note = (data.get("note") or "").strip() or None
+
+    try:
+        doctor_id = int(doctor_id) if doctor_id is not None else None
+        date.fromisoformat(exception_date)
+        if (start is None) != (end is None) or (start and to_minutes(start) >= to_minutes(end)):
+            raise ValueError
+    except Exception:
+        return jsonify({
+            'status': 'error',
+            'message': 'ต้องส่ง date (YYYY-MM-DD) และถ้าระบุเวลา ต้องมีทั้ง start และ end โดย start < end'
+        }), 400
+
+    if kind not in ("off", "work") or (kind == "work" and (start is None or doctor_id is None)):
+        return jsonify({
+            'status': 'error',
+            'message': 'kind ต้องเป็น off / work (work ต้องระบุ doctor_id, start, end)'
+        }), 400
+
+    cur = get_cursor()
+    if not cur:
+        return jsonify({'status': 'error', 'message': 'DB connection error'}), 500
+
+    try:
+        cur.execute("""
+            INSERT INTO doctor_schedule_exception (doctor_id, exception_date, kind, start_time, end_time, note)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (doctor_id, exception_date, kind, start, end, note))
+        new_id = cur.lastrowid
+        cur.close()
+        hours.invalidate()
+
+        return jsonify({
+            'status': 'success',
+            'message': 'บันทึกข้อยกเว้นตารางเวลาเรียบร้อย',
+            'data': {'id': new_id}
+        }), 201
+
+    except Exception as e:
+        print("create_schedule_exception error:", e)
+        try:
+            cur.close()
+        except Exception:
+            pass
+        return jsonify({'status': 'error', 'message': 'ไม่สามารถบันทึกข้อยกเว้นตารางเวลาได้'}), 500
+
+
+@app.route("/schedule/exceptions/<int:exception_id>", methods=["DELETE"])
+def delete_schedule_exception(exception_id):
+    cur = get_cursor()
+    if not cur:
+        return jsonify({'status': 'error', 'message': 'DB connection error'}), 500
+
+    try:
+        cur.execute("""
+            DELETE FROM doctor_schedule_exception
+            WHERE exception_id = %s
+        """, (exception_id,))
+        if cur.rowcount == 0:
+            cur.close()
+            return jsonify({'status': 'error', 'message': 'ไม่พบข้อยกเว้นนี้'}), 404
+
+        cur.close()
+        hours.invalidate()
+        return jsonify({'status': 'success', 'message': 'ลบข้อยกเว้นตารางเวลาเรียบร้อย'}), 200
+
+    except Exception as e:
+        print("delete_schedule_exception error:", e)
+        try:
+            cur.close()
+        except Exception:
+            pass
+        return jsonify({'status': 'error', 'message': 'ไม่สามารถลบข้อยกเว้นตารางเวลาได้'}), 500
+
+
+health.mark_imported()
+
+
 if __name__ == '__main__':
+    # dev server (process เดียว) — ใช้งานจริงให้รันผ่าน serve.py
     print(">>> Flask Back-end Server กำลังจะเริ่มทำงาน")
-    
+    health.start_warmup()
+
     app.run(debug=True, host="127.0.0.1", port=5000)
\ No newline at end of file
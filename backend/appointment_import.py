@@ -0,0 +1,253 @@
+"""
+นำเข้าใบนัดจำนวนมากในคำขอเดียว (ย้ายปฏิทินจากคลินิกอื่น / โหลดนัดฉีดวัคซีนทั้งแคมเปญ)
+
+POST /appointments/import   (ดู api.py)
+  body เป็น CSV (Content-Type: text/csv) มีหัวตาราง
+      patient_id,doctor_id,appointment_date,appointment_time[,status]
+  หรือ JSON lines (Content-Type อื่น) หนึ่ง object ต่อบรรทัดด้วยคีย์ชุดเดียวกัน
+  ?dry_run=1   ตรวจอย่างเดียว ไม่บันทึก
+
+ขั้นตอน (จำนวน query ไม่ขึ้นกับจำนวนแถว ยกเว้นแบ่งก้อนละ BATCH_SIZE):
+  1) ตรวจรูปแบบทีละแถว
+  2) เช็คว่ามีคนไข้ / หมอจริง ด้วย SELECT ... IN (...) ก้อนละหลายพันรหัส
+  3) เช็คเวลาออกตรวจ แล้วกวาดหาคิวชนทีละ (หมอ, วัน) รอบเดียว ทั้งกับนัดเดิมและกันเองใน batch
+     (schedule.reserve_many — จองที่ไว้ใน schedule index กันคำขออื่นจองทับระหว่าง INSERT)
+  4) INSERT ด้วย executemany ก้อนละ BATCH_SIZE แถว ใน transaction เดียว
+ผลลัพธ์เป็นรายงานรายแถว: accepted (พร้อม appointment_id) / rejected (พร้อมเหตุผล)
+
+นำเข้าได้เฉพาะนัดที่ยัง active (scheduled / rescheduled)
+"""
+import csv
+import io
+import json
+
+from flows import BEGIN, COMMIT, call, fetch, many
+from schedule_index import schedule, to_date, to_minutes, format_minutes, ACTIVE_STATUSES
+from working_hours import hours
+import availability
+import change_feed
+
+MAX_ROWS = 50000
+BATCH_SIZE = 1000
+
+FIELDS = ("patient_id", "doctor_id", "appointment_date", "appointment_time", "status")
+
+
+class BadImport(ValueError):
+    """ไฟล์ทั้งไฟล์อ่านไม่ได้ (ตอบ 400)"""
+
+
+def parse_rows(raw, content_type):
+    """bytes → [(เลขแถว, dict), ...] (เลขแถวนับจาก 1 ไม่รวมหัวตาราง CSV)"""
+    try:
+        text = raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise BadImport("ไฟล์ต้องเป็น UTF-8")
+
+    rows = []
+    if "csv" in (content_type or ""):
+        reader = csv.DictReader(io.StringIO(text))
+        missing = [f for f in FIELDS[:4] if f not in (reader.fieldnames or ())]
+        if missing:
+            raise BadImport(f"CSV ต้องมีคอลัมน์ {', '.join(missing)}")
+        for i, rec in enumerate(reader, start=1):
+            rows.append((i, rec))
+    else:
+        for i, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                rec = None
+            rows.append((i, rec if isinstance(rec, dict) else None))
+
+    if len(rows) > MAX_ROWS:
+        raise BadImport(f"นำเข้าได้ครั้งละไม่เกิน {MAX_ROWS} แถว")
+    return rows
+
+
+def _check_row(rec):
+    """dict ของหนึ่งแถว → (patient_id, doctor_id, date, นาที, status) หรือ raise ValueError(ข้อความ)"""
+    if rec is None:
+        raise ValueError("อ่านแถวนี้ไม่ได้ (ต้องเป็น JSON object)")
+
+    def value(name):
+        v = rec.get(name)
+        return str(v).strip() if v is not None else ""
+
+    patient_id, doctor_id = value("patient_id"), value("doctor_id")
+    appointment_date, appointment_time = value("appointment_date"), value("appointment_time")
+    status = value("status") or "scheduled"
+
+    if not patient_id or not doctor_id or not appointment_date or not appointment_time:
+        raise ValueError("ต้องมี patient_id, doctor_id, appointment_date, appointment_time ให้ครบ")
+    try:
+        patient_id, doctor_id = int(patient_id), int(doctor_id)
+    except ValueError:
+        raise ValueError("patient_id และ doctor_id ต้องเป็นตัวเลข")
+    if status not in ACTIVE_STATUSES:
+        raise ValueError(f"status ต้องเป็นหนึ่งใน {ACTIVE_STATUSES}")
+    try:
+        day, minute = to_date(appointment_date), to_minutes(appointment_time)
+    except ValueError:
+        raise ValueError("รูปแบบ appointment_date / appointment_time ไม่ถูกต้อง")
+    return patient_id, doctor_id, day, minute, status
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _existing_ids(table, column, ids):
+    """flow ย่อย: รหัสที่มีจริงในตาราง (SELECT ... IN ก้อนละ 5,000 รหัส)"""
+    found = set()
+    for chunk in _chunks(sorted(ids), BATCH_SIZE * 5):
+        rows = yield fetch(
+            f"SELECT {column} FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(chunk))})",
+            chunk)
+        found.update(int(r[column]) for r in rows)
+    return found
+
+
+def _plans(keys):
+    return {key: hours.plan_for(*key) for key in keys}
+
+
+def _suggestions(items):
+    return {ref: availability.nearest_free(doctor_id, day, minute)
+            for ref, doctor_id, day, minute in items}
+
+
+def import_appointments(raw, content_type, dry_run=False):
+    """flow ของ POST /appointments/import → (body, status)"""
+    try:
+        records = parse_rows(raw, content_type)
+    except BadImport as e:
+        return {'status': 'error', 'message': str(e)}, 400
+    if not records:
+        return {'status': 'error', 'message': 'ไม่มีข้อมูลให้นำเข้า'}, 400
+
+    report = {}        # เลขแถว → ผลของแถวนั้น
+    parsed = {}        # เลขแถว → (patient_id, doctor_id, date, นาที, status)
+
+    def reject(row, message, **extra):
+        report[row] = {'row': row, 'status': 'rejected', 'error': message, **extra}
+
+    # 1) รูปแบบ
+    for row, rec in records:
+        try:
+            parsed[row] = _check_row(rec)
+        except ValueError as e:
+            reject(row, str(e))
+
+    tokens = {}
+    try:
+        # 2) คนไข้ / หมอมีจริง
+        patients = yield from _existing_ids("patient", "patient_id", {p[0] for p in parsed.values()})
+        doctors = yield from _existing_ids("doctor", "doctor_id", {p[1] for p in parsed.values()})
+        for row, (patient_id, doctor_id, _, _, _) in list(parsed.items()):
+            if patient_id not in patients:
+                reject(row, 'ไม่พบผู้ป่วยในระบบ')
+            elif doctor_id not in doctors:
+                reject(row, 'ไม่พบแพทย์ในระบบ')
+            else:
+                continue
+            del parsed[row]
+
+        # 3) เวลาออกตรวจ + กวาดหาคิวชน
+        plans = yield call(_plans, {(p[1], p[2]) for p in parsed.values()})
+        for row, (_, doctor_id, day, minute, _) in list(parsed.items()):
+            if not plans[(doctor_id, day)].is_open(minute):
+                reject(row, 'แพทย์ไม่ได้ออกตรวจในวัน/เวลานี้')
+                del parsed[row]
+
+        items = [(row, p[1], p[2], p[3]) for row, p in parsed.items()]
+        gaps = {key: plan.step for key, plan in plans.items()}
+        outcome = yield call(schedule.reserve_many, items, gaps, dry_run)
+
+        clashed = []
+        for row, doctor_id, day, minute in items:
+            kind, value = outcome[row]
+            if kind == "ok":
+                tokens[row] = value
+                continue
+            step = gaps[(doctor_id, day)]
+            if kind == "batch":
+                reject(row, f'ชนกับแถวที่ {value} ในไฟล์เดียวกัน (ต้องห่างอย่างน้อย {step} นาที)',
+                       conflict_row=value)
+            else:
+                reject(row, f'มีคิวของหมอคนนี้ในช่วงเวลาใกล้กันแล้ว (ต้องห่างอย่างน้อย {step} นาที)',
+                       conflict_appointment_id=value if isinstance(value, int) else None)
+            clashed.append((row, doctor_id, day, minute))
+            del parsed[row]
+
+        # 4) บันทึก
+        ids = {}
+        if parsed and not dry_run:
+            yield BEGIN
+            for chunk in _chunks(sorted(parsed)):
+                yield many("""
+                    INSERT INTO appointment (
+                        patient_id,
+                        doctor_id,
+                        appointment_date,
+                        appointment_time,
+                        status
+                    ) VALUES (
+                        %s, %s, %s, %s, %s
+                    )
+                """, [(p[0], p[1], p[2], format_minutes(p[3]), p[4])
+                      for p in (parsed[row] for row in chunk)])
+
+                # id ของแถวที่เพิ่ง INSERT: (หมอ, วัน, เวลา) ไม่ซ้ำกันในนัด active เพราะผ่านการกวาดแล้ว
+                # (ไม่อาศัย lastrowid + ลำดับ เพราะ auto-increment ของ multi-row INSERT อาจไม่ต่อเนื่อง)
+                keys = [(parsed[row][1], parsed[row][2], format_minutes(parsed[row][3])) for row in chunk]
+                found = yield fetch(f"""
+                    SELECT appointment_id, doctor_id, appointment_date, appointment_time
+                    FROM appointment
+                    WHERE (doctor_id, appointment_date, appointment_time) IN
+                          ({', '.join(['(%s, %s, %s)'] * len(keys))})
+                      AND status IN ('scheduled','rescheduled')
+                    ORDER BY appointment_id
+                """, [v for key in keys for v in key])
+                by_slot = {(int(r["doctor_id"]), to_date(r["appointment_date"]),
+                            to_minutes(r["appointment_time"])): r["appointment_id"] for r in found}
+                for row in chunk:
+                    ids[row] = by_slot.get(parsed[row][1:4])
+            yield COMMIT
+    except Exception as e:
+        print("import_appointments error:", e)
+        schedule.cancel_many(tokens.values())
+        return {'status': 'error', 'message': 'นำเข้าใบนัดไม่สำเร็จ ไม่มีการบันทึกข้อมูล'}, 500
+
+    if not dry_run:
+        schedule.confirm_many((tokens[row], ids[row]) for row in parsed if ids.get(row) is not None)
+        schedule.cancel_many(tokens[row] for row in parsed if ids.get(row) is None)
+        for row, (patient_id, doctor_id, day, minute, status) in parsed.items():
+            change_feed.publish_appointment('imported', ids.get(row), doctor_id, day, minute, status, patient_id)
+
+    # เวลาว่างที่แนะนำสำหรับแถวที่ชน (คิดหลังจองแถวที่รับแล้ว)
+    if clashed:
+        suggested = yield call(_suggestions, clashed)
+        for row, time_label in suggested.items():
+            report[row]['suggested_time'] = time_label
+
+    for row in parsed:
+        report[row] = {'row': row, 'status': 'accepted', 'appointment_id': ids.get(row)}
+
+    accepted = len(parsed)
+    return {
+        'status': 'success',
+        'message': (f'ตรวจแล้ว รับได้ {accepted} จาก {len(records)} แถว (ยังไม่บันทึก)' if dry_run
+                    else f'นำเข้าใบนัด {accepted} จาก {len(records)} แถว'),
+        'data': {
+            'dry_run': dry_run,
+            'total': len(records),
+            'accepted': accepted,
+            'rejected': len(records) - accepted,
+            'rows': [report[row] for row, _ in records],
+        }
+    }, 200
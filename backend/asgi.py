@@ -0,0 +1,323 @@
+"""
+โหมด ASGI: endpoint และรูปแบบ response เดียวกับ api.py แต่ endpoint ที่คุย DB บ่อยรันแบบ async
+ผ่าน aiodb — process เดียวรับคำขอพร้อมกันได้หลายร้อยโดยไม่ต้องมี thread ค้างต่อคำขอ
+
+    uvicorn asgi:app --port 5000          (หรือ hypercorn asgi:app)
+    DB_ASYNC_DRIVER=sqlite uvicorn asgi:app   ทดสอบโดยไม่มี MySQL (ดู aiodb.py)
+
+endpoint แบบ async (logic ชุดเดียวกับโหมด sync ดู flows.py):
+  GET  /patients
+  GET  /patients/<pid>/records
+  GET  /appointments
+  POST /appointments/import
+  POST /treatments
+  GET  /api/bot/patient_summary
+  GET  /events            (server-sent events รอแบบ async — connection ที่เปิดค้างไม่กิน thread)
+endpoint อื่นทั้งหมดส่งต่อให้ Flask app เดิม (WSGI) ใน thread pool (WSGI_THREADS, ค่าเริ่มต้น 16)
+การรัน python api.py แบบเดิมยังใช้ได้ตามปกติ (ใช้งานจริงโหมด sync หลาย process: serve.py)
+state ในหน่วยความจำแยกต่อ process — uvicorn --workers ไม่มีการส่งต่อ event ระหว่าง worker แบบ serve.py
+"""
+import asyncio
+import io
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+
+import aiodb
+import appointment_import
+import change_feed
+import compression
+import flows
+import json_provider
+import metrics
+import sql_trace
+import versions
+from api import app as flask_app
+
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "16"))
+
+driver = aiodb.create_driver()
+_wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+
+
+class Request:
+    def __init__(self, scope, body, params):
+        self.scope = scope
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.params = params
+        self.body = body
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        self.args = MultiDict(parse_qsl(scope.get("query_string", b"").decode("latin-1"),
+                                        keep_blank_values=True))
+
+    def get_json(self):
+        """เหมือน request.get_json(silent=True) ของ Flask"""
+        if "json" not in self.headers.get("content-type", ""):
+            return None
+        try:
+            return flask_app.json.loads(self.body or b"null")
+        except ValueError:
+            return None
+
+
+# ---------- endpoint แบบ async ----------
+async def _conditional(req, key, respond):
+    """เหมือน api._conditional: If-None-Match ตรง → 304 ก่อน query; คืน (body, status, headers)"""
+    if key is None:
+        return await respond()
+    tag = versions.etag(key, req.scope.get("query_string", b""))
+    headers = [(b"etag", tag.encode("latin-1")), (b"cache-control", b"no-cache")]
+    if versions.matches(req.headers.get("if-none-match"), tag):
+        return None, 304, headers
+    body, status = await respond()
+    return body, status, headers if status == 200 else []
+
+
+async def list_patients(req):
+    return await _conditional(req, versions.PATIENTS, lambda: aiodb.run_flow(
+        flows.list_patients(req.args), driver,
+        unavailable=({'status': 'error', 'message': 'DB error'}, 500)))
+
+
+async def patient_records(req):
+    pid = int(req.params["pid"])
+    return await _conditional(req, versions.records_key(pid), lambda: aiodb.run_flow(
+        flows.patient_records(pid, req.args), driver,
+        unavailable=({'status': 'error', 'message': 'DB error'}, 500)))
+
+
+async def list_appointments(req):
+    return await _conditional(req, versions.appointments_key(req.args),
+                              lambda: aiodb.run_flow(flows.list_appointments(req.args), driver))
+
+
+async def create_treatment(req):
+    flow = flows.create_treatment(req.get_json() or {}, req.headers.get("idempotency-key"))
+    return await aiodb.run_flow(flow, driver)
+
+
+async def import_appointments(req):
+    flow = appointment_import.import_appointments(req.body, req.headers.get("content-type"),
+                                                  req.args.get("dry_run") in ("1", "true"))
+    return await aiodb.run_flow(flow, driver)
+
+
+async def bot_patient_summary(req):
+    return await aiodb.run_flow(flows.bot_patient_summary(req.args.get("patient_id")), driver,
+                                unavailable=None)
+
+
+ROUTES = [
+    ("GET",  r"/patients",                     list_patients),
+    ("GET",  r"/patients/(?P<pid>\d+)/records", patient_records),
+    ("GET",  r"/appointments",                 list_appointments),
+    ("POST", r"/appointments/import",          import_appointments),
+    ("POST", r"/treatments",                   create_treatment),
+    ("GET",  r"/api/bot/patient_summary",      bot_patient_summary),
+]
+
+
+def _rule(pattern):
+    # ชื่อ route ใน metrics ให้ตรงกับ rule ของ Flask: (?P<pid>\d+) → <int:pid>
+    return re.sub(r"\(\?P<(\w+)>\\d\+\)", r"<int:\1>", pattern)
+
+
+_ROUTES = [(method, re.compile(pattern + r"\Z"), handler, _rule(pattern))
+           for method, pattern, handler in ROUTES]
+
+
+def _match(method, path):
+    for route_method, pattern, handler, rule in _ROUTES:
+        if route_method == method:
+            m = pattern.match(path)
+            if m:
+                return handler, m.groupdict(), rule
+    return None, None, None
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def stream_events(req, receive, send):
+    """GET /events แบบ async (logic เดียวกับ api.stream_events ดู change_feed.py)"""
+    started = asyncio.get_running_loop().time()
+    try:
+        match = change_feed.parse_filter(req.args)
+    except change_feed.BadFilter as e:
+        await _send_json(send, req, {'status': 'error', 'message': str(e)}, 400)
+        metrics.observe_request("GET", "/events", 400, asyncio.get_running_loop().time() - started, 0.0)
+        return
+
+    last_id = change_feed.parse_last_event_id(
+        req.headers.get("last-event-id") or req.args.get("last_event_id"))
+    headers = [(b"content-type", b"text/event-stream; charset=utf-8"),
+               (b"cache-control", b"no-cache"),
+               (b"x-accel-buffering", b"no")]
+    if "origin" in req.headers:
+        headers.append((b"access-control-allow-origin", b"*"))
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    # นับเหมือนโหมด Flask: หนึ่งคำขอต่อ connection เวลาถึงแค่ส่ง header (ไม่นับเวลาที่เปิดค้าง)
+    metrics.observe_request("GET", "/events", 200, asyncio.get_running_loop().time() - started, 0.0)
+
+    stream = change_feed.sse_stream_async(match, last_id)
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        while True:
+            chunk = asyncio.ensure_future(stream.__anext__())
+            await asyncio.wait({chunk, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                chunk.cancel()
+                try:
+                    await chunk
+                except (asyncio.CancelledError, StopAsyncIteration):
+                    pass
+                break
+            await send({"type": "http.response.body", "body": chunk.result().encode("utf-8"),
+                        "more_body": True})
+    except OSError:
+        pass                      # client หลุดระหว่างส่ง
+    finally:
+        disconnected.cancel()
+        await stream.aclose()
+
+
+# ---------- ASGI ----------
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send_response(send, status, headers, body):
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, req, body, status, extra_headers=(), rule=None):
+    if status == 304:
+        headers = list(extra_headers)
+        payload = b""
+    else:
+        # encoder เดียวกับ jsonify → ได้ไบต์เหมือนโหมด sync (date / Decimal ฯลฯ)
+        payload = json_provider.dumps_bytes(body)
+        encoding_headers = []
+        if rule is not None:
+            payload, encoding_headers = compression.compress_payload(
+                payload, req.headers.get("accept-encoding"), rule)
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+        headers.extend(encoding_headers)
+        headers.extend(extra_headers)
+    if "origin" in req.headers:
+        headers.append((b"access-control-allow-origin", b"*"))
+    await _send_response(send, status, headers, payload)
+
+
+def _wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope["headers"]:
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        environ[name] = environ[name] + "," + value if name in environ else value
+    return environ
+
+
+def _call_wsgi(environ):
+    captured = {}
+
+    def start_response(status, headers, exc_info=None):
+        captured["status"] = int(status.split(" ", 1)[0])
+        captured["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    result = flask_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return captured["status"], captured["headers"], body
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await driver.close()
+            _wsgi_executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    body = await _read_body(receive)
+    if scope["method"] == "GET" and scope["path"] == "/events":
+        await stream_events(Request(scope, body, {}), receive, send)
+        return
+    handler, params, rule = _match(scope["method"], scope["path"])
+
+    if handler is None:
+        # endpoint ที่ยังไม่มีแบบ async → Flask app เดิมใน thread
+        loop = asyncio.get_running_loop()
+        status, headers, payload = await loop.run_in_executor(
+            _wsgi_executor, _call_wsgi, _wsgi_environ(scope, body))
+        await _send_response(send, status, headers, payload)
+        return
+
+    req = Request(scope, body, params)
+    extra_headers = ()
+    started = asyncio.get_running_loop().time()
+    db_time = metrics.start_request()      # task นี้มี context ของตัวเอง → ไม่ปนกับคำขออื่น
+    trace = sql_trace.start_request(scope["method"], rule)
+    try:
+        result = await handler(req)
+        if len(result) == 3:
+            result, status, extra_headers = result
+        else:
+            result, status = result
+    except Exception as e:
+        print(f"{scope['method']} {scope['path']} error:", e)
+        result, status = {'status': 'error', 'message': 'เกิดข้อผิดพลาดภายในระบบ'}, 500
+    extra_headers = list(extra_headers) + [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                           for name, value in sql_trace.finish_request(trace, status)]
+    await _send_json(send, req, result, status, extra_headers, rule)
+    metrics.observe_request(scope["method"], rule, status,
+                            asyncio.get_running_loop().time() - started, db_time[0])
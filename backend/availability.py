@@ -0,0 +1,87 @@
+"""
+คำนวณเวลาว่างของแพทย์แบบ bitmap
+
+แต่ละ (หมอ, วัน) แทนด้วยจำนวนเต็มหนึ่งตัว: bit i = ช่องเวลาที่ i ของวัน ตาม DayPlan ใน working_hours
+ช่องว่าง = ช่องที่เปิดตรวจ และห่างจากนัดที่มีอยู่ไม่น้อยกว่าความยาวช่อง (กติกาเดียวกับตอนจองคิว)
+ข้อมูลนัดอ่านจาก schedule index ในหน่วยความจำ จึงคำนวณหลายหมอหลายวันได้โดยไม่ต้อง query ทีละวัน
+
+next_free_slots: K ช่องว่างที่เร็วที่สุดข้ามหลายหมอ (walk-in) — รวม iterator ของแต่ละหมอด้วย heap
+(heapq.merge) แต่ละ iterator คำนวณทีละวันเมื่อถูกดึง จึงหยุดได้ทันทีที่ครบ K ไม่ต้องคำนวณทุกหมอทุกวัน
+"""
+import heapq
+from datetime import timedelta
+from itertools import islice
+
+from schedule_index import schedule, to_date, to_minutes
+from working_hours import hours
+
+MAX_RANGE_DAYS = 31
+MAX_NEXT_SLOTS = 50
+NEXT_SLOTS_DAYS = 14         # ค่าเริ่มต้นของช่วงที่หาคิวว่างเร็วที่สุด
+
+
+def free_slots_for_day(doctor_id, day):
+    """ช่องเวลาว่างของหมอหนึ่งคนในหนึ่งวัน → ['09:00', '09:15', ...]"""
+    plan = hours.plan_for(doctor_id, day)
+    busy = schedule.busy_minutes(doctor_id, day)
+    return plan.labels_of(plan.free_mask(busy))
+
+
+def free_slots_range(doctor_ids, start_date, end_date):
+    """
+    เวลาว่างของหลายหมอ ช่วงหลายวัน (รวมวันสุดท้าย)
+    คืน { doctor_id: { 'YYYY-MM-DD': ['09:00', ...], ... }, ... }
+    """
+    start = to_date(start_date)
+    end = to_date(end_date)
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    busy = schedule.busy_range(doctor_ids, start, end)
+
+    result = {}
+    for doctor_id in doctor_ids:
+        per_day = {}
+        for day in days:
+            plan = hours.plan_for(doctor_id, day)
+            mask = plan.free_mask(busy.get((int(doctor_id), day), ()))
+            per_day[day.isoformat()] = plan.labels_of(mask)
+        result[doctor_id] = per_day
+    return result
+
+
+def nearest_free(doctor_id, day, appt_time):
+    """เวลาว่างที่ใกล้ appt_time ที่สุดในวันนั้น → 'HH:MM' หรือ None"""
+    plan = hours.plan_for(doctor_id, day)
+    mask = plan.free_mask(schedule.busy_minutes(doctor_id, day))
+    return plan.nearest(mask, to_minutes(appt_time))
+
+
+def iter_free_slots(doctor_id, start_day, start_minute=0, days=MAX_RANGE_DAYS):
+    """
+    ช่องว่างของหมอหนึ่งคนเรียงตามเวลา ตั้งแต่ start_minute ของ start_day ไปอีก days วัน
+    → (date, นาทีของวัน, doctor_id, 'HH:MM') — คำนวณ bitmap ทีละวันเมื่อถูกดึงเท่านั้น
+    """
+    start_day = to_date(start_day)
+    for offset in range(days):
+        day = start_day + timedelta(days=offset)
+        plan = hours.plan_for(doctor_id, day)
+        if not plan.open_mask:
+            continue
+        mask = plan.free_mask(schedule.busy_minutes(doctor_id, day))
+        if offset == 0 and start_minute > plan.start:
+            first = -(-(start_minute - plan.start) // plan.step)      # ช่องแรกที่เริ่มไม่ก่อน start_minute
+            mask &= ~((1 << first) - 1)
+        while mask:
+            low = mask & -mask
+            i = low.bit_length() - 1
+            yield day, plan.start + i * plan.step, doctor_id, plan.labels[i]
+            mask ^= low
+
+
+def next_free_slots(doctor_ids, start_day, start_minute=0, k=5, days=MAX_RANGE_DAYS):
+    """
+    K ช่องว่างที่เร็วที่สุดของหมอทุกคนใน doctor_ids (เวลาเท่ากัน → doctor_id น้อยก่อน)
+    → [{'doctor_id', 'date', 'time'}, ...]
+    """
+    merged = heapq.merge(*(iter_free_slots(d, start_day, start_minute, days) for d in doctor_ids))
+    return [{"doctor_id": doctor_id, "date": day.isoformat(), "time": label}
+            for day, _, doctor_id, label in islice(merged, k)]
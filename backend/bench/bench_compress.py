@@ -0,0 +1,74 @@
+"""
+micro-benchmark: ขนาดหลังบีบและเวลา CPU ของแต่ละระดับ (ใช้เลือก COMPRESS_LEVEL / COMPRESS_ROUTE_LEVELS)
+
+payload จาก route จริงบน sqlite ที่สร้างด้วย bench/datagen.py:
+  /patients?limit=500          หน้าใหญ่สุด
+  /appointments?limit=500      หน้าใหญ่สุด
+  /patients/<pid>/records      คนไข้ที่มีประวัติมากที่สุด
+
+รัน:  python bench/bench_compress.py                 (จากโฟลเดอร์ backend)
+      python bench/bench_compress.py --levels 1,5,9 --link-kbps 512
+"""
+import argparse
+import os
+import sys
+import timeit
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import datagen                                       # noqa: E402
+from bench_load import StandInPool                   # noqa: E402
+from pagination import MAX_LIMIT                     # noqa: E402
+
+
+def load_payloads(scale, seed):
+    import db
+
+    print(f">>> สร้างข้อมูล scale={scale} seed={seed} ...", flush=True)
+    raw, _ = datagen.build_sqlite(":memory:", scale, seed)
+    db.pool = StandInPool(raw)
+    busiest = raw.execute("SELECT patient_id FROM treatment GROUP BY patient_id "
+                          "ORDER BY COUNT(*) DESC LIMIT 1").fetchone()["patient_id"]
+
+    import api
+
+    client = api.app.test_client()
+    paths = [f"/patients?limit={MAX_LIMIT}", f"/appointments?limit={MAX_LIMIT}", f"/patients/{busiest}/records"]
+    # ไม่ส่ง Accept-Encoding → ได้ไบต์ก่อนบีบ
+    return {path: client.get(path).get_data() for path in paths}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=sorted(datagen.SCALES), default="tiny")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--levels", default="1,3,5,6,9", help="ระดับที่ต้องการเทียบ คั่นด้วย ,")
+    parser.add_argument("--number", type=int, default=20)
+    parser.add_argument("--link-kbps", type=float, default=1024,
+                        help="ความเร็วลิงก์ของสาขา (kbit/s) ใช้ประมาณเวลาส่ง")
+    args = parser.parse_args()
+
+    import compression
+
+    payloads = load_payloads(args.scale, args.seed)
+    encodings = ["gzip"] + (["br"] if compression.brotli is not None else [])
+    levels = [int(x) for x in args.levels.split(",")]
+    link_bytes_per_s = args.link_kbps * 1000 / 8
+
+    for path, data in payloads.items():
+        print(f"\n{path}: {len(data) / 1024:.1f} KiB   ส่งตรง ๆ ~{len(data) / link_bytes_per_s * 1000:.0f} ms"
+              f" ที่ {args.link_kbps:g} kbit/s")
+        for encoding in encodings:
+            for level in levels:
+                def fn():
+                    return compression.compress_bytes(data, encoding, level, "bench")
+                size = len(fn())
+                cpu = min(timeit.repeat(fn, number=args.number, repeat=3)) / args.number
+                print(f"  {encoding:<4} {level}   {size / 1024:8.1f} KiB   x{size / len(data):6.3f}"
+                      f"   cpu {cpu * 1000:7.2f} ms   ส่ง ~{size / link_bytes_per_s * 1000:6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
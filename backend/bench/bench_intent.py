@@ -0,0 +1,75 @@
+"""
+micro-benchmark: detect_intent แบบเดิม (วนทุก intent × ทุกคีย์เวิร์ด) เทียบกับ Aho-Corasick
+
+รัน:  python bench/bench_intent.py            (จากโฟลเดอร์ backend)
+      python bench/bench_intent.py --synthetic 5000   (เพิ่มคีย์เวิร์ดสังเคราะห์ให้ตารางใหญ่ขึ้น)
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_routes import INTENT_KEYWORDS          # noqa: E402
+from intent_matcher import KeywordMatcher       # noqa: E402
+
+MESSAGES = [
+    "ดูเวลาว่างหมอ 1 วันที่ 15",
+    "ขอดูประวัติคนไข้ 5 หน่อยครับ",
+    "วันนี้หมอมีนัดอะไรบ้าง",
+    "สวัสดีครับ อยากสอบถามเรื่องค่ารักษาหน่อย",
+    "พรุ่งนี้มีคิวว่างไหม หรือต้องรอวันจันทร์หน้า",
+]
+
+
+def legacy_detect(table, message):
+    """ลูปเดิมใน bot_routes.detect_intent (คีย์เวิร์ดแรกที่เจอชนะ)"""
+    msg = message.strip().lower()
+    for intent, keywords in table.items():
+        for kw in keywords:
+            if kw in msg:
+                return intent
+    return None
+
+
+def synthetic_table(extra, seed=42):
+    """เพิ่มคำพ้องสังเคราะห์ (ไม่มีในข้อความทดสอบ) ให้ตารางมีคีย์เวิร์ดรวม ~extra คำ"""
+    rng = random.Random(seed)
+    alphabet = "กขคงจฉชซญดตถทธนบปผพฟภมยรลวศษสหอฮะาิีึืุูเแโใไ่้๊๋"
+    table = {intent: list(words) for intent, words in INTENT_KEYWORDS.items()}
+    intents = list(table)
+    for i in range(extra):
+        word = "".join(rng.choice(alphabet) for _ in range(rng.randint(4, 12)))
+        table[intents[i % len(intents)]].append(word)
+    return table
+
+
+def run(table, number):
+    matcher = KeywordMatcher(table)
+    keyword_count = sum(len(v) for v in table.values())
+
+    legacy = timeit.timeit(lambda: [legacy_detect(table, m) for m in MESSAGES], number=number)
+    automaton = timeit.timeit(lambda: [matcher.best(m) for m in MESSAGES], number=number)
+
+    calls = number * len(MESSAGES)
+    print(f"keywords={keyword_count:>6}  calls={calls}")
+    print(f"  legacy loop   : {legacy / calls * 1e6:8.2f} µs/message")
+    print(f"  aho-corasick  : {automaton / calls * 1e6:8.2f} µs/message")
+    print(f"  speedup       : {legacy / automaton:8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--synthetic", type=int, default=0, help="จำนวนคีย์เวิร์ดสังเคราะห์ที่เพิ่ม")
+    args = parser.parse_args()
+
+    run(INTENT_KEYWORDS, args.number)
+    for extra in ([args.synthetic] if args.synthetic else [1000, 5000]):
+        run(synthetic_table(extra), max(args.number // 10, 1))
+
+
+if __name__ == "__main__":
+    main()
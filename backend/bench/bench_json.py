@@ -0,0 +1,136 @@
+"""
+micro-benchmark: serialize response รายการยาว ๆ — DefaultJSONProvider ของ Flask (เดิม) เทียบกับ json_provider.py
+
+payload (จาก sqlite ที่สร้างด้วย bench/datagen.py ผ่าน route จริง):
+  appointments   GET /appointments ทั้งหมด (ตาม next_cursor ทีละ MAX_LIMIT แถวจนครบ)
+  patients       GET /patients ทั้งหมด (เช่นเดียวกัน)
+  mysql_rows     แถว appointments เดียวกันแต่เป็นชนิดที่ MySQL คืนมา (date / timedelta / Decimal)
+                 แบบ SELECT * หรือ /payments/unpaid — Flask เดิม encode timedelta ไม่ได้
+
+รัน:  python bench/bench_json.py                 (จากโฟลเดอร์ backend)
+      python bench/bench_json.py --scale small --number 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import timeit
+from datetime import date, timedelta
+from decimal import Decimal
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask.json.provider import DefaultJSONProvider   # noqa: E402
+
+import datagen                                       # noqa: E402
+from pagination import MAX_LIMIT                     # noqa: E402
+from bench_load import StandInPool                   # noqa: E402
+
+
+def _mysql_rows(appointments):
+    """แปลงแถวที่ route format เป็นสตริงแล้ว กลับเป็นชนิดที่ mysql-connector คืน"""
+    rows = []
+    for i, row in enumerate(appointments):
+        hh, mm = (int(x) for x in row["time"].split(":")[:2])
+        rows.append({
+            **row,
+            "date": date.fromisoformat(row["date"]),
+            "time": timedelta(hours=hh, minutes=mm),
+            "amount": Decimal(f"{300 + i % 50 * 10}.00"),
+        })
+    return rows
+
+
+def _fetch_all(client, path):
+    """ดึงทุกหน้าของ list endpoint (ตาม next_cursor) → แถวทั้งหมด"""
+    rows, cursor = [], None
+    while True:
+        query = f"?limit={MAX_LIMIT}" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(path + query).get_json()
+        rows.extend(body["data"])
+        cursor = body.get("next_cursor")
+        if not cursor:
+            return rows
+
+
+def load_payloads(scale, seed):
+    import db
+
+    print(f">>> สร้างข้อมูล scale={scale} seed={seed} ...", flush=True)
+    raw, _ = datagen.build_sqlite(":memory:", scale, seed)
+    db.pool = StandInPool(raw)
+
+    import api
+
+    client = api.app.test_client()
+    appointments = _fetch_all(client, "/appointments")
+    patients = _fetch_all(client, "/patients")
+    return api.app, {
+        "appointments": {"status": "success", "data": appointments},
+        "patients": {"status": "success", "data": patients},
+        "mysql_rows": {"status": "success", "data": _mysql_rows(appointments)},
+    }
+
+
+def _encode(provider, app, body):
+    with app.app_context():
+        return provider.response(body).get_data()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=sorted(datagen.SCALES), default="tiny")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--number", type=int, default=10, help="จำนวนรอบต่อการวัด (เอาค่าที่ดีที่สุดจาก 3 ชุด)")
+    args = parser.parse_args()
+
+    import json_provider
+
+    app, payloads = load_payloads(args.scale, args.seed)
+    flask_default = DefaultJSONProvider(app)
+    clinic = app.json
+    # x = เร็วกว่าแถวแรกของ payload นั้นที่ encode ได้กี่เท่า
+    encoders = [("flask_default", flask_default), ("clinic_stdlib", None)]
+    if json_provider.orjson is not None:
+        encoders.append(("clinic_orjson", clinic))
+
+    for name, body in payloads.items():
+        print(f"\n{name}: {len(body['data'])} แถว")
+        baseline = None
+        for label, provider in encoders:
+            if provider is None:
+                def fn():
+                    return json_provider._stdlib_dumps(body).encode("utf-8")
+            else:
+                def fn(provider=provider):
+                    return _encode(provider, app, body)
+            try:
+                size = len(fn())
+            except TypeError as e:
+                print(f"  {label:<14} encode ไม่ได้: {e}")
+                continue
+            best = min(timeit.repeat(fn, number=args.number, repeat=3)) / args.number
+            baseline = baseline or best
+            print(f"  {label:<14} {best * 1000:9.2f} ms   {size / 1024:9.1f} KiB   x{baseline / best:5.1f}")
+
+    # ทั้งคำขอผ่าน route (หน้าใหญ่สุดที่แบ่งหน้าได้)
+    client = app.test_client()
+    for path in (f"/appointments?limit={MAX_LIMIT}", f"/patients?limit={MAX_LIMIT}"):
+        print(f"\nGET {path} ทั้งคำขอ (test client)")
+        for label, provider in (("flask_default", flask_default), ("clinic", clinic)):
+            app.json = provider
+            client.get(path)
+            samples = []
+            for _ in range(args.number * 5):
+                started = time.perf_counter()
+                client.get(path)
+                samples.append(time.perf_counter() - started)
+            print(f"  {label:<14} {statistics.median(samples) * 1000:9.2f} ms (median)")
+    app.json = clinic
+
+
+if __name__ == "__main__":
+    main()
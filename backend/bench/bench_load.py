@@ -0,0 +1,451 @@
+"""
+benchmark แบบ end-to-end: ยิง route จริงของระบบแล้ววัด p50 / p95 / p99 / throughput ต่อ endpoint
+
+  patients_search     GET  /patients?q=            (ชื่อ / นามสกุล / HN / เบอร์โทร)
+  appointments_list   GET  /appointments?doctor_id=&date=
+  suggest_slots       POST /api/bot/suggest_slots
+  chat                POST /api/bot/chat
+  create_appointment  POST /appointments           (เลือกเวลาจากช่องว่างจริง)
+  create_treatment    POST /treatments             (ใบนัด scheduled ที่ยังไม่มีการรักษา)
+
+เป้าหมาย (เลือกหนึ่ง):
+  ไม่ระบุ          Flask test client ใน process นี้ + sqlite ที่สร้างด้วย bench/datagen.py (ค่าเริ่มต้น)
+  --sqlite PATH    เหมือนข้างบนแต่ใช้ไฟล์ sqlite ที่สร้างไว้แล้ว (python bench/datagen.py --sqlite PATH)
+  --mysql META     Flask test client + MySQL จริงตาม DB_* (โหลดข้อมูลไว้ก่อนด้วย datagen.py --mysql)
+  --url URL --meta META   ยิง HTTP ไปที่ server ที่รันอยู่ ใช้ --concurrency ได้
+
+ผลลัพธ์บันทึกเป็น JSON (bench/results/load-<commit>-<เวลา>.json) เทียบกับรอบก่อนด้วย --compare
+
+รัน:  python bench/bench_load.py                                  (จากโฟลเดอร์ backend)
+      python bench/bench_load.py --scale small --requests 500
+      python bench/bench_load.py --compare bench/results/load-abc1234-....json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# slow-query log ของ sqlite ที่ไม่มี index จะท่วมหน้าจอ → ปิดไว้ (ตั้ง SQL_SLOW_MS เองได้)
+os.environ.setdefault("SQL_SLOW_MS", "0")
+
+import datagen                                     # noqa: E402
+
+SCENARIOS = ("patients_search", "appointments_list", "suggest_slots", "chat",
+             "create_appointment", "create_treatment")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+# ---------- sqlite แทน MySQL (โหมด sync ของ Flask) ----------
+class _StandInCursor:
+    def __init__(self, raw, dictionary):
+        from aiodb import _SqliteConnectionAdapter
+
+        self.connection = _SqliteConnectionAdapter(raw)
+        self._cur = raw.cursor()
+        if not dictionary:
+            self._cur.row_factory = None
+
+    def execute(self, sql, params=()):
+        from aiodb import _sqlite_sql, _sqlite_param
+
+        self._cur.execute(_sqlite_sql(sql), [_sqlite_param(p) for p in params or ()])
+
+    def executemany(self, sql, seq_of_params):
+        from aiodb import _sqlite_sql, _sqlite_param
+
+        self._cur.executemany(_sqlite_sql(sql), [[_sqlite_param(p) for p in ps] for ps in seq_of_params])
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    def close(self):
+        self._cur.close()
+
+
+class _StandInConnection:
+    def __init__(self, raw):
+        self._raw = raw
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def cursor(self, dictionary=False, traced=True, **kwargs):
+        import sql_trace
+
+        cursor = _StandInCursor(self._raw, dictionary)
+        return sql_trace.TracedCursor(cursor) if traced else cursor
+
+    def start_transaction(self):
+        self._raw.execute("BEGIN")
+
+    def commit(self):
+        if self._raw.in_transaction:
+            self._raw.execute("COMMIT")
+
+    def rollback(self):
+        if self._raw.in_transaction:
+            self._raw.execute("ROLLBACK")
+
+    def close(self):
+        # เหมือนคืน connection เข้า pool: transaction ที่ค้างต้องไม่ติดไปคำขอถัดไป
+        self.rollback()
+
+
+class StandInPool:
+    """ใช้แทน db.pool: ทุกคำขอใช้ sqlite connection เดียวกัน (test client รันทีละคำขอ)"""
+
+    size = 1
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.checkouts = 0
+
+    def connection(self, timeout=None):
+        self.checkouts += 1
+        return _StandInConnection(self.raw)
+
+    def check(self, timeout=None):
+        return None
+
+    def stats(self):
+        return {"size": 1, "created": 1, "idle": 1, "in_use": 0, "checkouts": self.checkouts}
+
+
+# ---------- เป้าหมาย ----------
+class InProcessTarget:
+    concurrent = False
+
+    def __init__(self):
+        import api
+
+        self._client = api.app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self._client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+
+class HttpTarget:
+    concurrent = True
+
+    def __init__(self, url):
+        self._url = url.rstrip("/")
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(self._url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"} if data else {})
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                status, payload = resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            status, payload = e.code, e.read()
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+
+# ---------- สร้างคำขอ (ใช้ seed เดียวกัน → ชุดคำขอเดียวกันทุกรอบ) ----------
+def _days(meta, future_only=False):
+    first = date.fromisoformat(meta['today'] if future_only else meta['first_day'])
+    last = date.fromisoformat(meta['last_day'])
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def plan_patients_search(rng, meta, target, n):
+    queries = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.35:
+            name = rng.choice(datagen.FIRST_NAMES)
+            q = name[:rng.randint(2, len(name))]
+        elif roll < 0.6:
+            q = rng.choice(datagen.LAST_NAMES)
+        elif roll < 0.75:
+            q = f"{rng.choice(datagen.FIRST_NAMES)} {rng.choice(datagen.LAST_NAMES)[:3]}"
+        elif roll < 0.9:
+            q = f"HN{rng.randint(1, meta['patients']):03d}"
+        else:
+            q = f"{rng.randrange(10000):04d}"
+        queries.append(("GET", "/patients?" + urllib.parse.urlencode({"q": q}), None))
+    return queries
+
+
+def plan_appointments_list(rng, meta, target, n):
+    days = _days(meta)
+    # หน้าจอส่วนใหญ่เปิดช่วงวันนี้ ± ไม่กี่วัน
+    near = [d for d in days if abs((d - date.fromisoformat(meta['today'])).days) <= 7]
+    return [("GET", f"/appointments?doctor_id={rng.randint(1, meta['doctors'])}"
+                    f"&date={rng.choice(near if rng.random() < 0.8 else days).isoformat()}", None)
+            for _ in range(n)]
+
+
+def plan_suggest_slots(rng, meta, target, n):
+    days = _days(meta, future_only=True)
+    return [("POST", "/api/bot/suggest_slots",
+             {"doctor_id": rng.randint(1, meta['doctors']), "date": rng.choice(days).isoformat()})
+            for _ in range(n)]
+
+
+def plan_chat(rng, meta, target, n):
+    today = date.fromisoformat(meta['today'])
+    templates = [
+        lambda: f"ดูเวลาว่างหมอ {rng.randint(1, meta['doctors'])} วันที่ {rng.randint(today.day, 28)}",
+        lambda: f"หมอ {rng.randint(1, meta['doctors'])} ว่างไหม พรุ่งนี้",
+        lambda: f"ขอดูประวัติคนไข้ {rng.randint(1, meta['patients'])} หน่อยครับ",
+        lambda: f"สรุปประวัติ HN{rng.randint(1, meta['patients']):03d}",
+        lambda: "เช็กนัดวันนี้ให้หน่อย",
+        lambda: "สวัสดีครับ อยากสอบถามเรื่องค่ารักษา",
+    ]
+    return [("POST", "/api/bot/chat", {"message": rng.choice(templates)()}) for _ in range(n)]
+
+
+def plan_create_appointment(rng, meta, target, n):
+    """เลือก (หมอ, วัน) ที่ยังไม่เคยใช้ แล้วถามช่องว่างจริงจาก suggest_slots (ไม่นับเวลา)"""
+    pairs = [(d, day) for d in range(1, meta['doctors'] + 1) for day in _days(meta, future_only=True)[1:]]
+    rng.shuffle(pairs)
+    requests = []
+    for doctor_id, day in pairs:
+        if len(requests) >= n:
+            break
+        status, body = target.request("POST", "/api/bot/suggest_slots",
+                                      {"doctor_id": doctor_id, "date": day.isoformat()})
+        slots = (body or {}).get("available_slots") or []
+        if status != 200 or not slots:
+            continue
+        requests.append(("POST", "/appointments", {
+            "patient_id": rng.randint(1, meta['patients']),
+            "doctor_id": doctor_id,
+            "appointment_date": day.isoformat(),
+            "appointment_time": rng.choice(slots),
+        }))
+    return requests
+
+
+def plan_create_treatment(rng, meta, target, n):
+    """ใบนัด scheduled ของวันที่ผ่านมาแล้ว / วันนี้ (ดึงผ่าน GET /appointments ไม่นับเวลา)"""
+    days = [d for d in _days(meta) if d <= date.fromisoformat(meta['today'])]
+    rng.shuffle(days)
+    ids = []
+    for day in days:
+        if len(ids) >= n:
+            break
+        status, body = target.request(
+            "GET", f"/appointments?date={day.isoformat()}&status=scheduled&fields=id&limit=500")
+        if status == 200:
+            ids.extend(row['id'] for row in body['data'])
+    rng.shuffle(ids)
+    return [("POST", "/treatments", {"appointment_id": appointment_id,
+                                     "symptom": rng.choice(datagen.SYMPTOMS),
+                                     "diagnosis": rng.choice(datagen.DIAGNOSES),
+                                     "advice": rng.choice(datagen.ADVICE)})
+            for appointment_id in ids[:n]]
+
+
+PLANS = {name: globals()["plan_" + name] for name in SCENARIOS}
+
+
+# ---------- วัดผล ----------
+def percentile(sorted_samples, p):
+    """nearest-rank"""
+    if not sorted_samples:
+        return None
+    return sorted_samples[max(0, math.ceil(p / 100 * len(sorted_samples)) - 1)]
+
+
+def run_scenario(target, requests, warmup, concurrency):
+    for method, path, body in requests[:warmup]:
+        target.request(method, path, body)
+    measured = requests[warmup:]
+
+    samples = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(spec):
+        method, path, body = spec
+        started = time.perf_counter()
+        status, _ = target.request(method, path, body)
+        elapsed = time.perf_counter() - started
+        with lock:
+            samples.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    wall_started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, measured))
+    else:
+        for spec in measured:
+            one(spec)
+    wall = time.perf_counter() - wall_started
+
+    samples.sort()
+    ms = lambda v: round(v * 1000, 3) if v is not None else None     # noqa: E731
+    return {
+        'requests': len(samples),
+        'status': dict(sorted(statuses.items())),
+        'p50_ms': ms(percentile(samples, 50)),
+        'p95_ms': ms(percentile(samples, 95)),
+        'p99_ms': ms(percentile(samples, 99)),
+        'mean_ms': ms(sum(samples) / len(samples)) if samples else None,
+        'max_ms': ms(samples[-1]) if samples else None,
+        'throughput_rps': round(len(samples) / wall, 2) if wall > 0 else None,
+    }
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=BACKEND, capture_output=True, text=True,
+                              timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def compare(old, new):
+    """พิมพ์ส่วนต่างของ p50 / p95 / p99 / throughput เทียบกับผลรอบก่อน (+ = ช้าลง)"""
+    print(f"\nเทียบกับ {old['meta'].get('commit') or '?'} ({old['meta'].get('started_at')})")
+    print(f"  {'endpoint':<20}{'p50 ms':>24}{'p95 ms':>24}{'p99 ms':>24}{'req/s':>24}")
+    for name, result in new['results'].items():
+        before = old['results'].get(name)
+        if not before:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            a, b = before.get(key), result.get(key)
+            if not a or b is None:
+                cells.append(f"{'-':>24}")
+                continue
+            cells.append(f"{a:.2f} → {b:.2f} ({(b - a) / a * 100:+.0f}%)".rjust(24))
+        print(f"  {name:<20}{''.join(cells)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    target_group = parser.add_mutually_exclusive_group()
+    target_group.add_argument("--sqlite", metavar="PATH", help="ไฟล์ sqlite จาก datagen.py (มี PATH.meta.json)")
+    target_group.add_argument("--mysql", metavar="META", help="meta.json ของข้อมูลที่โหลดเข้า MySQL แล้ว")
+    target_group.add_argument("--url", help="server ที่รันอยู่ เช่น http://localhost:5000 (ต้องมี --meta)")
+    parser.add_argument("--meta", help="meta.json ของข้อมูลใน server (ใช้กับ --url)")
+    parser.add_argument("--scale", choices=sorted(datagen.SCALES), default="tiny",
+                        help="ขนาดข้อมูลเมื่อสร้าง sqlite ในหน่วยความจำ (ค่าเริ่มต้น)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=200, help="จำนวนคำขอที่วัดต่อ endpoint")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1, help="จำนวนคำขอพร้อมกัน (เฉพาะ --url)")
+    parser.add_argument("--only", help="เฉพาะ endpoint เหล่านี้ คั่นด้วย , เช่น chat,suggest_slots")
+    parser.add_argument("--out", help="ไฟล์ผลลัพธ์ JSON (ค่าเริ่มต้น bench/results/load-<commit>-<เวลา>.json)")
+    parser.add_argument("--compare", metavar="JSON", help="ผลรอบก่อนที่ต้องการเทียบ")
+    args = parser.parse_args()
+
+    if args.url and not args.meta:
+        parser.error("--url ต้องใช้คู่กับ --meta")
+    only = [s.strip() for s in args.only.split(",")] if args.only else list(SCENARIOS)
+    unknown = set(only) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"ไม่รู้จัก {', '.join(sorted(unknown))} (มี {', '.join(SCENARIOS)})")
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+    if args.url:
+        with open(args.meta, encoding="utf-8") as f:
+            meta = json.load(f)
+        target, backend = HttpTarget(args.url), "http"
+    elif args.mysql:
+        with open(args.mysql, encoding="utf-8") as f:
+            meta = json.load(f)
+        target, backend = InProcessTarget(), "mysql"
+    else:
+        import db
+
+        if args.sqlite:
+            import aiodb
+
+            raw = aiodb.SqliteDriver(args.sqlite)._open()
+            with open(args.sqlite + ".meta.json", encoding="utf-8") as f:
+                meta = json.load(f)
+        else:
+            print(f">>> สร้างข้อมูล scale={args.scale} seed={args.seed} ...", flush=True)
+            generated = time.perf_counter()
+            raw, meta = datagen.build_sqlite(":memory:", args.scale, args.seed)
+            print(f">>> {meta['rows']} ({time.perf_counter() - generated:.1f} s)", flush=True)
+        db.pool = StandInPool(raw)
+        target, backend = InProcessTarget(), f"sqlite {sqlite3.sqlite_version}"
+
+    concurrency = args.concurrency if target.concurrent else 1
+    results = {}
+    for name in SCENARIOS:
+        if name not in only:
+            continue
+        # แต่ละ endpoint มี rng ของตัวเอง → เลือก --only แล้วยังได้คำขอชุดเดิม
+        plan_rng = random.Random(f"{args.seed}:{name}")
+        requests = PLANS[name](plan_rng, meta, target, args.requests + args.warmup)
+        if len(requests) <= args.warmup:
+            print(f"  {name:<20} ข้าม (เตรียมคำขอได้ {len(requests)} รายการ)")
+            continue
+        result = run_scenario(target, requests, args.warmup, concurrency)
+        results[name] = result
+        print(f"  {name:<20} n={result['requests']:<5} p50 {result['p50_ms']:8.2f} ms  "
+              f"p95 {result['p95_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  "
+              f"{result['throughput_rps']:8.1f} req/s  {result['status']}", flush=True)
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': bool(_git("status", "--porcelain", "--untracked-files=no")),
+            'started_at': started_at,
+            'backend': backend,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'concurrency': concurrency,
+            'seed': args.seed,
+        },
+        'dataset': meta,
+        'results': results,
+    }
+    out = args.out
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"load-{commit or 'nogit'}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f">>> บันทึกผลที่ {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+วัดเวลาเริ่มระบบ: import api.py และ import → คำขอแรกตอบได้ (first byte) ของ serve.py
+
+รัน:  python bench/bench_startup.py                 (จากโฟลเดอร์ backend)
+      python bench/bench_startup.py --runs 10 --out startup.json
+
+ไม่ต้องมี MySQL — /healthz ไม่แตะ DB ส่วน /readyz จะเป็น 503 จนกว่า DB พร้อม
+(ค่า warmup ในผลจะเป็น null ถ้าไม่มี DB)
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import api; "
+    "print(round(time.perf_counter() - t, 4))"
+)
+
+
+def import_time(runs):
+    """เวลา import api ใน process ใหม่ทุกรอบ (ไม่มี .pyc cache ร้อนจากรอบก่อนใน process เดียวกัน)"""
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=BACKEND,
+                             capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return samples
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url, timeout=1.0):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def first_byte(deadline=30.0):
+    """เริ่ม serve.py (1 worker) แล้ว poll /healthz จนตอบ → วินาทีจากเริ่ม process ถึงคำขอแรกสำเร็จ"""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "serve.py", "--bind", f"127.0.0.1:{port}", "--workers", "1"],
+                            cwd=BACKEND, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"serve.py จบก่อนตอบ (exit {proc.returncode})")
+            if time.perf_counter() - started > deadline:
+                raise RuntimeError("serve.py ไม่ตอบภายในเวลาที่กำหนด")
+            try:
+                status, _ = _get(base + "/healthz", timeout=0.5)
+            except OSError:
+                time.sleep(0.005)
+                continue
+            if status == 200:
+                break
+        elapsed = round(time.perf_counter() - started, 4)
+        status, body = _get(base + "/readyz", timeout=5)
+        return {'process_to_first_byte_seconds': elapsed, 'readyz_status': status,
+                'worker_startup': body.get('startup'), 'database': body.get('database')}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="จำนวนรอบต่อการวัด")
+    parser.add_argument("--out", help="ไฟล์ผลลัพธ์ JSON")
+    args = parser.parse_args()
+
+    imports = import_time(args.runs)
+    print(f"import api          median {statistics.median(imports) * 1000:7.1f} ms"
+          f"   min {min(imports) * 1000:7.1f} ms   ({args.runs} รอบ)")
+
+    serves = [first_byte() for _ in range(args.runs)]
+    times = [s['process_to_first_byte_seconds'] for s in serves]
+    print(f"serve → first byte  median {statistics.median(times) * 1000:7.1f} ms"
+          f"   min {min(times) * 1000:7.1f} ms")
+    last = serves[-1]
+    print(f"  worker startup: {last['worker_startup']}")
+    print(f"  /readyz {last['readyz_status']}  database: {last['database']}")
+
+    if args.out:
+        report = {'runs': args.runs, 'import_seconds': imports, 'serve': serves}
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print("บันทึกผลที่", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+benchmark: POST /treatments แบบเดิม (10 round trip) เทียบกับ flows.create_treatment (6–7 round trip)
+
+เวลาของ endpoint นี้แทบทั้งหมดคือ จำนวน round trip × latency ไป DB จึงรันบน sqlite (aiodb)
+แล้วหน่วงเวลาเทียม --rtt มิลลิวินาทีต่อคำสั่ง (รวม BEGIN / COMMIT) แทน network จริง
+
+รัน:  python bench/bench_treatment.py                 (จากโฟลเดอร์ backend)
+      python bench/bench_treatment.py --rtt 0.5 --requests 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiodb                                        # noqa: E402
+import cache                                        # noqa: E402
+import flows                                        # noqa: E402
+from flows import BEGIN, COMMIT, one, run           # noqa: E402
+from schedule_index import schedule                 # noqa: E402
+
+# ตารางสรุปแบบเดิม: การมารักษา กับ รายการค้างชำระ คนละคำสั่ง (ตอนนี้รวมเป็น visit_summary.TREATMENT_SQL)
+LEGACY_VISIT_SQL = """
+    INSERT INTO patient_visit_summary (patient_id, last_visit, visit_count, last_diagnosis)
+    VALUES (%s, %s, 1, %s)
+    ON DUPLICATE KEY UPDATE
+      last_diagnosis = IF(last_visit IS NULL OR VALUES(last_visit) >= last_visit,
+                          VALUES(last_diagnosis), last_diagnosis),
+      last_visit     = IF(last_visit IS NULL OR VALUES(last_visit) >= last_visit,
+                          VALUES(last_visit), last_visit),
+      visit_count    = visit_count + 1
+"""
+
+LEGACY_UNPAID_SQL = """
+    INSERT INTO patient_visit_summary (patient_id, unpaid_balance, unpaid_count)
+    VALUES (%s, %s, 1)
+    ON DUPLICATE KEY UPDATE
+      unpaid_balance = unpaid_balance + VALUES(unpaid_balance),
+      unpaid_count   = unpaid_count + 1
+"""
+
+
+def legacy_create_treatment(data):
+    """flows.create_treatment ก่อนปรับ: SELECT เช็คซ้ำก่อน INSERT ทุกขั้น"""
+    appointment_id = int(data['appointment_id'])
+    yield BEGIN
+    appt = yield one("""
+        SELECT appointment_id, patient_id, doctor_id, status
+        FROM appointment WHERE appointment_id = %s LIMIT 1
+    """, (appointment_id,))
+    if not appt:
+        return {'status': 'error'}, 404
+    patient_id, doctor_id = appt["patient_id"], appt["doctor_id"]
+
+    existing = yield one("SELECT treatment_id FROM treatment WHERE appointment_id = %s LIMIT 1",
+                         (appointment_id,))
+    if existing:
+        return {'status': 'error'}, 400
+
+    done = yield run("""
+        INSERT INTO treatment (patient_id, doctor_id, appointment_id, symptom, diagnosis, advice, treatment_date)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, (patient_id, doctor_id, appointment_id, data['symptom'], data['diagnosis'], data['advice'],
+          date.today()))
+    treatment_id = done.lastrowid
+    yield run(LEGACY_VISIT_SQL, (patient_id, date.today(), data['diagnosis']))
+    yield run("UPDATE appointment SET status = 'completed' WHERE appointment_id = %s", (appointment_id,))
+
+    pay = yield one("SELECT payment_id FROM payment WHERE appointment_id = %s LIMIT 1", (appointment_id,))
+    if not pay:
+        done = yield run("""
+            INSERT INTO payment (patient_id, appointment_id, amount, payment_method, payment_date, status)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (patient_id, appointment_id, 0.00, 'cash', None, 'unpaid'))
+        payment_id = done.lastrowid
+        yield run(LEGACY_UNPAID_SQL, (patient_id, 0.00))
+    else:
+        payment_id = pay["payment_id"]
+    yield COMMIT
+    schedule.remove(appointment_id)
+    cache.invalidate_patient(patient_id)
+    return {'status': 'success', 'data': {'treatment_id': treatment_id, 'payment_id': payment_id}}, 201
+
+
+class _Connection:
+    def __init__(self, bench, inner):
+        self._bench = bench
+        self._inner = inner
+
+    def start_transaction(self):
+        self._bench.trip()
+        self._inner.start_transaction()
+
+    def commit(self):
+        self._bench.trip()
+        self._inner.commit()
+
+    def rollback(self):
+        self._bench.trip()
+        self._inner.rollback()
+
+
+class LatencyCursor:
+    """cursor sqlite ที่หน่วง rtt วินาทีต่อ round trip และนับจำนวนครั้ง"""
+
+    def __init__(self, bench, inner):
+        self._bench = bench
+        self._inner = inner
+        self.connection = _Connection(bench, inner.connection)
+
+    def execute(self, sql, params=()):
+        self._bench.trip()
+        self._inner.execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        self._bench.trip()
+        self._inner.executemany(sql, seq_of_params)
+
+    def fetchone(self):
+        return self._inner.fetchone()
+
+    def fetchall(self):
+        return self._inner.fetchall()
+
+    @property
+    def lastrowid(self):
+        return self._inner.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._inner.rowcount
+
+    def close(self):
+        pass
+
+
+class Bench:
+    def __init__(self, rtt, requests):
+        self.rtt = rtt
+        self.trips = 0
+        self.raw = aiodb.SqliteDriver(":memory:")._open()
+        self.raw.execute("INSERT INTO doctor (doctor_id, first_name, last_name) VALUES (1, 'สมชาย', 'ใจดี')")
+        self.raw.executemany("INSERT INTO patient (patient_id, first_name, last_name) VALUES (?, ?, ?)",
+                             [(i, f"คนไข้{i}", "ทดสอบ") for i in range(1, requests + 1)])
+        self.raw.executemany("""
+            INSERT INTO appointment (appointment_id, patient_id, doctor_id, appointment_date, appointment_time)
+            VALUES (?, ?, 1, ?, '09:00:00')
+        """, [(i, i, date.today().isoformat()) for i in range(1, requests + 1)])
+
+    def trip(self):
+        self.trips += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def cursor(self):
+        return LatencyCursor(self, aiodb._SqliteCursor(self.raw))
+
+
+def measure(name, make_flow, rtt, requests):
+    bench = Bench(rtt, requests)
+    samples = []
+    for appointment_id in range(1, requests + 1):
+        data = {'appointment_id': appointment_id, 'symptom': 'ไอ', 'diagnosis': 'หวัด', 'advice': 'พักผ่อน'}
+        start = time.perf_counter()
+        body, status = flows.run_flow(make_flow(data), bench.cursor)
+        samples.append(time.perf_counter() - start)
+        assert status == 201, body
+
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"  {name:<10}: {bench.trips / requests:5.1f} round trips/request  "
+          f"p50 {statistics.median(samples) * 1e3:7.3f} ms  p95 {p95 * 1e3:7.3f} ms")
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rtt", type=float, default=0.3, help="latency ต่อ round trip (มิลลิวินาที)")
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"rtt={args.rtt} ms  requests={args.requests}")
+    legacy = measure("legacy", legacy_create_treatment, args.rtt / 1000, args.requests)
+    current = measure("current", flows.create_treatment, args.rtt / 1000, args.requests)
+    print(f"  speedup   : {legacy / current:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+สร้างข้อมูลคลินิกสังเคราะห์ (ชื่อไทย) แบบกำหนด seed ได้ — ได้ข้อมูลชุดเดิมทุกครั้งที่ใช้ seed เดิม
+
+  คนไข้ / แพทย์ / ตารางออกตรวจรายสัปดาห์ / ใบนัด (ย้อนหลังหลายเดือนถึง FUTURE_DAYS วันข้างหน้า)
+  การรักษา + การชำระเงินของนัดที่ completed / ตารางสรุป patient_visit_summary
+
+ใบนัดไม่ชนกัน (หนึ่งช่องต่อหมอต่อเวลา) และอยู่ในเวลาออกตรวจของหมอเสมอ
+วันข้างหน้าจองไว้ไม่เต็ม → ยังมีช่องว่างให้ทดสอบการจองใหม่
+
+รัน:  python bench/datagen.py --scale tiny --sqlite /tmp/clinic_bench.db      (จากโฟลเดอร์ backend)
+      python bench/datagen.py --scale full --mysql     (เขียนลง DB ตาม DB_HOST / DB_NAME ... — ตารางต้องว่าง
+                                                        และ python migrations.py up แล้ว)
+ไฟล์ <ปลายทาง>.meta.json เก็บขนาด / seed / ช่วงวันที่ ไว้ให้ bench_load.py ใช้ต่อ
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES = {
+    #         คนไข้     แพทย์   ใบนัด
+    "tiny":  (2_000,    10,    20_000),
+    "small": (20_000,   20,    200_000),
+    "full":  (200_000,  50,    2_000_000),
+}
+
+FUTURE_DAYS = 30
+BATCH = 10_000
+
+FIRST_NAMES = [
+    "สมชาย", "สมศักดิ์", "ประเสริฐ", "วิชัย", "สุรชัย", "ธนากร", "ณัฐวุฒิ", "กิตติพงษ์", "อนุชา", "ชัยวัฒน์",
+    "พงศกร", "ศุภชัย", "วีระพงษ์", "ธีรวัฒน์", "ปิยะพงษ์", "อภิชาติ", "เกียรติศักดิ์", "จิรายุ", "ภาณุพงศ์", "ณัฐพล",
+    "สมหญิง", "สุดารัตน์", "วันเพ็ญ", "กาญจนา", "นภาพร", "ปัทมา", "รัตนา", "ศิริพร", "อรุณี", "มาลี",
+    "จันทร์เพ็ญ", "พรทิพย์", "วราภรณ์", "สุภาวดี", "ณัฐธิดา", "กมลชนก", "ธิดารัตน์", "ปวีณา", "อัญชลี", "เบญจวรรณ",
+]
+LAST_NAMES = [
+    "ใจดี", "สุขสวัสดิ์", "ศรีสุข", "วงศ์ใหญ่", "แก้วมณี", "ทองคำ", "บุญมา", "จันทร์แก้ว", "พรหมมา", "สายทอง",
+    "รุ่งเรือง", "มั่นคง", "เจริญสุข", "ศักดิ์สิทธิ์", "ประเสริฐศรี", "อินทร์แก้ว", "สมบูรณ์", "นาคสวัสดิ์", "ธนสาร", "พึ่งบุญ",
+    "กิตติวงศ์", "ชัยมงคล", "วิเศษสุวรรณ", "ศรีวงศ์", "ทองดี", "บุญเรือง", "แสงอรุณ", "พิทักษ์ไทย", "สุวรรณรัตน์", "เพชรรัตน์",
+    "อ่อนละมัย", "ปัญญาดี", "มีสุข", "รักษาวงศ์", "ศรีประเสริฐ", "เลิศล้ำ", "บัวทอง", "คงเจริญ", "ไชยศรี", "นิลสุวรรณ",
+]
+SYMPTOMS = ["ไข้ ไอ เจ็บคอ", "ปวดหัว เวียนหัว", "ปวดท้อง ท้องเสีย", "ผื่นคัน", "ปวดหลัง", "น้ำมูกไหล จาม",
+            "นอนไม่หลับ", "ปวดข้อเข่า", "แผลถลอก", "ตรวจสุขภาพประจำปี"]
+DIAGNOSES = ["ไข้หวัด", "ไมเกรน", "กระเพาะอาหารอักเสบ", "ผื่นแพ้สัมผัส", "กล้ามเนื้ออักเสบ", "ภูมิแพ้จมูก",
+             "ภาวะนอนไม่หลับ", "ข้อเข่าเสื่อม", "แผลติดเชื้อเล็กน้อย", "สุขภาพปกติ"]
+ADVICE = ["พักผ่อนให้เพียงพอ ดื่มน้ำมาก ๆ", "ทานยาตามแพทย์สั่ง", "งดอาหารรสจัด", "หลีกเลี่ยงสารก่อภูมิแพ้",
+          "ประคบเย็นวันละ 2 ครั้ง", "ออกกำลังกายเบา ๆ", "นัดติดตามอาการ 2 สัปดาห์"]
+METHODS = ["cash", "transfer", "card"]
+# ไล่ตาม doctor_id (ไม่ใช้ rng → ข้อมูลส่วนอื่นของ seed เดิมไม่เปลี่ยน)
+SPECIALTIES = ["อายุรกรรม", "กุมารเวชกรรม", "ศัลยกรรม", "ออร์โธปิดิกส์", "ผิวหนัง"]
+
+# (ชื่อ, วันทำงาน [0=จันทร์], เริ่ม, เลิก, พัก (เริ่ม, เลิก) หรือ None, นาทีต่อช่อง)
+SCHEDULE_PATTERNS = [
+    ("เต็มวัน จ.–ศ.", range(0, 5), 9 * 60, 17 * 60, (12 * 60, 13 * 60), 15),
+    ("เต็มวัน จ.–ส.", range(0, 6), 8 * 60 + 30, 16 * 60 + 30, (12 * 60, 13 * 60), 20),
+    ("บ่าย–ค่ำ", range(0, 5), 13 * 60, 20 * 60, (17 * 60, 17 * 60 + 30), 15),
+    ("เช้า จ.–ศ.", range(0, 5), 8 * 60, 12 * 60, None, 10),
+]
+
+
+def _hhmmss(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+def _slots(pattern):
+    _, _, start, end, lunch, step = pattern
+    return [m for m in range(start, end, step)
+            if lunch is None or not (lunch[0] - step < m < lunch[1])]
+
+
+def generate(sink, scale="tiny", seed=42, today=None):
+    """
+    สร้างข้อมูลทั้งหมดแล้วส่งเป็นชุด ๆ ให้ sink(table, columns, rows)
+    คืน meta (จำนวนแถวต่อตาราง / ช่วงวันที่ / seed) — ไม่เก็บใบนัดทั้งหมดไว้ในหน่วยความจำ
+    """
+    patients, doctors, appointments = SCALES[scale]
+    rng = random.Random(seed)
+    today = today or date.today()
+    counts = {}
+
+    def flush(table, columns, rows, force=False):
+        if rows and (force or len(rows) >= BATCH):
+            sink(table, columns, rows)
+            counts[table] = counts.get(table, 0) + len(rows)
+            rows.clear()
+
+    # ---------- คนไข้ ----------
+    columns = ("patient_id", "first_name", "last_name", "birth_date", "phone")
+    rows = []
+    for pid in range(1, patients + 1):
+        birth = date(1940, 1, 1) + timedelta(days=rng.randrange(80 * 365))
+        rows.append((pid, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), birth,
+                     f"0{rng.choice('689')}{rng.randrange(10 ** 8):08d}"))
+        flush("patient", columns, rows)
+    flush("patient", columns, rows, force=True)
+
+    # ---------- แพทย์ + ตารางออกตรวจ ----------
+    plans = {}
+    doctor_rows, schedule_rows = [], []
+    for doctor_id in range(1, doctors + 1):
+        pattern = SCHEDULE_PATTERNS[rng.randrange(len(SCHEDULE_PATTERNS))]
+        plans[doctor_id] = (set(pattern[1]), _slots(pattern))
+        doctor_rows.append((doctor_id, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                            f"doctor{doctor_id}", "bench", SPECIALTIES[(doctor_id - 1) % len(SPECIALTIES)]))
+        _, weekdays, start, end, lunch, step = pattern
+        for weekday in weekdays:
+            schedule_rows.append((doctor_id, weekday, _hhmmss(start), _hhmmss(end), "work", step))
+            if lunch:
+                schedule_rows.append((doctor_id, weekday, _hhmmss(lunch[0]), _hhmmss(lunch[1]), "break", step))
+    flush("doctor", ("doctor_id", "first_name", "last_name", "username", "password", "specialty"),
+          doctor_rows, True)
+    flush("doctor_schedule", ("doctor_id", "weekday", "start_time", "end_time", "kind", "slot_minutes"),
+          schedule_rows, True)
+
+    # ---------- ใบนัด / การรักษา / การชำระเงิน ----------
+    # ไล่จากวันท้ายสุด (อนาคต) ย้อนกลับจนครบจำนวน → วันข้างหน้ามีนัดเสมอ ไม่ว่าจะเลือกขนาดไหน
+    appt_cols = ("appointment_id", "patient_id", "doctor_id", "appointment_date", "appointment_time", "status")
+    treat_cols = ("treatment_id", "patient_id", "doctor_id", "appointment_id", "symptom", "diagnosis",
+                  "advice", "treatment_date")
+    pay_cols = ("payment_id", "patient_id", "appointment_id", "amount", "payment_method", "payment_date", "status")
+    appt_rows, treat_rows, pay_rows = [], [], []
+    summary = {}         # patient_id → [last_visit, visit_count, last_diagnosis, unpaid_balance, unpaid_count]
+    last_day = today + timedelta(days=FUTURE_DAYS)
+    day = last_day
+    appointment_id = treatment_id = payment_id = 0
+
+    while appointment_id < appointments:
+        future = day >= today
+        for doctor_id in range(1, doctors + 1):
+            weekdays, slots = plans[doctor_id]
+            if day.weekday() not in weekdays:
+                continue
+            # วันข้างหน้าจองไว้ 20–50% ของช่อง ย้อนหลัง 40–85%
+            low, high = (0.2, 0.5) if future else (0.4, 0.85)
+            taken = rng.sample(slots, min(len(slots), int(len(slots) * rng.uniform(low, high))))
+            for minute in sorted(taken):
+                if appointment_id >= appointments:
+                    break
+                appointment_id += 1
+                patient_id = rng.randint(1, patients)
+                roll = rng.random()
+                if future:
+                    status = "scheduled" if roll < 0.9 else "cancelled"
+                else:
+                    status = ("completed" if roll < 0.8 else "cancelled" if roll < 0.88
+                              else "no_show" if roll < 0.95 else "scheduled")
+                appt_rows.append((appointment_id, patient_id, doctor_id, day, _hhmmss(minute), status))
+
+                if status == "completed":
+                    treatment_id += 1
+                    kind = rng.randrange(len(DIAGNOSES))
+                    diagnosis = DIAGNOSES[kind]
+                    treat_rows.append((treatment_id, patient_id, doctor_id, appointment_id, SYMPTOMS[kind],
+                                       diagnosis, rng.choice(ADVICE), day))
+                    payment_id += 1
+                    amount = Decimal(rng.randrange(4, 61) * 50)
+                    paid = rng.random() < 0.9
+                    pay_rows.append((payment_id, patient_id, appointment_id, amount,
+                                     rng.choice(METHODS) if paid else "cash", day if paid else None,
+                                     "paid" if paid else "unpaid"))
+
+                    s = summary.setdefault(patient_id, [None, 0, None, Decimal(0), 0])
+                    # ไล่วันย้อนหลัง → นัดแรกที่เจอคือครั้งล่าสุด
+                    if s[0] is None:
+                        s[0], s[2] = day, diagnosis
+                    s[1] += 1
+                    if not paid:
+                        s[3] += amount
+                        s[4] += 1
+            flush("appointment", appt_cols, appt_rows)
+            flush("treatment", treat_cols, treat_rows)
+            flush("payment", pay_cols, pay_rows)
+        day -= timedelta(days=1)
+    first_day = day + timedelta(days=1)
+    flush("appointment", appt_cols, appt_rows, True)
+    flush("treatment", treat_cols, treat_rows, True)
+    flush("payment", pay_cols, pay_rows, True)
+
+    summary_rows = [(pid, *values) for pid, values in sorted(summary.items())]
+    for i in range(0, len(summary_rows), BATCH):
+        flush("patient_visit_summary", ("patient_id", "last_visit", "visit_count", "last_diagnosis",
+                                        "unpaid_balance", "unpaid_count"), summary_rows[i:i + BATCH], True)
+
+    return {
+        'scale': scale,
+        'seed': seed,
+        'today': today.isoformat(),
+        'first_day': first_day.isoformat(),
+        'last_day': last_day.isoformat(),
+        'patients': patients,
+        'doctors': doctors,
+        'rows': counts,
+    }
+
+
+# ---------- ปลายทาง ----------
+def sqlite_sink(raw):
+    """เขียนลง sqlite3 connection ที่สร้างตารางจาก sql/sqlite_dev.sql แล้ว (เช่น aiodb.SqliteDriver()._open())"""
+    from aiodb import _sqlite_param
+
+    def sink(table, columns, rows):
+        raw.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                        [[_sqlite_param(v) for v in row] for row in rows])
+    return sink
+
+
+def mysql_sink(conn):
+    """เขียนลง MySQL (mysql-connector รวม executemany ของ INSERT เป็นคำสั่งเดียวต่อชุด)"""
+    cur = conn.cursor()
+
+    def sink(table, columns, rows):
+        cur.execute("START TRANSACTION")
+        cur.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                        rows)
+        cur.execute("COMMIT")
+    return sink
+
+
+def build_sqlite(path=":memory:", scale="tiny", seed=42, today=None):
+    """สร้าง sqlite พร้อมข้อมูล → (sqlite3 connection, meta)"""
+    import aiodb
+
+    raw = aiodb.SqliteDriver(path)._open()
+    raw.execute("BEGIN")
+    meta = generate(sqlite_sink(raw), scale, seed, today)
+    raw.execute("COMMIT")
+    raw.execute("ANALYZE")
+    return raw, meta
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=sorted(SCALES), default="tiny")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--today", type=date.fromisoformat, default=None,
+                        help="วันอ้างอิง YYYY-MM-DD (ค่าเริ่มต้น วันนี้) ใช้เมื่อต้องการข้อมูลชุดเดียวกันเป๊ะข้ามวัน")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--sqlite", metavar="PATH", help="ไฟล์ sqlite ปลายทาง (ต้องยังไม่มี)")
+    target.add_argument("--mysql", action="store_true", help="เขียนลง MySQL ตาม DB_* (ตารางต้องว่าง)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.sqlite:
+        if os.path.exists(args.sqlite):
+            parser.error(f"{args.sqlite} มีอยู่แล้ว")
+        raw, meta = build_sqlite(args.sqlite, args.scale, args.seed, args.today)
+        raw.close()
+        meta_path = args.sqlite + ".meta.json"
+    else:
+        import mysql.connector
+        from db import DB_CONFIG
+
+        conn = mysql.connector.connect(**dict(DB_CONFIG, autocommit=False))
+        try:
+            meta = generate(mysql_sink(conn), args.scale, args.seed, args.today)
+        finally:
+            conn.close()
+        meta_path = f"{DB_CONFIG['database']}.meta.json"
+
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    print(f">>> {meta['rows']}  ({time.perf_counter() - started:.1f} s) → {meta_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
 from flask import Blueprint, request, jsonify
-import mysql.connector
-import re
 from datetime import datetime, timedelta
+from db import get_db, get_cursor
+from schedule_index import schedule, split_datetime, to_date, to_minutes, format_minutes
+from working_hours import hours
+import availability
+from intent_matcher import KeywordMatcher
+from entity_extractor import extract_entities
+import flows
+import metrics
+from flows import run_flow
 
 INTENT_KEYWORDS = {
     "suggest_slots": [
@@ -27,68 +34,45 @@ INTENT_KEYWORDS = {
         "รายละเอียดคนไข้", "ดึงข้อมูลคนไข้", "ประวัติการรักษา",
         "ประวัติรักษา", "เคยรักษาอะไรบ้าง", "เคยมาหาหมอเรื่องอะไรบ้าง",
         "การรักษาล่าสุด", "มารักษาล่าสุดเมื่อไหร่",
-    ]
+    ],
+    "next_slot": [
+        # walk-in: คิวว่างที่เร็วที่สุดของหมอคนไหนก็ได้ (หรือเฉพาะสาขา)
+        "คิวว่างเร็วที่สุด", "คิวว่างที่เร็วที่สุด", "คิวที่เร็วที่สุด", "คิวแรกที่ว่าง",
+        "ว่างเร็วที่สุด", "ว่างเร็วสุด", "คิวว่างใกล้ที่สุด", "คิวว่างที่ใกล้ที่สุด",
+        "หมอคนไหนว่าง", "หมอท่านไหนว่าง", "คนไหนว่าง", "ท่านไหนว่าง", "ตอนนี้หมอคนไหนว่าง", "หมอว่างตอนนี้",
+        "นัดได้เร็วสุด", "นัดได้เร็วที่สุด", "คิวถัดไปที่ว่าง", "walk in", "walk-in", "วอล์กอิน",
+    ],
 }
 
-def detect_intent(message: str):
+# compile ครั้งเดียวตอน import (ถ้าแก้ INTENT_KEYWORDS ตอนรันต้องสร้างใหม่)
+_intent_matcher = KeywordMatcher(INTENT_KEYWORDS)
+
+
+def detect_intents(message: str):
     """
-    เดาเจตนาจากข้อความภาษาไทย
-    คืนค่า: "suggest_slots" / "check_appointment" / "patient_summary" / None
+    หา intent ทุกตัวที่เจอคีย์เวิร์ดในข้อความ พร้อมคะแนน (ยาวสุด, รวมตัวอักษร)
+    คืนค่า: [("patient_summary", (12, 20)), ...] เรียงจากคะแนนมากไปน้อย
     """
     if not message:
-        return None
-
-    msg = message.strip().lower()
-
-    for intent, keywords in INTENT_KEYWORDS.items():
-        for kw in keywords:
-            if kw in msg:
-                return intent
-
-    return None
-
-
-def extract_entities(message: str):
-    """ดึงเลขหมอ, เลขคนไข้, วันที่ จากประโยคภาษาไทยแบบง่าย ๆ"""
-    entities = {}
-    msg = message.lower()
+        return []
+    return _intent_matcher.scores(message.strip())
 
-    m = re.search(r"คนไข้\s*(\d+)", msg)
-    if m:
-        entities["patient_id"] = int(m.group(1))
 
-    m = re.search(r"(หมอ|แพทย์)(หมายเลข)?\s*(\d+)", msg)
-    if m:
-        entities["doctor_id"] = int(m.group(3))
-
-    m = re.search(r"วันที่\s*(\d+)", msg)
-    today = datetime.today()
-    if m:
-        day = int(m.group(1))
-        try:
-            entities["date"] = today.replace(day=day).strftime("%Y-%m-%d")
-        except ValueError:
-            pass
-
-    if "วันนี้" in msg:
-        entities["date"] = today.strftime("%Y-%m-%d")
-    elif "พรุ่งนี้" in msg:
-        entities["date"] = (today + timedelta(days=1)).strftime("%Y-%m-%d")
+def detect_intent(message: str):
+    """
+    เดาเจตนาจากข้อความภาษาไทย (คีย์เวิร์ดที่ยาว/เฉพาะเจาะจงที่สุดชนะ)
+    คืนค่า: "suggest_slots" / "check_appointment" / "patient_summary" / "next_slot" / None
+    """
+    ranked = detect_intents(message)
+    intent = ranked[0][0] if ranked else None
+    metrics.CHAT_INTENTS.inc(intent or "none")
+    return intent
 
-    return entities
 
 # Blueprint + DB
 
 bot_bp = Blueprint("bot", __name__)
 
-def get_db():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="root",
-        database="clinic_db",
-        charset="utf8mb4"
-    )
 # CORE ฟังก์ชันที่คุยกับ DB
 
 def _suggest_slots_core(doctor_id, date_str):
@@ -96,62 +80,72 @@ def _suggest_slots_core(doctor_id, date_str):
     คำนวณช่วงเวลาว่างของแพทย์ในวันที่กำหนด
     คืนค่า: { "ok": True, "available_slots": ["09:00", "09:15", ...] }
     """
+    slots = availability.free_slots_for_day(doctor_id, date_str)
+    return {"ok": True, "available_slots": slots}
+
+
+def _all_doctor_ids(specialty=None):
     db = get_db()
-    cur = db.cursor(dictionary=True)
+    cur = db.cursor()
+    if specialty:
+        cur.execute("SELECT doctor_id FROM doctor WHERE specialty = %s ORDER BY doctor_id", (specialty,))
+    else:
+        cur.execute("SELECT doctor_id FROM doctor ORDER BY doctor_id")
+    ids = [row[0] for row in cur.fetchall()]
+    cur.close()
+    db.close()
+    return ids
 
-    cur.execute("""
-        SELECT TIME(appointment_time) AS t
-        FROM appointment
-        WHERE doctor_id = %s
-          AND DATE(appointment_time) = %s
-          AND status IN ('scheduled','rescheduled')
-    """, (doctor_id, date_str))
-    busy_times = {row["t"].strftime("%H:%M") for row in cur.fetchall()}
-
-    slots = []
-    start = datetime.strptime(date_str + " 09:00", "%Y-%m-%d %H:%M")
-    end   = datetime.strptime(date_str + " 17:00", "%Y-%m-%d %H:%M")
-
-    current = start
-    while current <= end:
-        t_str = current.strftime("%H:%M")
-        if t_str not in busy_times:
-            slots.append(t_str)
-        current += timedelta(minutes=15)
 
+def _existing_doctor_ids(doctor_ids):
+    """doctor_ids ที่มีอยู่จริงในตาราง doctor (ลำดับเดิม) — id ที่ไม่มีจะได้ DEFAULT_PLAN เหมือนหมอจริง จึงต้องกรองก่อน"""
+    if not doctor_ids:
+        return []
+    db = get_db()
+    cur = db.cursor()
+    cur.execute(f"SELECT doctor_id FROM doctor WHERE doctor_id IN ({', '.join(['%s'] * len(doctor_ids))})",
+                tuple(doctor_ids))
+    found = {row[0] for row in cur.fetchall()}
     cur.close()
     db.close()
+    return [d for d in doctor_ids if d in found]
 
-    return {"ok": True, "available_slots": slots}
 
+def _specialties():
+    db = get_db()
+    cur = db.cursor()
+    cur.execute("SELECT DISTINCT specialty FROM doctor WHERE specialty IS NOT NULL AND specialty <> ''")
+    names = [row[0] for row in cur.fetchall()]
+    cur.close()
+    db.close()
+    return names
 
-def _patient_summary_core(patient_id: int):
+
+def _next_slots_core(doctor_ids, start_day, start_minute, k=5, days=availability.NEXT_SLOTS_DAYS):
     """
-    ดึงข้อมูลคนไข้ + ประวัติการรักษาล่าสุด 5 รายการ
+    K ช่องว่างที่เร็วที่สุดข้ามหมอใน doctor_ids นับจาก start_minute ของ start_day (ดู availability.next_free_slots)
+    คืนค่า: { "ok": True, "slots": [{"doctor_id", "date", "time"}, ...] }
     """
-    db = get_db()
-    cur = db.cursor(dictionary=True)
+    return {"ok": True, "slots": availability.next_free_slots(doctor_ids, start_day, start_minute, k, days)}
 
-    cur.execute("SELECT * FROM patient WHERE patient_id = %s", (patient_id,))
-    patient = cur.fetchone()
-    if patient is None:
-        cur.close()
-        db.close()
-        return {"ok": False, "patient": None, "recent_treatments": []}
-
-    cur.execute("""
-        SELECT t.treatment_date, t.diagnosis, t.advice
-        FROM treatment t
-        WHERE t.patient_id = %s
-        ORDER BY t.treatment_date DESC
-        LIMIT 5
-    """, (patient_id,))
-    history = cur.fetchall()
 
-    cur.close()
-    db.close()
+def _start_of(value):
+    """'YYYY-MM-DD HH:MM' / 'YYYY-MM-DD' (เริ่มต้นวัน) / ไม่ส่ง (ตอนนี้) → (date, นาทีของวัน)"""
+    if not value:
+        now = datetime.now()
+        return now.date(), now.hour * 60 + now.minute
+    try:
+        return split_datetime(value)
+    except ValueError:
+        return to_date(value), 0
 
-    return {"ok": True, "patient": patient, "recent_treatments": history}
+
+def _patient_summary_core(patient_id: int):
+    """
+    ดึงข้อมูลคนไข้ + สรุปการมารักษา + ประวัติการรักษาล่าสุด 5 รายการ (ผ่าน cache) ดู flows.patient_summary
+    คืนค่า: { "ok", "patient", "summary", "recent_treatments" }
+    """
+    return run_flow(flows.patient_summary(patient_id), get_cursor, unavailable=None)
 
 # ROUTES
 @bot_bp.route("/api/bot/ping", methods=["GET"])
@@ -179,6 +173,18 @@ def validate_appointment():
     if errors:
         return jsonify({"ok": False, "errors": errors}), 400
 
+    # รับได้ทั้ง "YYYY-MM-DD HH:MM" หรือแยก appointment_date + appointment_time
+    try:
+        if data.get("appointment_date"):
+            appt_date = to_date(data["appointment_date"])
+            appt_minute = to_minutes(appointment_time)
+        else:
+            appt_date, appt_minute = split_datetime(appointment_time)
+        # แก้ไขนัดเดิม → ไม่นับนัดนั้นเองว่าชน
+        exclude_id = int(data["appointment_id"]) if data.get("appointment_id") else None
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "errors": ["รูปแบบวันและเวลานัดหมายหรือ appointment_id ไม่ถูกต้อง"]}), 400
+
     db = get_db()
     cur = db.cursor(dictionary=True)
 
@@ -191,22 +197,18 @@ def validate_appointment():
     if doctor is None:
         errors.append("ไม่พบข้อมูลแพทย์ในระบบ")
 
-    if not errors:
-        cur.execute("""
-            SELECT appointment_id
-            FROM appointment
-            WHERE doctor_id = %s
-              AND appointment_time BETWEEN DATE_SUB(%s, INTERVAL 15 MINUTE)
-                                      AND DATE_ADD(%s, INTERVAL 15 MINUTE)
-              AND status IN ('scheduled','rescheduled')
-        """, (doctor_id, appointment_time, appointment_time))
-        conflict = cur.fetchone()
-        if conflict:
-            errors.append("ช่วงเวลาดังกล่าวมีนัดของแพทย์ท่านนี้อยู่แล้ว กรุณาเลือกเวลาอื่นที่ห่างอย่างน้อย 15 นาที")
-
     cur.close()
     db.close()
 
+    # ใช้กติกาเดียวกับ /appointments (เวลาออกตรวจของหมอ + schedule index ในหน่วยความจำ)
+    if not errors:
+        plan = hours.plan_for(doctor_id, appt_date)
+        if not plan.is_open(appt_minute):
+            errors.append("แพทย์ไม่ได้ออกตรวจในวัน/เวลาดังกล่าว กรุณาเลือกเวลาอื่น")
+        elif schedule.find_conflict(doctor_id, appt_date, appt_minute, gap=plan.step,
+                                    exclude_id=exclude_id) is not None:
+            errors.append(f"ช่วงเวลาดังกล่าวมีนัดของแพทย์ท่านนี้อยู่แล้ว กรุณาเลือกเวลาอื่นที่ห่างอย่างน้อย {plan.step} นาที")
+
     if errors:
         return jsonify({"ok": False, "errors": errors}), 400
 
@@ -222,7 +224,10 @@ def suggest_slots():
     if not doctor_id or not date:
         return jsonify({"ok": False, "errors": ["กรุณาเลือกแพทย์และวันที่"]}), 400
 
-    result = _suggest_slots_core(doctor_id, date)
+    try:
+        result = _suggest_slots_core(int(doctor_id), date)
+    except ValueError:
+        return jsonify({"ok": False, "errors": ["รูปแบบรหัสแพทย์หรือวันที่ไม่ถูกต้อง"]}), 400
 
     return jsonify({
         "ok": True,
@@ -232,25 +237,100 @@ def suggest_slots():
     }), 200
 
 
-@bot_bp.route("/api/bot/patient_summary", methods=["GET"])
-def patient_summary():
-    patient_id = request.args.get("patient_id")
+@bot_bp.route("/api/bot/suggest_slots_range", methods=["POST"])
+def suggest_slots_range():
+    """
+    เวลาว่างหลายหมอ หลายวัน (เช่น หน้าเคาน์เตอร์ "ทุกหมอ 14 วันข้างหน้า")
+    body: { "doctor_ids": [1, 2] (ไม่ส่ง = ทุกหมอ), "start_date": "YYYY-MM-DD" (ไม่ส่ง = วันนี้), "days": 14 }
+    """
+    data = request.get_json(force=True, silent=True) or {}
 
-    if not patient_id:
-        return jsonify({"ok": False, "errors": ["กรุณาระบุรหัสผู้ป่วย"]}), 400
+    try:
+        start = to_date(data.get("start_date") or datetime.today().date())
+        days = int(data.get("days") or 14)
+        doctor_ids = [int(d) for d in (data.get("doctor_ids") or [])]
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "errors": ["รูปแบบ doctor_ids / start_date / days ไม่ถูกต้อง"]}), 400
+
+    if not 1 <= days <= availability.MAX_RANGE_DAYS:
+        return jsonify({"ok": False, "errors": [f"days ต้องอยู่ระหว่าง 1–{availability.MAX_RANGE_DAYS}"]}), 400
 
-    result = _patient_summary_core(patient_id)
+    try:
+        if doctor_ids:
+            known = _existing_doctor_ids(doctor_ids)
+        else:
+            doctor_ids = known = _all_doctor_ids()
+    except Exception as e:
+        print("suggest_slots_range error:", e)
+        return jsonify({"ok": False, "errors": ["ไม่สามารถดึงรายชื่อแพทย์ได้"]}), 500
 
-    if not result["ok"]:
-        return jsonify({"ok": False, "errors": ["ไม่พบข้อมูลผู้ป่วย"]}), 404
+    unknown = [d for d in doctor_ids if d not in known]
+    if unknown:
+        return jsonify({"ok": False, "errors": [f"ไม่พบแพทย์รหัส {', '.join(map(str, unknown))}"]}), 400
+
+    end = start + timedelta(days=days - 1)
+    slots = availability.free_slots_range(doctor_ids, start, end)
 
     return jsonify({
         "ok": True,
-        "patient": result["patient"],
-        "recent_treatments": result["recent_treatments"]
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "doctors": [{"doctor_id": d, "slots": slots[d]} for d in doctor_ids]
     }), 200
 
 
+@bot_bp.route("/api/bot/next_slots", methods=["POST"])
+def next_slots():
+    """
+    ช่องว่างที่เร็วที่สุด K ช่องข้ามหมอทุกคน (หรือเฉพาะสาขา / หมอที่เลือก) สำหรับคนไข้ walk-in
+    body: { "k": 5, "specialty": "อายุรกรรม" | "doctor_ids": [1, 2] (ไม่ส่ง = ทุกหมอ),
+            "from": "YYYY-MM-DD HH:MM" (ไม่ส่ง = ตอนนี้), "days": 14 (ไม่ส่ง = NEXT_SLOTS_DAYS) }
+    """
+    data = request.get_json(force=True, silent=True) or {}
+
+    try:
+        k = int(data.get("k", 5))
+        days = int(data.get("days", availability.NEXT_SLOTS_DAYS))
+        doctor_ids = [int(d) for d in (data.get("doctor_ids") or [])]
+        start_day, start_minute = _start_of(data.get("from"))
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "errors": ["รูปแบบ k / doctor_ids / from / days ไม่ถูกต้อง"]}), 400
+
+    if not 1 <= k <= availability.MAX_NEXT_SLOTS:
+        return jsonify({"ok": False, "errors": [f"k ต้องอยู่ระหว่าง 1–{availability.MAX_NEXT_SLOTS}"]}), 400
+    if not 1 <= days <= availability.MAX_RANGE_DAYS:
+        return jsonify({"ok": False, "errors": [f"days ต้องอยู่ระหว่าง 1–{availability.MAX_RANGE_DAYS}"]}), 400
+
+    specialty = (data.get("specialty") or "").strip() or None
+    try:
+        if doctor_ids:
+            known = _existing_doctor_ids(doctor_ids)
+        else:
+            doctor_ids = known = _all_doctor_ids(specialty)
+    except Exception as e:
+        print("next_slots error:", e)
+        return jsonify({"ok": False, "errors": ["ไม่สามารถดึงรายชื่อแพทย์ได้"]}), 500
+
+    unknown = [d for d in doctor_ids if d not in known]
+    if unknown:
+        return jsonify({"ok": False, "errors": [f"ไม่พบแพทย์รหัส {', '.join(map(str, unknown))}"]}), 400
+
+    result = _next_slots_core(doctor_ids, start_day, start_minute, k, days)
+    return jsonify({
+        "ok": True,
+        "from": f"{start_day.isoformat()} {format_minutes(start_minute)}",
+        "specialty": specialty,
+        "slots": result["slots"]
+    }), 200
+
+
+@bot_bp.route("/api/bot/patient_summary", methods=["GET"])
+def patient_summary():
+    body, status = run_flow(flows.bot_patient_summary(request.args.get("patient_id")),
+                            get_cursor, unavailable=None)
+    return jsonify(body), status
+
+
 @bot_bp.route("/api/bot/chat", methods=["POST"])
 def chat():
     data = request.get_json(force=True, silent=True) or {}
@@ -265,7 +345,7 @@ def chat():
     if intent is None:
         return jsonify({
             "ok": False,
-            "reply": "ตอนนี้ผมยังไม่เข้าใจคำสั่งนี้ ลองใช้คำว่า เช็กนัด / เวลาว่างหมอ / ประวัติคนไข้ ดูนะครับ"
+            "reply": "ตอนนี้ผมยังไม่เข้าใจคำสั่งนี้ ลองใช้คำว่า เช็กนัด / เวลาว่างหมอ / คิวว่างเร็วที่สุด / ประวัติคนไข้ ดูนะครับ"
         }), 200
 
     # intent: เวลาว่างหมอ
@@ -314,6 +394,46 @@ def chat():
 
         return jsonify({"ok": True, "reply": text}), 200
 
+    # intent: คิวว่างเร็วที่สุด (ทุกหมอ / เฉพาะสาขาที่พิมพ์มา / หมอที่ระบุ)
+    if intent == "next_slot":
+        date = entities.get("date")
+        if date and date > datetime.today().date().isoformat():
+            start_day, start_minute = to_date(date), 0
+        else:
+            start_day, start_minute = _start_of(None)
+        if entities.get("time"):
+            start_minute = to_minutes(entities["time"])
+
+        specialty = None
+        if not entities.get("doctor_id"):
+            lowered = message.lower()
+            try:
+                specialty = max((s for s in _specialties() if s.lower() in lowered), key=len, default=None)
+            except Exception as e:
+                # หาสาขาไม่ได้ (DB ล่ม / ยังไม่ migrate คอลัมน์ specialty) → ค้นจากหมอทุกคนแทน
+                print("chat next_slot specialty error:", e)
+
+        try:
+            if entities.get("doctor_id"):
+                doctor_ids = _existing_doctor_ids([entities["doctor_id"]])
+                if not doctor_ids:
+                    return jsonify({"ok": False, "reply": f"ไม่พบหมอรหัส {entities['doctor_id']} ครับ"}), 200
+            else:
+                doctor_ids = _all_doctor_ids(specialty)
+        except Exception as e:
+            print("chat next_slot error:", e)
+            return jsonify({"ok": False, "reply": "ตอนนี้ดึงรายชื่อหมอไม่ได้ ลองใหม่อีกครั้งนะครับ"}), 200
+
+        slots = _next_slots_core(doctor_ids, start_day, start_minute)["slots"]
+        scope = f"หมอสาขา{specialty}" if specialty else "หมอ"
+        if not slots:
+            text = f"ช่วง {availability.NEXT_SLOTS_DAYS} วันนี้{scope}ไม่มีคิวว่างแล้วครับ"
+        else:
+            items = ", ".join(f"หมอ {s['doctor_id']} วันที่ {s['date']} {s['time']}" for s in slots)
+            text = f"คิวว่างที่เร็วที่สุดของ{scope}: {items} ครับ"
+
+        return jsonify({"ok": True, "reply": text, "slots": slots}), 200
+
     if intent == "check_appointment":
         return jsonify({
             "ok": True,
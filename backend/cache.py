@@ -0,0 +1,149 @@
+"""
+cache ในหน่วยความจำแบบ LRU + TTL จำกัดทั้งจำนวนรายการและขนาด (ไบต์โดยประมาณ)
+
+ใช้กับข้อมูลคนไข้ที่หมอเปิดซ้ำบ่อยระหว่างตรวจ:
+  summary_cache   ผลของ _patient_summary_core (bot)
+  records_cache   ประวัติการรักษาของ /patients/<pid>/records
+
+ทุกรายการติด tag ("patient", pid) ไว้ → invalidate_patient(pid) ล้างเฉพาะของคนไข้นั้น
+ต้องเรียกทุกครั้งที่เขียนข้อมูลของคนไข้ (create_treatment, pay_payment, แก้ข้อมูลคนไข้)
+ค่าที่ได้จาก cache ใช้ร่วมกันหลายคำขอ ห้ามแก้ไข (mutate) ตรง ๆ
+
+cache แยกต่อ process: ถ้ารันหลาย worker อีก worker จะเห็นข้อมูลใหม่ไม่เกิน TTL วินาที
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+MISSING = object()
+
+
+def _sizeof(value):
+    try:
+        return len(json.dumps(value, default=str, ensure_ascii=False).encode("utf-8"))
+    except Exception:
+        return 1024
+
+
+class TTLCache:
+    def __init__(self, name, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._data = OrderedDict()     # key -> (expires_at, size, value, tags)
+        self._tags = {}                # tag -> {key, ...}
+        self._versions = {}            # tag -> จำนวนครั้งที่ถูก invalidate (กันเขียนค่าเก่าทับ)
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """คืนค่าใน cache หรือ MISSING"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def version(self, tag):
+        """อ่านก่อน query DB แล้วส่งให้ set() — ถ้ามีการ invalidate ระหว่างนั้นจะไม่เก็บค่าเก่า"""
+        with self._lock:
+            return self._versions.get(tag, 0)
+
+    def set(self, key, value, tags=(), versions=None):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if versions and any(self._versions.get(t, 0) != v for t, v in versions.items()):
+                return
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, size, value, tuple(tags))
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_tag(self, tag):
+        with self._lock:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+            for key in self._tags.pop(tag, ()):
+                if key in self._data:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _, tags = self._data.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+summary_cache = TTLCache("patient_summary")
+records_cache = TTLCache("patient_records")
+
+
+def patient_tag(patient_id):
+    return ("patient", int(patient_id))
+
+
+def invalidate_patient(patient_id):
+    """ล้าง cache ทุกอย่างของคนไข้คนนี้ (เรียกหลัง commit การเขียนข้อมูลคนไข้)"""
+    tag = patient_tag(patient_id)
+    summary_cache.invalidate_tag(tag)
+    records_cache.invalidate_tag(tag)
+
+
+def all_stats():
+    return {c.name: c.stats() for c in (summary_cache, records_cache)}
@@ -0,0 +1,346 @@
+"""
+ฟีดการเปลี่ยนแปลงของใบนัด / การชำระเงิน ส่งให้หน้าจอแบบ server-sent events (GET /events)
+
+หน้าจอเคาน์เตอร์ / หน้าจอหมอเปิด EventSource ค้างไว้แทนการ poll รายการเต็มซ้ำ ๆ
+ได้ event เฉพาะที่ตรงกับตัวกรอง แล้วค่อยแก้รายการบนจอเอง (หรือดึงเฉพาะแถวที่เปลี่ยน)
+ระหว่างไม่มีอะไรเปลี่ยน connection ที่เปิดค้างไม่แตะ DB เลย
+
+  GET /events?topics=appointment,payment&doctor_id=1&date=2025-11-20&status=unpaid
+    topics     appointment / payment (ไม่ส่ง = ทั้งหมด)
+    doctor_id  เฉพาะใบนัดของหมอคนนี้ (รวมนัดที่เพิ่งย้ายออก; event ของ payment ไม่มีหมอ → ไม่กรอง)
+    date       เฉพาะใบนัดของวันนั้น (YYYY-MM-DD รวมนัดที่เพิ่งย้ายออก)
+    status     สถานะใหม่ หรือสถานะเดิม (previous_status) ตรงกับค่านี้ เช่น unpaid → ได้ทั้งตอนเกิดและตอนจ่ายแล้ว
+  ต่อใหม่ด้วย header Last-Event-ID (EventSource ส่งให้เอง) → ได้ event ที่พลาดไประหว่างหลุด
+  ถ้าพลาดนานเกินกว่าที่เก็บไว้ (FEED_BUFFER รายการ) หรือ server restart ระหว่างนั้น จะได้ event "reset"
+  → ให้ดึงรายการเต็มใหม่หนึ่งครั้ง
+
+รูปแบบ event (data เป็น JSON):
+  event: appointment  {seq, type, action, appointment_id, patient_id, doctor_id,
+                       appointment_date, appointment_time, status,
+                       previous_doctor_id, previous_date, previous_status}
+  event: payment      {seq, type, action, payment_id, patient_id, appointment_id, amount,
+                       status, previous_status}
+  action: created / updated / cancelled / no_show / completed / imported / paid
+
+handler ที่เขียนข้อมูลต้องเรียก publish_* หลัง commit สำเร็จเท่านั้น
+ฟีดแยกต่อ process: รันหลาย worker ด้วย serve.py ซึ่งส่งต่อ event ระหว่าง worker ให้
+(รันหลาย process ด้วยวิธีอื่น client จะเห็นเฉพาะ event จาก worker ที่ตัวเองต่ออยู่)
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from decimal import Decimal
+
+from schedule_index import to_date, to_minutes, format_minutes
+
+FEED_BUFFER = int(os.getenv("FEED_BUFFER", "5000"))          # จำนวน event ล่าสุดที่เก็บไว้ให้ต่อใหม่
+HEARTBEAT_SECONDS = float(os.getenv("FEED_HEARTBEAT", "15"))  # ส่ง comment กัน proxy ตัด connection
+RETRY_MS = 3000                                               # เวลาที่ browser รอก่อนต่อใหม่
+
+TOPICS = ("appointment", "payment")
+
+
+def _new_epoch():
+    return format(int(time.time() * 1000), "x") + format(os.getpid(), "x")
+
+
+# เปลี่ยนทุกครั้งที่ process เริ่มใหม่ / fork (ใส่ไว้หน้า id ของ event)
+# → Last-Event-ID จากรอบก่อนหรือจาก worker อื่นใช้ต่อไม่ได้ (ได้ reset แทนการข้าม event)
+EPOCH = _new_epoch()
+
+
+class ChangeFeed:
+    def __init__(self, size=FEED_BUFFER):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=size)     # [(seq, event dict)] เรียงตาม seq
+        self._seq = 0
+        self._waiters = set()                 # future ของ subscriber แบบ async: (loop, future)
+        self._published = 0
+        self._subscribers = 0
+        self._listeners = []                  # ฟังก์ชันที่เรียกทุก event (เช่น versions.observe)
+        self.closed = False
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def close(self):
+        """ตอนปิด worker: ปลุก subscriber ทุกตัวให้จบ stream (browser จะต่อใหม่ไปที่ worker อื่นเอง)"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def reset_after_fork(self):
+        """process ลูกหลัง fork: เริ่มฟีดใหม่ (subscriber / lock ของ process แม่ไม่ได้ติดมาด้วย)"""
+        self._cond = threading.Condition()
+        self._events.clear()
+        self._seq = 0
+        self._waiters = set()
+        self._subscribers = 0
+        self.closed = False
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    def publish(self, event):
+        with self._cond:
+            self._seq += 1
+            self._published += 1
+            seq = self._seq
+            event = dict(event, seq=seq)
+            # listener ทำงานก่อน subscriber เห็น event (client ที่ได้ event แล้วดึงใหม่ต้องได้ ETag ใหม่)
+            for fn in self._listeners:
+                try:
+                    fn(event)
+                except Exception as e:
+                    print("change_feed listener error:", e)
+            self._events.append((seq, event))
+            self._cond.notify_all()
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        return seq
+
+    def since(self, seq):
+        """
+        event หลัง seq → (รายการ event, seq ล่าสุด)
+        คืน None ถ้า seq เก่ากว่าที่เก็บไว้ (ต้อง reset)
+        """
+        with self._cond:
+            return self._since(seq)
+
+    def _since(self, seq):
+        if self._events and seq < self._events[0][0] - 1:
+            return None
+        if seq == self._seq:
+            return [], seq
+        start = max(0, len(self._events) - (self._seq - seq))
+        return [self._events[i][1] for i in range(start, len(self._events))], self._seq
+
+    def wait(self, seq, timeout):
+        """รอจนมี event หลัง seq (หรือครบ timeout) — สำหรับ thread ของ WSGI"""
+        with self._cond:
+            if self._seq == seq and not self.closed:
+                self._cond.wait(timeout)
+            return self._since(seq)
+
+    async def wait_async(self, seq, timeout):
+        """เหมือน wait() แต่ไม่กิน thread — สำหรับโหมด ASGI"""
+        import asyncio           # ใช้เฉพาะโหมด ASGI ไม่ต้องโหลดตอน import ของโหมด sync
+
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._seq != seq or self.closed:
+                return self._since(seq)
+            future = loop.create_future()
+            self._waiters.add((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._waiters.discard((loop, future))
+        return self.since(seq)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'last_seq': self._seq,
+                'buffered': len(self._events),
+                'published': self._published,
+                'subscribers': self._subscribers,
+                'async_waiters': len(self._waiters),
+            }
+
+    def subscribed(self, delta):
+        with self._cond:
+            self._subscribers += delta
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+feed = ChangeFeed()
+
+
+def _after_fork():
+    global EPOCH
+    EPOCH = _new_epoch()
+    feed.reset_after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+# ---------- publish จาก handler ----------
+def _plain(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _date_text(value):
+    try:
+        return to_date(value).isoformat() if value is not None else None
+    except ValueError:
+        return str(value)
+
+
+def _time_text(value):
+    try:
+        return format_minutes(to_minutes(value)) if value is not None else None
+    except ValueError:
+        return str(value)
+
+
+def publish_appointment(action, appointment_id, doctor_id, appointment_date, appointment_time,
+                        status, patient_id=None, previous=None):
+    """previous = dict ของค่าก่อนแก้ (doctor_id / appointment_date / status) ถ้ามี"""
+    previous = previous or {}
+    feed.publish({
+        'type': 'appointment',
+        'action': action,
+        'appointment_id': appointment_id,
+        'patient_id': patient_id,
+        'doctor_id': int(doctor_id) if doctor_id is not None else None,
+        'appointment_date': _date_text(appointment_date),
+        'appointment_time': _time_text(appointment_time),
+        'status': status,
+        'previous_doctor_id': previous.get('doctor_id'),
+        'previous_date': _date_text(previous.get('appointment_date')),
+        'previous_status': previous.get('status'),
+    })
+
+
+def publish_payment(action, payment_id, patient_id, status, amount=None, appointment_id=None,
+                    previous_status=None):
+    feed.publish({
+        'type': 'payment',
+        'action': action,
+        'payment_id': payment_id,
+        'patient_id': patient_id,
+        'appointment_id': appointment_id,
+        'amount': _plain(amount),
+        'status': status,
+        'previous_status': previous_status,
+    })
+
+
+# ---------- ตัวกรอง + รูปแบบ SSE ----------
+class BadFilter(ValueError):
+    pass
+
+
+def parse_filter(args):
+    """query string → ฟังก์ชัน match(event) (raise BadFilter ถ้าค่าผิด)"""
+    topics = {t.strip() for t in (args.get("topics") or "").split(",") if t.strip()} or set(TOPICS)
+    unknown = topics - set(TOPICS)
+    if unknown:
+        raise BadFilter(f"topics ต้องเป็น {', '.join(TOPICS)}")
+
+    doctor_id = (args.get("doctor_id") or "").strip()
+    day = (args.get("date") or "").strip()
+    status = (args.get("status") or "").strip()
+    try:
+        doctor_id = int(doctor_id) if doctor_id else None
+        day = to_date(day).isoformat() if day else None
+    except ValueError:
+        raise BadFilter("doctor_id ต้องเป็นตัวเลข และ date ต้องเป็น YYYY-MM-DD")
+
+    def match(event):
+        if event['type'] not in topics:
+            return False
+        if status and status not in (event['status'], event['previous_status']):
+            return False
+        if event['type'] == 'appointment':
+            # ย้ายหมอ / ย้ายวัน → จอของทั้งฝั่งเดิมและฝั่งใหม่ต้องรู้
+            if doctor_id is not None and doctor_id not in (event['doctor_id'], event['previous_doctor_id']):
+                return False
+            if day is not None and day not in (event['appointment_date'], event['previous_date']):
+                return False
+        return True
+
+    return match
+
+
+def parse_last_event_id(value):
+    """
+    Last-Event-ID ("<epoch>-<seq>") → seq, -1 ถ้ามาจาก process อื่น (restart แล้ว → ต้อง reset),
+    None ถ้าไม่มี
+    """
+    if not value:
+        return None
+    epoch, _, seq = str(value).partition("-")
+    if epoch != EPOCH or not seq.isdigit():
+        return -1
+    return int(seq)
+
+
+def _frame(event_name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {EPOCH}-{event_id}")
+    lines.append(f"event: {event_name}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+def _hello(last_id):
+    """ข้อความแรกของ stream → (ข้อความ, seq ที่จะเริ่มอ่านต่อ)"""
+    start = feed.last_seq if last_id is None else last_id
+    head = f"retry: {RETRY_MS}\n\n"
+    if start < 0 or feed.since(start) is None:
+        # หลุดไปนานเกินกว่าที่เก็บไว้ → client ต้องดึงรายการเต็มใหม่
+        start = feed.last_seq
+        return head + _frame("reset", {'seq': start}, start), start
+    return head + _frame("ready", {'seq': start}, start), start
+
+
+def _render(result, match):
+    """ผลของ feed.wait → (ข้อความ, seq ล่าสุด); ข้อความ None = ต้อง reset"""
+    if result is None:
+        return None, None
+    events, seq = result
+    if not events:
+        return "", seq
+    return "".join(_frame(e['type'], e, e['seq']) for e in events if match(e)), seq
+
+
+def sse_stream(match, last_id=None):
+    """generator ของข้อความ SSE สำหรับ Flask (ถือหนึ่ง thread ต่อ connection)"""
+    feed.subscribed(1)
+    try:
+        text, seq = _hello(last_id)
+        yield text
+        while not feed.closed:
+            text, new_seq = _render(feed.wait(seq, HEARTBEAT_SECONDS), match)
+            if text is None:
+                text, new_seq = _hello(None)
+            seq = new_seq
+            yield text or ": ping\n\n"
+    finally:
+        feed.subscribed(-1)
+
+
+async def sse_stream_async(match, last_id=None):
+    """เหมือน sse_stream แต่รอแบบ async (โหมด ASGI ไม่กิน thread ระหว่างรอ)"""
+    feed.subscribed(1)
+    try:
+        text, seq = _hello(last_id)
+        yield text
+        while not feed.closed:
+            text, new_seq = _render(await feed.wait_async(seq, HEARTBEAT_SECONDS), match)
+            if text is None:
+                text, new_seq = _hello(None)
+            seq = new_seq
+            yield text or ": ping\n\n"
+    finally:
+        feed.subscribed(-1)
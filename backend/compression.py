@@ -0,0 +1,204 @@
+"""
+บีบอัด response (gzip / brotli) ตาม Accept-Encoding ของ client — ช่วยสาขาที่เน็ตช้าตอนโหลดรายการยาว ๆ
+(/patients, /appointments, /patients/<pid>/records ฯลฯ) JSON ของรายการพวกนี้บีบเหลือราว 10–20%
+(เลือกระดับด้วย bench/bench_compress.py)
+
+  COMPRESS_MIN_BYTES     response ที่เล็กกว่านี้ส่งตามเดิม (ค่าเริ่มต้น 1024 — บีบแล้วไม่คุ้ม CPU / header)
+  COMPRESS_LEVEL         ระดับของทุก route ใช้เป็นทั้ง gzip level และ brotli quality (ค่าเริ่มต้น 5)
+                         0 = ไม่บีบ, เกินช่วงของ encoding จะถูกตัดเหลือค่าสูงสุด (gzip 9, brotli 11)
+  COMPRESS_ROUTE_LEVELS  ระดับราย route ตาม rule ของ Flask (ชื่อเดียวกับ label route ใน /metrics)
+                         เช่น "/patients=6,/patients/<int:pid>/records=4,/metrics=0"
+                         รายการที่อ่านไม่ได้ (ไม่มี = หรือระดับไม่ใช่ตัวเลข) ถูกข้ามพร้อม print เตือน
+
+brotli ใช้เมื่อติดตั้งไว้ (pip install brotli) และ client รับ br — ไม่มีก็ใช้ gzip (zlib มากับ Python)
+response ปกติบีบจากไบต์ที่มีอยู่แล้วในครั้งเดียว ส่วน response แบบ stream บีบทีละ chunk ตามที่ generator
+ส่งออกมา แล้ว flush ทุก chunk (gzip Z_SYNC_FLUSH / brotli flush) ให้ client ได้ข้อมูลของ chunk นั้นทันที
+ไม่ต้องรอครบหรือเก็บทั้งก้อน (ไม่มี Content-Length) — text/event-stream ไม่บีบ (แต่ละ event ต้องถึงจอทันที)
+COMPRESS_MIN_BYTES ใช้กับ stream ได้เฉพาะที่บอก Content-Length มา นอกนั้นตั้งใจบีบเสมอ:
+ขนาดรู้ตอนจบเท่านั้น และ route ที่ stream คือรายการที่ยาวอยู่แล้ว
+ETag ของระบบเป็นแบบ weak (ดู versions.py) → ใช้ร่วมกับ response ที่บีบแล้วได้ตาม RFC 9110
+
+metrics (ดู metrics.py): ไบต์ก่อน / หลังบีบ, สัดส่วน และเวลา CPU ที่ใช้บีบ แยกตาม route และ encoding
+"""
+import os
+import time
+import zlib
+from functools import partial
+
+from werkzeug.http import parse_accept_header
+from werkzeug.wsgi import ClosingIterator
+
+import metrics
+
+try:
+    import brotli
+except ImportError:          # ไม่บังคับติดตั้ง
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "5"))
+
+COMPRESSIBLE = {"application/json", "text/plain", "text/csv", "text/html"}
+
+# ระดับสูงสุดที่แต่ละ encoding รับได้ (zlib: 0–9, brotli quality: 0–11)
+MAX_LEVELS = {"gzip": 9, "br": 11}
+
+
+def _parse_levels(text):
+    """"rule=level,..." → {rule: level} — ข้ามรายการที่อ่านไม่ได้ (ค่าผิดต้องไม่ทำให้แอปเริ่มไม่ได้)"""
+    levels = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        rule, sep, level = item.rpartition("=")
+        try:
+            if not sep or not rule.strip():
+                raise ValueError("ต้องเป็น rule=level")
+            levels[rule.strip()] = int(level)
+        except ValueError as e:
+            print("COMPRESS_ROUTE_LEVELS skip:", item.strip(), e)
+    return levels
+
+
+ROUTE_LEVELS = _parse_levels(os.getenv("COMPRESS_ROUTE_LEVELS", ""))
+
+
+def level_for(rule):
+    return ROUTE_LEVELS.get(rule, COMPRESS_LEVEL)
+
+
+def choose_encoding(accept_encoding):
+    """Accept-Encoding → "br" / "gzip" / None (q เท่ากันเลือก br เพราะเล็กกว่า)"""
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_header(accept_encoding)
+    best, best_q = None, 0
+    for encoding in ("br", "gzip") if brotli is not None else ("gzip",):
+        q = accepted.quality(encoding)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding, level):
+        level = min(max(level, 0), MAX_LEVELS[encoding])
+        if encoding == "br":
+            self._obj = brotli.Compressor(quality=level)
+            self.compress = self._obj.process
+            self.flush = self._obj.flush
+            self.finish = self._obj.finish
+        else:
+            # wbits 16+ = มี header / trailer แบบ gzip
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.compress = self._obj.compress
+            # flush = ไบต์ที่ค้างของ chunk ล่าสุด (stream ยังต่อได้ client ถอดได้ครบถึง chunk นี้)
+            self.flush = partial(self._obj.flush, zlib.Z_SYNC_FLUSH)
+            self.finish = self._obj.flush
+
+
+def _observe(rule, encoding, size_in, size_out, cpu):
+    metrics.COMPRESS_BYTES_IN.inc(rule, encoding, amount=size_in)
+    metrics.COMPRESS_BYTES_OUT.inc(rule, encoding, amount=size_out)
+    metrics.COMPRESS_CPU_SECONDS.inc(rule, encoding, amount=cpu)
+    if size_in:
+        metrics.COMPRESS_RATIO.observe(size_out / size_in, rule, encoding)
+
+
+def compress_bytes(data, encoding, level, rule):
+    started = time.thread_time()
+    compressor = _Compressor(encoding, level)
+    out = compressor.compress(data) + compressor.finish()
+    _observe(rule, encoding, len(data), len(out), time.thread_time() - started)
+    return out
+
+
+def compress_chunks(chunks, encoding, level, rule):
+    """บีบ iterable ของไบต์ทีละ chunk แล้ว flush ทุก chunk (ส่งออกทันที ไม่รอ chunk ถัดไป ไม่เก็บทั้งก้อน)"""
+    compressor = _Compressor(encoding, level)
+    size_in = size_out = 0
+    cpu = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            started = time.thread_time()
+            out = compressor.compress(chunk) + compressor.flush()
+            cpu += time.thread_time() - started
+            size_in += len(chunk)
+            if out:
+                size_out += len(out)
+                yield out
+        started = time.thread_time()
+        out = compressor.finish()
+        cpu += time.thread_time() - started
+        size_out += len(out)
+        yield out
+    finally:
+        _observe(rule, encoding, size_in, size_out, cpu)
+
+
+def _add_vary(headers):
+    vary = headers.get("Vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = vary + ", Accept-Encoding"
+
+
+def compress_response(response, accept_encoding, rule, method="GET"):
+    """response ของ Flask → บีบถ้าเข้าเงื่อนไข (คืน response ตัวเดิม)"""
+    level = level_for(rule)
+    if (level <= 0 or method == "HEAD" or response.direct_passthrough
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.mimetype not in COMPRESSIBLE or "Content-Encoding" in response.headers):
+        return response
+
+    # response นี้มีหลายแบบตาม Accept-Encoding → cache / proxy ต้องแยกเก็บ
+    _add_vary(response.headers)
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        length = response.content_length
+        if length is not None and length < COMPRESS_MIN_BYTES:
+            return response
+        # ปิด iterable เดิมด้วย (generator ของ stream_with_context ฯลฯ) แม้ client ตัดก่อนเริ่มอ่าน
+        source = response.response
+        response.response = ClosingIterator(compress_chunks(source, encoding, level, rule),
+                                            getattr(source, "close", None))
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(compress_bytes(data, encoding, level, rule))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def compress_payload(payload, accept_encoding, rule):
+    """สำหรับโหมด ASGI: ไบต์ของ JSON → (ไบต์ที่จะส่ง, header เพิ่มเติม [(name, value)])"""
+    level = level_for(rule)
+    if level <= 0:
+        return payload, []
+    headers = [(b"vary", b"Accept-Encoding")]
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None or len(payload) < COMPRESS_MIN_BYTES:
+        return payload, headers
+    headers.append((b"content-encoding", encoding.encode("latin-1")))
+    return compress_bytes(payload, encoding, level, rule), headers
+
+
+def init_app(app):
+    """
+    บีบ response ของทุก route (รวม blueprint) — เรียกหลัง init_app อื่น ๆ: after_request ที่ลงทะเบียนทีหลัง
+    ทำงานก่อน → เวลาบีบนับรวมใน clinic_http_request_duration_seconds ด้วย
+    """
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        return compress_response(response, request.headers.get("Accept-Encoding"), rule, request.method)
@@ -0,0 +1,369 @@
+"""
+ชั้นเชื่อมต่อฐานข้อมูลกลาง (connection pool) ใช้ร่วมกันทั้ง api.py และ bot_routes.py
+
+ตั้งค่าผ่าน environment variable:
+  DB_HOST / DB_USER / DB_PASSWORD / DB_NAME
+  DB_POOL_SIZE          จำนวน connection สูงสุดใน pool (ค่าเริ่มต้น 10)
+  DB_POOL_TIMEOUT       เวลารอยืม connection สูงสุด (วินาที, ค่าเริ่มต้น 5)
+  DB_POOL_PING_AFTER    ถ้า connection ว่างเกินกี่วินาทีให้ ping ก่อนยืม (ค่าเริ่มต้น 5, 0 = ping ทุกครั้ง)
+  DB_CONNECT_TIMEOUT    เวลารอเปิด connection ใหม่ (วินาที, ค่าเริ่มต้น 5)
+  DB_CONNECT_BACKOFF    เปิด connection ไม่สำเร็จ → ตอบ error ทันทีโดยไม่ลองใหม่ช่วงหนึ่ง เริ่มที่กี่วินาที
+                        (ค่าเริ่มต้น 0.5) แล้วเพิ่มเท่าตัวทุกครั้งที่ล้มซ้ำ ไม่เกิน DB_CONNECT_BACKOFF_MAX (30)
+
+ไม่มีการต่อฐานข้อมูลตอน import — connection แรกเปิดตอนคำขอแรกที่ต้องใช้ (หรือตอน warm-up ดู health.py)
+ถ้า MySQL ล่มตอนเริ่มระบบ process ยังรับคำขออื่นได้ และกลับมาใช้ได้เองเมื่อ MySQL กลับมา
+
+pool ล้างตัวเองใน process ลูกหลัง fork (เช่น worker ของ serve.py) → แต่ละ process เปิด connection ของตัวเอง
+"""
+import os
+import threading
+import time
+
+from flask import g, has_app_context
+
+import metrics
+import sql_trace
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", "root"),
+    "database": os.getenv("DB_NAME", "clinic_db"),
+    "autocommit": True,
+    "charset": "utf8mb4",
+    "use_pure": True,
+    "connection_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "5")),
+}
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "5"))
+CONNECT_BACKOFF = float(os.getenv("DB_CONNECT_BACKOFF", "0.5"))
+CONNECT_BACKOFF_MAX = float(os.getenv("DB_CONNECT_BACKOFF_MAX", "30"))
+
+
+class PoolTimeout(Exception):
+    """ยืม connection ไม่ได้ภายในเวลาที่กำหนด (pool เต็ม)"""
+
+
+class ConnectBackoff(Exception):
+    """เพิ่งเปิด connection ไม่สำเร็จ ยังอยู่ในช่วงรอก่อนลองใหม่ (ตอบ error ทันทีแทนการรอ timeout ทุกคำขอ)"""
+
+
+class ConnectionPool:
+    """
+    pool ขนาดคงที่แบบ thread-safe:
+      - สร้าง connection เมื่อจำเป็น (lazy) ไม่เกิน size
+      - ถ้า pool เต็ม รอได้ไม่เกิน timeout วินาที
+      - ตรวจสุขภาพ (ping) ตอนยืม ถ้าหลุดจะ reconnect ให้ เช่นหลัง MySQL restart
+      - เก็บสถิติ in_use / waits / wait_time ไว้ให้ดึงไปดู
+    """
+
+    def __init__(self, config, size=POOL_SIZE, timeout=POOL_TIMEOUT, ping_after=POOL_PING_AFTER):
+        self.config = dict(config)
+        self.size = max(1, int(size))
+        self.timeout = float(timeout)
+        self.ping_after = float(ping_after)
+
+        self._cond = threading.Condition()
+        self._idle = []          # [(raw_connection, last_used_monotonic)]
+        self._created = 0
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._health_failures = 0
+        self._connect_errors = 0
+
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._last_error = None
+
+    # ---------- ยืม / คืน ----------
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else float(timeout)
+        started = time.monotonic()
+        deadline = started + timeout
+        raw = None
+        last_used = None
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._wait_time += time.monotonic() - started
+                    raise PoolTimeout(f"รอ connection เกิน {timeout:.1f} วินาที (pool size={self.size})")
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._checkouts += 1
+            waited_for = time.monotonic() - started
+            if waited:
+                self._wait_time += waited_for
+        metrics.POOL_WAIT_SECONDS.observe(waited_for)
+
+        try:
+            if raw is None:
+                raw = self._connect()
+            elif time.monotonic() - last_used >= self.ping_after:
+                raw = self._ensure_alive(raw)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+        return raw
+
+    def release(self, raw, discard=False):
+        if not discard:
+            try:
+                # เผื่อมี transaction ค้าง (เช่น error กลางคัน) ไม่ให้ติดไปคำขอถัดไป
+                if raw.in_transaction:
+                    raw.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._created -= 1
+            else:
+                self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+        if discard:
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+    def connection(self, timeout=None):
+        """ยืม connection ห่อด้วย PooledConnection (close() = คืนเข้า pool)"""
+        return PooledConnection(self, self.acquire(timeout))
+
+    def check(self, timeout=1.0):
+        """ยืม connection แล้ว ping (สำหรับ /readyz) → None ถ้าใช้ได้ หรือข้อความ error"""
+        try:
+            raw = self.acquire(timeout)
+        except PoolTimeout:
+            return None          # pool เต็มเพราะงานเยอะ ไม่ได้แปลว่าฐานข้อมูลใช้ไม่ได้
+        except Exception as e:
+            return str(e)
+        try:
+            raw.ping(reconnect=False)
+        except Exception as e:
+            self.release(raw, discard=True)
+            return str(e)
+        self.release(raw)
+        return None
+
+    # ---------- ภายใน ----------
+    def _connect(self):
+        with self._cond:
+            wait = self._retry_at - time.monotonic()
+            if wait > 0:
+                raise ConnectBackoff(f"เชื่อมต่อฐานข้อมูลไม่ได้ จะลองใหม่ในอีก {wait:.1f} วินาที "
+                                     f"({self._last_error})")
+
+        # import ตอนเปิด connection แรก ไม่ถ่วงเวลา import ของแอป
+        import mysql.connector
+
+        try:
+            raw = mysql.connector.connect(**self.config)
+        except Exception as e:
+            with self._cond:
+                self._connect_errors += 1
+                self._last_error = str(e)
+                # หลาย thread ล้มพร้อมกัน → นับเป็นรอบเดียว
+                if time.monotonic() >= self._retry_at:
+                    self._backoff = min(self._backoff * 2, CONNECT_BACKOFF_MAX) if self._backoff else CONNECT_BACKOFF
+                    self._retry_at = time.monotonic() + self._backoff
+            raise
+
+        with self._cond:
+            self._backoff = 0.0
+            self._retry_at = 0.0
+            self._last_error = None
+        return raw
+
+    def _ensure_alive(self, raw):
+        try:
+            raw.ping(reconnect=False)
+            return raw
+        except Exception:
+            pass
+
+        with self._cond:
+            self._health_failures += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+        # connection เดิมใช้ไม่ได้แล้ว (เช่น MySQL restart) → เปิดใหม่แทนที่
+        fresh = self._connect()
+        with self._cond:
+            self._reconnects += 1
+        return fresh
+
+    def reset_after_fork(self):
+        """
+        เรียกใน process ลูกหลัง fork: connection ที่ติดมาจาก process แม่ใช้ร่วมกันไม่ได้
+        (สอง process คุยกับ MySQL บน session เดียวกัน → ผลสลับกัน) จึงทิ้งทั้งหมดแล้วเริ่มนับใหม่
+        lock เดิมอาจถูก thread อื่นของ process แม่ถืออยู่ตอน fork → สร้างใหม่ด้วย
+        """
+        for raw, _ in self._idle:
+            _detach(raw)
+        self._cond = threading.Condition()
+        self._idle = []
+        self._created = 0
+        self._in_use = 0
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._last_error = None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_ms": round(self._wait_time * 1000, 3),
+                "timeouts": self._timeouts,
+                "health_check_failures": self._health_failures,
+                "reconnects": self._reconnects,
+                "connect_errors": self._connect_errors,
+                "connect_backoff_s": round(max(self._retry_at - time.monotonic(), 0.0), 3),
+                "last_connect_error": self._last_error,
+            }
+
+
+class PooledConnection:
+    """ห่อ connection จริง: ใช้เหมือน mysql connection ปกติ แต่ close() จะคืนเข้า pool"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._closed = False
+
+    def cursor(self, *args, traced=True, **kwargs):
+        """cursor ที่บันทึกทุกคำสั่งลง sql_trace (traced=False เมื่อผู้เรียกบันทึกเอง เช่น aiodb)"""
+        cursor = self._raw.cursor(*args, **kwargs)
+        return sql_trace.TracedCursor(cursor) if traced else cursor
+
+    # BEGIN / COMMIT / ROLLBACK จับเวลาเข้า metrics (เวลา DB ต่อคำขอ)
+    def start_transaction(self, *args, **kwargs):
+        return _timed(self._raw.start_transaction, *args, **kwargs)
+
+    def commit(self):
+        return _timed(self._raw.commit)
+
+    def rollback(self):
+        return _timed(self._raw.rollback)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool.release(self._raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class PooledCursor:
+    """ห่อ cursor: cur.close() ปิด cursor และคืน connection เข้า pool ในคราวเดียว"""
+
+    def __init__(self, conn, cursor):
+        self.connection = conn
+        self._cursor = cursor
+
+    def close(self):
+        try:
+            self._cursor.close()
+        except Exception:
+            pass
+        self.connection.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        metrics.add_db_time(time.perf_counter() - started)
+
+
+def _detach(raw):
+    # ปิดเฉพาะ file descriptor ของ process นี้ — ห้าม close() / shutdown() เพราะจะส่ง QUIT
+    # หรือปิด socket ที่ process แม่ยังใช้อยู่ (MySQLSocket.__del__ เรียก shutdown ตอนถูกเก็บกวาด)
+    try:
+        raw._socket.sock.close()
+    except Exception:
+        pass
+
+
+pool = ConnectionPool(DB_CONFIG)
+os.register_at_fork(after_in_child=lambda: pool.reset_after_fork())
+
+
+def _track(conn):
+    # จดไว้ใน g เพื่อคืน connection ตอนจบคำขอ เผื่อ handler ลืม close (เช่น exception กลางทาง)
+    if has_app_context():
+        g.setdefault("_db_connections", []).append(conn)
+    return conn
+
+
+def get_db():
+    """ยืม connection จาก pool (ใช้แล้วต้อง close() เพื่อคืน)"""
+    return _track(pool.connection())
+
+
+def get_cursor():
+    """คืน cursor แบบ dictionary=True สำหรับแต่ละคำขอ (None ถ้ายืม connection ไม่ได้)"""
+    try:
+        conn = get_db()
+    except Exception as e:
+        print(">>> ยืม connection จาก pool ไม่สำเร็จ:", e)
+        return None
+    return PooledCursor(conn, conn.cursor(dictionary=True))
+
+
+def release_request_connections(exc=None):
+    for conn in g.pop("_db_connections", []):
+        conn.close()
+
+
+def init_app(app):
+    app.teardown_appcontext(release_request_connections)
@@ -0,0 +1,156 @@
+"""
+ดึง entity จากข้อความแชทภาษาไทยในรอบเดียว
+
+regex ทุกแบบรวมเป็น pattern เดียว (compile ตอน import) แล้วไล่ด้วย finditer ครั้งเดียว:
+  - รหัสคนไข้    "คนไข้ 5", "ผู้ป่วยรหัส 5", "HN005"
+  - รหัสหมอ      "หมอ 1", "แพทย์หมายเลข 2"
+  - วันที่        "วันที่ 15" (เดือนนี้), "15 ธันวาคม 2568", "3 ม.ค. 68", "15/12/2568",
+                 "วันนี้", "พรุ่งนี้", "มะรืนนี้", "วันจันทร์", "วันจันทร์หน้า"
+  - เวลา          "10:30", "10.30 น.", "เวลา 10.30", "9 โมง", "บ่าย 2", "เที่ยง"
+                 (จุดเป็นเวลาเฉพาะเมื่อมี น. / นาฬิกา ตามหลัง หรือ "เวลา" นำหน้า — "ราคา 1.50 บาท" ไม่ใช่เวลา)
+ปีพุทธศักราช (>= 2400) แปลงเป็น ค.ศ. ให้อัตโนมัติ ปี 2 หลัก: >= 60 เป็น พ.ศ. ("68" = 2568),
+ต่ำกว่านั้นเป็น ค.ศ. ("25" = 2025) — ทั้งสองแบบได้ปีใกล้ปัจจุบัน
+แต่ละ entity ใช้ค่าแรกที่เจอในข้อความ ยกเว้นวันที่: คำอย่าง "วันนี้" / "พรุ่งนี้" ชนะวันที่แบบอื่นที่เจอก่อน
+(เช่น "นัด 1/2 เลื่อนเป็นพรุ่งนี้" = พรุ่งนี้)
+
+ผลของข้อความเดิมในวันเดียวกันถูก cache ไว้ (lru_cache) เพราะมีคำถามซ้ำ ๆ บ่อย
+"""
+import re
+from datetime import date, timedelta
+from functools import lru_cache
+
+THAI_DIGITS = str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789")
+
+THAI_MONTHS = {
+    "มกราคม": 1, "กุมภาพันธ์": 2, "มีนาคม": 3, "เมษายน": 4, "พฤษภาคม": 5, "มิถุนายน": 6,
+    "กรกฎาคม": 7, "สิงหาคม": 8, "กันยายน": 9, "ตุลาคม": 10, "พฤศจิกายน": 11, "ธันวาคม": 12,
+    "ม.ค.": 1, "ก.พ.": 2, "มี.ค.": 3, "เม.ย.": 4, "พ.ค.": 5, "มิ.ย.": 6,
+    "ก.ค.": 7, "ส.ค.": 8, "ก.ย.": 9, "ต.ค.": 10, "พ.ย.": 11, "ธ.ค.": 12,
+}
+
+THAI_WEEKDAYS = {
+    "จันทร์": 0, "อังคาร": 1, "พุธ": 2, "พฤหัสบดี": 3, "พฤหัส": 3,
+    "ศุกร์": 4, "เสาร์": 5, "อาทิตย์": 6,
+}
+
+RELATIVE_DAYS = {"วันนี้": 0, "พรุ่งนี้": 1, "มะรืนนี้": 2, "มะรืน": 2, "เมื่อวาน": -1}
+
+
+def _alt(words):
+    # คำยาวก่อน เพื่อให้ "พฤหัสบดี" ชนะ "พฤหัส"
+    return "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+_TOKEN_RE = re.compile(
+    rf"""
+      (?P<hn>hn\s*(?P<hn_id>\d+))
+    | (?:คนไข้|ผู้ป่วย)\s*(?:รหัส|หมายเลข)?\s*(?P<patient_id>\d+)
+    | (?:หมอ|แพทย์)\s*(?:รหัส|หมายเลข)?\s*(?P<doctor_id>\d+)
+    | (?:วันที่\s*)?(?P<md_day>\d{{1,2}})\s*(?P<md_month>{_alt(THAI_MONTHS)})\s*(?P<md_year>\d{{4}}|\d{{2}}(?!\d))?
+    | (?P<sl_day>\d{{1,2}})/(?P<sl_month>\d{{1,2}})(?:/(?P<sl_year>\d{{4}}|\d{{2}}))?
+    | วันที่\s*(?P<dom>\d{{1,2}})
+    | (?P<relative>{_alt(RELATIVE_DAYS)})
+    | วัน(?P<weekday>{_alt(THAI_WEEKDAYS)})(?P<next_week>\s*หน้า)?
+    | (?P<hh>\d{{1,2}}):(?P<mm>\d{{2}})(?!\d)
+    | (?P<at>เวลา\s*)?(?P<dot_hh>\d{{1,2}})\.(?P<dot_mm>\d{{2}})(?!\d)(?P<suffix>\s*(?:น\.|นาฬิกา))?
+    | (?P<afternoon>บ่าย)\s*(?P<pm_hour>\d{{1,2}})?(?:\s*โมง)?
+    | (?P<oclock>\d{{1,2}})\s*โมง(?P<evening>เย็น)?
+    | (?P<noon>เที่ยง)
+    """,
+    re.VERBOSE,
+)
+
+
+def _year(raw, today):
+    if not raw:
+        return today.year
+    year = int(raw)
+    if year < 100:
+        # "68" = พ.ศ. 2568, "25" = ค.ศ. 2025
+        year += 2500 if year >= 60 else 2000
+    if year >= 2400:
+        year -= 543           # พ.ศ. → ค.ศ.
+    return year
+
+
+def _safe_date(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _weekday_date(today, weekday, next_week):
+    if next_week:
+        # วัน X ของสัปดาห์หน้า (สัปดาห์เริ่มวันจันทร์)
+        monday_next = today - timedelta(days=today.weekday()) + timedelta(days=7)
+        return monday_next + timedelta(days=weekday)
+    return today + timedelta(days=(weekday - today.weekday()) % 7)
+
+
+def _time(hour, minute=0):
+    if 0 <= hour < 24 and 0 <= minute < 60:
+        return f"{hour:02d}:{minute:02d}"
+    return None
+
+
+@lru_cache(maxsize=2048)
+def _parse(msg, today_ordinal):
+    today = date.fromordinal(today_ordinal)
+    found = {}
+    relative_date = False
+
+    for m in _TOKEN_RE.finditer(msg):
+        g = m.groupdict()
+        if g["hn"] is not None or g["patient_id"] is not None:
+            found.setdefault("patient_id", int(g["hn_id"] or g["patient_id"]))
+            continue
+        if g["doctor_id"] is not None:
+            found.setdefault("doctor_id", int(g["doctor_id"]))
+            continue
+        if "time" not in found:
+            t = None
+            if g["hh"] is not None:
+                t = _time(int(g["hh"]), int(g["mm"]))
+            elif g["dot_hh"] is not None:
+                if g["at"] is None and g["suffix"] is None:
+                    continue          # ตัวเลขทศนิยม / ราคา
+                t = _time(int(g["dot_hh"]), int(g["dot_mm"]))
+            elif g["afternoon"] is not None:
+                t = _time(int(g["pm_hour"] or 1) % 12 + 12)
+            elif g["oclock"] is not None:
+                hour = int(g["oclock"])
+                t = _time(hour + 12 if g["evening"] and hour < 12 else hour)
+            elif g["noon"] is not None:
+                t = "12:00"
+            if t:
+                found["time"] = t
+                continue
+        if relative_date or ("date" in found and g["relative"] is None):
+            continue
+
+        d = None
+        if g["md_day"] is not None:
+            d = _safe_date(_year(g["md_year"], today), THAI_MONTHS[g["md_month"]], int(g["md_day"]))
+        elif g["sl_day"] is not None:
+            d = _safe_date(_year(g["sl_year"], today), int(g["sl_month"]), int(g["sl_day"]))
+        elif g["dom"] is not None:
+            d = _safe_date(today.year, today.month, int(g["dom"]))
+        elif g["relative"] is not None:
+            d = today + timedelta(days=RELATIVE_DAYS[g["relative"]])
+            relative_date = True
+        elif g["weekday"] is not None:
+            d = _weekday_date(today, THAI_WEEKDAYS[g["weekday"]], g["next_week"])
+        if d:
+            found["date"] = d.isoformat()
+
+    return tuple(found.items())
+
+
+def extract_entities(message, today=None):
+    """ดึงเลขหมอ, เลขคนไข้, วันที่, เวลา จากประโยคภาษาไทย → dict (สร้างใหม่ทุกครั้ง แก้ได้)"""
+    if not message:
+        return {}
+    today = today or date.today()
+    msg = message.strip().lower().translate(THAI_DIGITS)
+    return dict(_parse(msg, today.toordinal()))
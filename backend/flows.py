@@ -0,0 +1,601 @@
+"""
+ลำดับการทำงานกับฐานข้อมูลของ endpoint หลัก ใช้ร่วมกันระหว่างโหมด sync (Flask: api.py, bot_routes.py)
+และโหมด async (asgi.py) — logic มีชุดเดียว
+
+flow คือ generator ที่ไม่แตะ connection เอง แต่ yield "คำสั่ง" แล้วรับผลกลับ:
+    row  = yield one(sql, params)      แถวแรก (dict) หรือ None
+    rows = yield fetch(sql, params)    ทุกแถว (list ของ dict)
+    done = yield run(sql, params)      INSERT / UPDATE → done.lastrowid, done.rowcount
+    done = yield many(sql, seq)        executemany (INSERT หลายแถวใน statement เดียว) → done.rowcount
+    res  = yield call(fn, *args)       งานที่อาจ block เช่นโหลดดัชนีจาก DB (โหมด async รันใน thread)
+    yield BEGIN / COMMIT
+แล้ว return ผลลัพธ์ (ของ endpoint คือ (body, status))
+
+ตัวรัน: run_flow() ในไฟล์นี้ (sync) และ aiodb.run_flow() (async)
+  - error จากฐานข้อมูลถูกโยนกลับเข้า flow ตรงจุดที่ yield → ใช้ try/except ได้ตามปกติ
+  - ยืม connection ตอนคำสั่งแรกที่ต้องใช้ DB (ตอบจาก cache ได้โดยไม่ยืม) และคืนเมื่อ flow จบ
+  - ถ้า BEGIN แล้ว flow จบโดยไม่ COMMIT (return กลางทาง / error) ตัวรันจะ rollback ให้
+"""
+from collections import namedtuple
+from datetime import date
+
+import cache
+import change_feed
+import visit_summary
+from cache import summary_cache, patient_tag, MISSING
+from patient_search import patient_index
+from pagination import DEFAULT_LIMIT, BadPageRequest, page_args, pick_fields, select_list, finish_page, keyset_where
+from schedule_index import schedule
+
+SEARCH_LIMIT = 100          # จำนวนผลค้นหา /patients?q= เริ่มต้น
+IDEMPOTENCY_KEY_MAX = 64    # ความยาวสูงสุดของ idempotency_key (ตามคอลัมน์ treatment.idempotency_key)
+
+Done = namedtuple("Done", "lastrowid rowcount")
+
+BEGIN = ("begin",)
+COMMIT = ("commit",)
+
+DB_UNAVAILABLE = ({'status': 'error', 'message': 'DB connection error'}, 500)
+
+
+class DBUnavailable(Exception):
+    """ยืม connection ไม่ได้ (ใช้เมื่อเรียก run_flow ด้วย unavailable=None)"""
+
+
+def one(sql, params=()):
+    return ("one", sql, tuple(params))
+
+
+def fetch(sql, params=()):
+    return ("all", sql, tuple(params))
+
+
+def run(sql, params=()):
+    return ("run", sql, tuple(params))
+
+
+def many(sql, seq_of_params):
+    return ("many", sql, [tuple(p) for p in seq_of_params])
+
+
+def call(fn, *args):
+    return ("call", fn, args)
+
+
+# ---------- ตัวรันแบบ sync ----------
+def execute_step(cur, step):
+    """รันคำสั่งหนึ่งคำสั่งบน cursor แบบ DB-API (ใช้ทั้ง run_flow และ driver แบบ thread ใน aiodb)"""
+    op = step[0]
+    if op == "begin":
+        cur.connection.start_transaction()
+        return None
+    if op == "commit":
+        cur.connection.commit()
+        return None
+    if op == "many":
+        cur.executemany(step[1], step[2])
+        return Done(cur.lastrowid, cur.rowcount)
+    cur.execute(step[1], step[2])
+    if op == "one":
+        return cur.fetchone()
+    if op == "all":
+        return cur.fetchall()
+    return Done(cur.lastrowid, cur.rowcount)
+
+
+def run_flow(flow, open_cursor, unavailable=DB_UNAVAILABLE):
+    """
+    รัน flow ด้วย cursor แบบ sync (open_cursor เช่น db.get_cursor)
+    ยืม connection ไม่ได้ → คืน unavailable (หรือ raise DBUnavailable ถ้า unavailable=None)
+    """
+    cur = None
+    in_tx = False
+    result = error = None
+    try:
+        while True:
+            try:
+                step = flow.send(result) if error is None else flow.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            result = error = None
+            try:
+                if step[0] == "call":
+                    result = step[1](*step[2])
+                    continue
+                if cur is None:
+                    cur = open_cursor()
+                    if cur is None:
+                        flow.close()
+                        if unavailable is None:
+                            raise DBUnavailable()
+                        return unavailable
+                result = execute_step(cur, step)
+                if step is BEGIN:
+                    in_tx = True
+                elif step is COMMIT:
+                    in_tx = False
+            except DBUnavailable:
+                raise
+            except Exception as e:
+                error = e
+    finally:
+        if cur is not None:
+            if in_tx:
+                try:
+                    cur.connection.rollback()
+                except Exception:
+                    pass
+            cur.close()
+
+
+# ---------- คอลัมน์ที่เลือกได้ผ่าน ?fields= (ชื่อ → นิพจน์ SQL) เรียงตามลำดับที่คืนเดิม ----------
+PATIENT_FIELDS = {
+    'id':        "p.patient_id",
+    'name':      "CONCAT_WS(' ', p.first_name, p.last_name)",
+    'hn':        "CONCAT('HN', LPAD(p.patient_id,3,'0'))",
+    'age':       "TIMESTAMPDIFF(YEAR, p.birth_date, CURDATE())",
+    'tel':       "p.phone",
+    'lastVisit': "COALESCE(DATE_FORMAT(s.last_visit,'%Y-%m-%d'), '')",
+}
+
+RECORD_FIELDS = {
+    'id':        "t.treatment_id",
+    'date':      "DATE_FORMAT(t.treatment_date,'%Y-%m-%d')",
+    'diagnosis': "t.diagnosis",
+    'treatment': "t.advice",
+    'doctor':    "CONCAT_WS(' ', d.first_name, d.last_name)",
+}
+
+APPOINTMENT_FIELDS = {
+    'id':           "a.appointment_id",
+    'date':         "DATE_FORMAT(a.appointment_date, '%Y-%m-%d')",
+    'time':         "TIME_FORMAT(a.appointment_time, '%H:%i')",
+    'status':       "a.status",
+    'patient_id':   "a.patient_id",
+    'patient_name': "CONCAT_WS(' ', p.first_name, p.last_name)",
+    'doctor_id':    "a.doctor_id",
+    'doctor_name':  "CONCAT_WS(' ', d.first_name, d.last_name)",
+}
+
+
+def _page(rows, next_cursor):
+    return {'status': 'success', 'data': rows, 'next_cursor': next_cursor}, 200
+
+
+# ---------- flows ----------
+def list_patients(args):
+    """
+    รายชื่อคนไข้ (ใหม่สุดก่อน):
+      - ?q=        ค้นจากชื่อ / นามสกุล / HN / เบอร์โทร (ผลค้นหาแบ่งหน้าเสมอ ค่าเริ่มต้น 100 แถว)
+      - ?limit= / ?cursor= / ?fields=   ดู pagination.py
+    """
+    q = (args.get("q") or "").strip()
+    try:
+        limit, after = page_args(args, 1, default_limit=SEARCH_LIMIT if q else DEFAULT_LIMIT)
+        fields = pick_fields(args, PATIENT_FIELDS)
+        if after:
+            after = [int(after[0])]
+    except (BadPageRequest, TypeError, ValueError) as e:
+        return {'status': 'error', 'message': str(e)}, 400
+
+    where_sql = ""
+    params = []
+    if q:
+        # ค้นจากดัชนี trigram ในหน่วยความจำ แล้วดึงเฉพาะคนไข้ที่ตรง (แทน LIKE '%q%' ทั้งตาราง)
+        ids = yield call(patient_index.search, q, limit + 1, after[0] if after else None)
+        if not ids:
+            return {'status': 'success', 'data': [], 'next_cursor': None}, 200
+        where_sql = "WHERE p.patient_id IN (" + ", ".join(["%s"] * len(ids)) + ")"
+        params.extend(ids)
+    elif after:
+        where_sql = "WHERE p.patient_id < %s"
+        params.append(after[0])
+
+    # lastVisit มาจากตารางสรุป (หนึ่งแถวต่อคนไข้) join เฉพาะตอนที่ขอ
+    join_sql = ""
+    if 'lastVisit' in fields:
+        join_sql = "LEFT JOIN patient_visit_summary s ON s.patient_id = p.patient_id"
+
+    params.append(limit + 1)
+
+    rows = yield fetch(f"""
+      SELECT
+              {select_list(fields, PATIENT_FIELDS, ["p.patient_id"])}
+      FROM patient p
+      {join_sql}
+      {where_sql}
+      ORDER BY p.patient_id DESC
+      LIMIT %s
+    """, params)
+    rows, next_cursor = finish_page(rows, limit, 1)
+    return _page(rows, next_cursor)
+
+
+def patient_records(pid, args):
+    """ประวัติการรักษา (ล่าสุดก่อน) รองรับ ?limit= / ?cursor= / ?fields= (ดู pagination.py)"""
+    try:
+        limit, after = page_args(args, 2)
+        fields = pick_fields(args, RECORD_FIELDS)
+    except BadPageRequest as e:
+        return {'status': 'error', 'message': str(e)}, 400
+
+    # อ่านผ่าน cache ก่อนยืม connection (ล้างเมื่อมีการบันทึกการรักษาของคนไข้คนนี้)
+    cache_key = (pid, args.get("cursor") or "", limit, tuple(fields))
+    cached = cache.records_cache.get(cache_key)
+    if cached is not MISSING:
+        rows, next_cursor = cached
+        return _page(rows, next_cursor)
+
+    tag = patient_tag(pid)
+    version = cache.records_cache.version(tag)
+
+    where_sql = "WHERE t.patient_id = %s"
+    params = [pid]
+    if after:
+        after_sql, after_params = keyset_where(["t.treatment_date", "t.treatment_id"], after, "<")
+        where_sql += " AND " + after_sql
+        params.extend(after_params)
+
+    join_sql = "JOIN doctor d ON d.doctor_id = t.doctor_id" if 'doctor' in fields else ""
+
+    params.append(limit + 1)
+
+    rows = yield fetch(f"""
+      SELECT
+              {select_list(fields, RECORD_FIELDS, ["DATE_FORMAT(t.treatment_date,'%Y-%m-%d')", "t.treatment_id"])}
+      FROM treatment t
+      {join_sql}
+      {where_sql}
+      ORDER BY t.treatment_date DESC, t.treatment_id DESC
+      LIMIT %s
+    """, params)
+    rows, next_cursor = finish_page(rows, limit, 2)
+    cache.records_cache.set(cache_key, (rows, next_cursor), tags=(tag,), versions={tag: version})
+    return _page(rows, next_cursor)
+
+
+def list_appointments(args):
+    """
+    ดึงรายการนัด:
+      - รองรับ ?date=2025-11-13
+      - รองรับ ?doctor_id=1
+      - รองรับ ?status=scheduled
+      - รองรับ ?limit= / ?cursor= / ?fields= (ดู pagination.py)
+    """
+    date_str   = (args.get("date") or "").strip()
+    doctor_id  = (args.get("doctor_id") or "").strip()
+    status     = (args.get("status") or "").strip()
+
+    try:
+        limit, after = page_args(args, 3)
+        fields = pick_fields(args, APPOINTMENT_FIELDS)
+    except BadPageRequest as e:
+        return {'status': 'error', 'message': str(e)}, 400
+
+    where_clauses = []
+    params = []
+
+    if date_str:
+        where_clauses.append("a.appointment_date = %s")
+        params.append(date_str)
+
+    if doctor_id:
+        try:
+            doctor_id_int = int(doctor_id)
+            where_clauses.append("a.doctor_id = %s")
+            params.append(doctor_id_int)
+        except Exception:
+            return {
+                'status': 'error',
+                'message': 'doctor_id ต้องเป็นตัวเลข'
+            }, 400
+
+    if status:
+        where_clauses.append("a.status = %s")
+        params.append(status)
+
+    if after:
+        after_sql, after_params = keyset_where(
+            ["a.appointment_date", "a.appointment_time", "a.appointment_id"], after)
+        where_clauses.append(after_sql)
+        params.extend(after_params)
+
+    where_sql = "WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+
+    # join patient / doctor เฉพาะตอนที่ขอชื่อ
+    join_sql = ""
+    if 'patient_name' in fields:
+        join_sql += "JOIN patient p ON p.patient_id = a.patient_id\n"
+    if 'doctor_name' in fields:
+        join_sql += "JOIN doctor  d ON d.doctor_id  = a.doctor_id\n"
+
+    params.append(limit + 1)
+
+    # %S (ไม่ใช่ %s) — mysql-connector แทน %s ทุกตัวในคำสั่งด้วยพารามิเตอร์ แม้อยู่ในเครื่องหมายคำพูด
+    keys = [
+        "DATE_FORMAT(a.appointment_date, '%Y-%m-%d')",
+        "TIME_FORMAT(a.appointment_time, '%H:%i:%S')",
+        "a.appointment_id",
+    ]
+
+    try:
+        rows = yield fetch(f"""
+            SELECT
+              {select_list(fields, APPOINTMENT_FIELDS, keys)}
+            FROM appointment a
+            {join_sql}
+            {where_sql}
+            ORDER BY a.appointment_date, a.appointment_time, a.appointment_id
+            LIMIT %s
+        """, params)
+        rows, next_cursor = finish_page(rows, limit, 3)
+        return _page(rows, next_cursor)
+
+    except Exception as e:
+        print("list_appointments error:", e)
+        return {'status': 'error', 'message': 'ไม่สามารถดึงข้อมูลงานนัดหมายได้'}, 500
+
+
+def create_treatment(data, idempotency_key=None):
+    """
+    หมอกดบันทึกการรักษา:
+      - ใช้ appointment_id จาก front
+      - ดึง patient_id / doctor_id จาก appointment
+      - สร้าง treatment
+      - set appointment.status = 'completed'
+      - ถ้ายังไม่มี payment -+ สร้าง payment = unpaid
+
+    ทั้งหมดเป็น transaction เดียว ใช้ 6–7 round trip (เดิม 10):
+      BEGIN → SELECT ใบนัด+payment (FOR UPDATE) → INSERT treatment → UPDATE appointment
+      → INSERT payment (ถ้ายังไม่มี) → ปรับตารางสรุป → COMMIT
+    กันบันทึกซ้ำด้วย unique key (treatment.appointment_id / payment.appointment_id) แทนการ SELECT เช็คก่อน
+    (สร้างโดย migrations.py)
+
+    idempotency_key (header Idempotency-Key หรือ field idempotency_key): ส่งซ้ำด้วย key เดิม
+    → ได้ผลลัพธ์เดิม (201) โดยไม่บันทึกซ้ำ
+    """
+    appointment_id = data.get('appointment_id')
+    symptom       = (data.get('symptom') or '').strip()
+    diagnosis     = (data.get('diagnosis') or '').strip()
+    advice        = (data.get('advice') or '').strip()
+    idempotency_key = (idempotency_key or data.get('idempotency_key') or '').strip() or None
+
+    # ต้องมี appointment_id + diagnosis + advice อย่างน้อย
+    if not appointment_id or not diagnosis or not advice:
+        return {
+            'status': 'error',
+            'message': 'ต้องส่ง appointment_id, diagnosis, advice มาครบ'
+        }, 400
+
+    try:
+        appointment_id = int(appointment_id)
+    except Exception:
+        return {
+            'status': 'error',
+            'message': 'appointment_id ต้องเป็นตัวเลข'
+        }, 400
+
+    if idempotency_key is not None and len(idempotency_key) > IDEMPOTENCY_KEY_MAX:
+        return {
+            'status': 'error',
+            'message': f'idempotency_key ยาวได้ไม่เกิน {IDEMPOTENCY_KEY_MAX} ตัวอักษร'
+        }, 400
+
+    def success(treatment_id, payment_id):
+        return {
+            'status': 'success',
+            'message': 'บันทึกการรักษาและสร้างข้อมูลชำระเงินเรียบร้อย',
+            'data': {
+                'treatment_id': treatment_id,
+                'appointment_id': appointment_id,
+                'payment_id': payment_id
+            }
+        }, 201
+
+    try:
+        # ทั้งหมดอยู่ใน transaction เดียว (return กลางทาง → ตัวรัน rollback ให้)
+        yield BEGIN
+
+        # 1) ใบนัด + payment เดิม (ถ้ามี) ในคำสั่งเดียว ล็อกใบนัดไว้กันสองคำขอบันทึกพร้อมกัน
+        appt = yield one("""
+            SELECT
+              a.patient_id,
+              a.doctor_id,
+              a.appointment_date,
+              a.appointment_time,
+              a.status,
+              pay.payment_id
+            FROM appointment a
+            LEFT JOIN payment pay ON pay.appointment_id = a.appointment_id
+            WHERE a.appointment_id = %s
+            LIMIT 1
+            FOR UPDATE
+        """, (appointment_id,))
+
+        if not appt:
+            return {
+                'status': 'error',
+                'message': 'ไม่พบใบนัดนี้ในระบบ'
+            }, 404
+
+        patient_id = appt["patient_id"]
+        doctor_id  = appt["doctor_id"]
+        payment_id = appt["payment_id"]
+
+        # 2) สร้าง treatment — ใบนัดที่บันทึกไปแล้วจะชน unique key (appointment_id / idempotency_key)
+        try:
+            done = yield run("""
+                INSERT INTO treatment (
+                    patient_id,
+                    doctor_id,
+                    appointment_id,
+                    symptom,
+                    diagnosis,
+                    advice,
+                    treatment_date,
+                    idempotency_key
+                ) VALUES (
+                    %s, %s, %s,
+                    %s, %s, %s,
+                    %s, %s
+                )
+            """, (
+                patient_id,
+                doctor_id,
+                appointment_id,
+                symptom,
+                diagnosis,
+                advice,
+                date.today(),
+                idempotency_key
+            ))
+        except Exception as e:
+            # ทางนี้เกิดเฉพาะตอนบันทึกซ้ำ: ดูว่าชนกับอะไร
+            existing = yield one("""
+                SELECT treatment_id, appointment_id, idempotency_key
+                FROM treatment
+                WHERE appointment_id = %s OR (idempotency_key IS NOT NULL AND idempotency_key = %s)
+                ORDER BY appointment_id = %s DESC
+                LIMIT 1
+            """, (appointment_id, idempotency_key, appointment_id))
+            if not existing:
+                raise e
+            if existing["appointment_id"] != appointment_id:
+                return {
+                    'status': 'error',
+                    'message': 'idempotency_key นี้ถูกใช้กับใบนัดอื่นแล้ว'
+                }, 409
+            if idempotency_key is not None and existing["idempotency_key"] == idempotency_key:
+                # ส่งซ้ำ (retry) → ผลลัพธ์เดิม
+                return success(existing["treatment_id"], payment_id)
+            return {
+                'status': 'error',
+                'message': 'ใบนัดนี้มีการบันทึกการรักษาแล้ว',
+                'treatment_id': existing["treatment_id"]
+            }, 400
+        treatment_id = done.lastrowid
+
+        # 3) อัปเดตสถานะนัดเป็น completed
+        yield run("""
+            UPDATE appointment
+            SET status = 'completed'
+            WHERE appointment_id = %s
+        """, (appointment_id,))
+
+        # 4) ถ้ายังไม่มี payment ของใบนัดนี้ → สร้างใหม่ status = unpaid
+        #    (ON DUPLICATE KEY กันกรณีมีคนสร้างมาก่อนระหว่างนั้น → ได้ payment_id เดิม)
+        new_payment = payment_id is None
+        if new_payment:
+            done = yield run("""
+                INSERT INTO payment (
+                    patient_id,
+                    appointment_id,
+                    amount,
+                    payment_method,
+                    payment_date,
+                    status
+                ) VALUES (
+                    %s, %s,
+                    %s, %s, %s, %s
+                )
+                ON DUPLICATE KEY UPDATE payment_id = LAST_INSERT_ID(payment_id)
+            """, (
+                patient_id,
+                appointment_id,
+                0.00,      # ยังไม่คิดเงิน
+                'cash',    # default method; ตอนจ่ายจริงค่อยแก้
+                None,
+                'unpaid'
+            ))
+            payment_id = done.lastrowid
+
+        # 5) ตารางสรุปคนไข้: การมารักษา + ยอดค้าง ในคำสั่งเดียว
+        yield run(visit_summary.TREATMENT_SQL,
+                  (patient_id, date.today(), diagnosis, 0.00, 1 if new_payment else 0))
+
+        yield COMMIT
+        schedule.remove(appointment_id)
+        cache.invalidate_patient(patient_id)
+        change_feed.publish_appointment('completed', appointment_id, doctor_id, appt["appointment_date"],
+                                        appt["appointment_time"], 'completed', patient_id, appt)
+        if new_payment:
+            change_feed.publish_payment('created', payment_id, patient_id, 'unpaid', 0.00, appointment_id)
+        return success(treatment_id, payment_id)
+
+    except Exception as e:
+        print("create_treatment error:", e)
+        return {
+            'status': 'error',
+            'message': 'เกิดข้อผิดพลาดในการบันทึกการรักษา'
+        }, 500
+
+
+def patient_summary(patient_id):
+    """
+    ข้อมูลคนไข้ + สรุปการมารักษา (patient_visit_summary) + ประวัติการรักษาล่าสุด 5 รายการ
+    คืน { "ok", "patient", "summary", "recent_treatments" } ผ่าน summary_cache
+    (ล้างอัตโนมัติเมื่อมีการบันทึกการรักษา/ชำระเงินของคนไข้คนนี้)
+    """
+    patient_id = int(patient_id)
+    cached = summary_cache.get(patient_id)
+    if cached is not MISSING:
+        return cached
+
+    tag = patient_tag(patient_id)
+    version = summary_cache.version(tag)
+
+    patient = yield one("""
+        SELECT
+          p.*,
+          s.last_visit,
+          COALESCE(s.visit_count, 0) AS visit_count,
+          s.last_diagnosis,
+          COALESCE(s.unpaid_balance, 0) AS unpaid_balance,
+          COALESCE(s.unpaid_count, 0) AS unpaid_count
+        FROM patient p
+        LEFT JOIN patient_visit_summary s ON s.patient_id = p.patient_id
+        WHERE p.patient_id = %s
+    """, (patient_id,))
+    if patient is None:
+        return {"ok": False, "patient": None, "summary": None, "recent_treatments": []}
+
+    summary = {k: patient.pop(k) for k in
+               ("last_visit", "visit_count", "last_diagnosis", "unpaid_balance", "unpaid_count")}
+
+    # ยังไม่เคยมารักษา → ไม่ต้อง query ประวัติ
+    history = []
+    if summary["visit_count"]:
+        history = yield fetch("""
+            SELECT t.treatment_date, t.diagnosis, t.advice
+            FROM treatment t
+            WHERE t.patient_id = %s
+            ORDER BY t.treatment_date DESC
+            LIMIT 5
+        """, (patient_id,))
+
+    result = {"ok": True, "patient": patient, "summary": summary, "recent_treatments": history}
+    summary_cache.set(patient_id, result, tags=(tag,), versions={tag: version})
+    return result
+
+
+def bot_patient_summary(raw_patient_id):
+    """GET /api/bot/patient_summary?patient_id= → (body, status)"""
+    if not raw_patient_id:
+        return {"ok": False, "errors": ["กรุณาระบุรหัสผู้ป่วย"]}, 400
+
+    try:
+        patient_id = int(raw_patient_id)
+    except ValueError:
+        return {"ok": False, "errors": ["รหัสผู้ป่วยต้องเป็นตัวเลข"]}, 400
+
+    result = yield from patient_summary(patient_id)
+
+    if not result["ok"]:
+        return {"ok": False, "errors": ["ไม่พบข้อมูลผู้ป่วย"]}, 404
+
+    return {
+        "ok": True,
+        "patient": result["patient"],
+        "summary": result["summary"],
+        "recent_treatments": result["recent_treatments"]
+    }, 200
@@ -0,0 +1,182 @@
+"""
+สถานะของ process สำหรับ load balancer / orchestrator และ warm-up หลังเริ่มระบบ
+
+  GET /healthz   liveness: process ยังตอบได้ (ไม่แตะ DB) → 200 เสมอ
+  GET /readyz    readiness: ฐานข้อมูลใช้ได้ + warm-up ครบ → 200, ยังไม่พร้อม → 503
+                 body บอกสถานะแต่ละส่วน และเวลาเริ่มระบบ (startup)
+
+warm-up โหลดดัชนีในหน่วยความจำ (schedule_index / working_hours / patient_search) ใน thread เบื้องหลัง
+เริ่มเองเมื่อมีคำขอแรก (หรือ serve.py / python api.py สั่งเริ่มทันที) ไม่ต้องรอให้เสร็จก่อนรับคำขอ —
+คำขอที่มาก่อนยังใช้ได้ ดัชนีโหลดเองตอนใช้ครั้งแรก (ช้ากว่าเฉพาะคำขอนั้น)
+ล้มเหลว (เช่น MySQL ยังไม่ขึ้น) → ลองใหม่เฉพาะส่วนที่ไม่ผ่าน ห่างขึ้นเท่าตัวทุกรอบ
+  WARMUP_BACKOFF       รอบแรกรอกี่วินาที (ค่าเริ่มต้น 1)
+  WARMUP_BACKOFF_MAX   รอนานสุดกี่วินาที (ค่าเริ่มต้น 30)
+
+startup (วินาที นับจากตอน api.py เริ่ม import หรือตอน fork ของ worker ที่ preload):
+  import_seconds / first_response_seconds / warmup_seconds — ดู bench/bench_startup.py
+"""
+import os
+import threading
+import time
+
+_t0 = time.perf_counter()        # api.py import ไฟล์นี้ก่อนอย่างอื่น
+
+WARMUP_BACKOFF = float(os.getenv("WARMUP_BACKOFF", "1"))
+WARMUP_BACKOFF_MAX = float(os.getenv("WARMUP_BACKOFF_MAX", "30"))
+READY_DB_TIMEOUT = 1.0           # วินาทีที่ /readyz รอยืม connection
+
+_startup = {'import_seconds': None, 'first_response_seconds': None, 'warmup_seconds': None}
+
+
+def _since_start():
+    return round(time.perf_counter() - _t0, 4)
+
+
+def mark_imported():
+    """เรียกท้าย api.py"""
+    _startup['import_seconds'] = _since_start()
+
+
+def startup():
+    return dict(_startup)
+
+
+# ---------- warm-up ----------
+def _schedule_index():
+    from schedule_index import schedule
+    schedule.ensure_loaded()
+
+
+def _working_hours():
+    from working_hours import hours
+    hours.ensure_loaded()
+
+
+def _patient_search():
+    from patient_search import patient_index
+    if not patient_index.loaded:
+        patient_index.rebuild()
+
+
+WARMUP_TASKS = [
+    ("schedule_index", _schedule_index),
+    ("working_hours", _working_hours),
+    ("patient_search", _patient_search),
+]
+
+
+class Warmup:
+    def __init__(self, tasks):
+        self._lock = threading.Lock()
+        self._tasks = list(tasks)
+        self._status = {name: {'ready': False, 'attempts': 0, 'seconds': None, 'error': None}
+                        for name, _ in self._tasks}
+        self._thread = None
+
+    @property
+    def started(self):
+        return self._thread is not None
+
+    def start(self):
+        """เริ่ม warm-up ใน thread เบื้องหลัง (เรียกซ้ำได้ เริ่มครั้งเดียว)"""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._thread = threading.Thread(target=self._run, name="clinic-warmup", daemon=True)
+            self._thread.start()
+            return True
+
+    def _round(self, tasks):
+        failed = []
+        for name, fn in tasks:
+            started = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                with self._lock:
+                    entry = self._status[name]
+                    entry['attempts'] += 1
+                    entry['error'] = str(e)
+                failed.append((name, fn))
+                continue
+            with self._lock:
+                entry = self._status[name]
+                entry['attempts'] += 1
+                entry['ready'] = True
+                entry['seconds'] = round(time.perf_counter() - started, 4)
+                entry['error'] = None
+        return failed
+
+    def _run(self):
+        pending = self._tasks
+        backoff = WARMUP_BACKOFF
+        while True:
+            pending = self._round(pending)
+            if not pending:
+                break
+            print(f">>> warm-up ยังไม่ครบ ({', '.join(name for name, _ in pending)}) "
+                  f"ลองใหม่ในอีก {backoff:g} วินาที")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, WARMUP_BACKOFF_MAX)
+        _startup['warmup_seconds'] = _since_start()
+
+    def status(self):
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._status.items()}
+
+    @property
+    def ready(self):
+        with self._lock:
+            return all(entry['ready'] for entry in self._status.values())
+
+
+warmup = Warmup(WARMUP_TASKS)
+
+
+def start_warmup():
+    return warmup.start()
+
+
+# ---------- probe ----------
+def liveness():
+    return {'status': 'ok', 'pid': os.getpid(), 'uptime_seconds': _since_start()}, 200
+
+
+def readiness():
+    import db
+
+    warmup.start()
+    db_error = db.pool.check(READY_DB_TIMEOUT)
+    tasks = warmup.status()
+    ready = db_error is None and all(t['ready'] for t in tasks.values())
+    return {
+        'status': 'ready' if ready else 'not_ready',
+        'database': {'ok': db_error is None, 'error': db_error},
+        'warmup': tasks,
+        'startup': startup(),
+    }, 200 if ready else 503
+
+
+def init_app(app):
+    @app.before_request
+    def _start_warmup():
+        if not warmup.started:
+            warmup.start()
+
+    @app.after_request
+    def _first_response(response):
+        if _startup['first_response_seconds'] is None:
+            _startup['first_response_seconds'] = _since_start()
+        return response
+
+
+def _after_fork():
+    # worker ที่ fork จาก master ที่ preload ไว้: นับเวลาใหม่ และ warm-up ของตัวเอง
+    global _t0, warmup
+    _t0 = time.perf_counter()
+    _startup['first_response_seconds'] = None
+    _startup['warmup_seconds'] = None
+    warmup = Warmup(WARMUP_TASKS)
+
+
+os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,74 @@
+"""
+จับคู่คีย์เวิร์ดหลายคำในครั้งเดียวด้วย Aho-Corasick automaton
+
+สร้าง automaton ครั้งเดียวตอน import จากตาราง { intent: [keyword, ...] }
+แล้วไล่ข้อความรอบเดียว (O(ความยาวข้อความ + จำนวนที่เจอ)) ไม่ว่าคีย์เวิร์ดจะมีกี่พันคำ
+
+คะแนนของแต่ละ intent = (ความยาวคีย์เวิร์ดที่ยาวที่สุดที่เจอ, จำนวนตัวอักษรที่เจอทั้งหมด)
+คีย์เวิร์ดที่ยาว/เฉพาะเจาะจงกว่าจึงชนะ ถ้าเท่ากันใช้ลำดับในตาราง
+"""
+
+
+class KeywordMatcher:
+    def __init__(self, table):
+        self.labels = list(table)
+        self._goto = [{}]        # state -> {ตัวอักษร: state ถัดไป}
+        self._fail = [0]
+        self._out = [()]         # state -> ((label_index, ความยาวคีย์เวิร์ด), ...)
+
+        for label_index, label in enumerate(self.labels):
+            for keyword in table[label]:
+                self._add(keyword.strip().lower(), label_index)
+        self._build()
+
+    def _add(self, keyword, label_index):
+        if not keyword:
+            return
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._goto[state][ch] = nxt
+            state = nxt
+        self._out[state] = self._out[state] + ((label_index, len(keyword)),)
+
+    def _build(self):
+        # BFS ตั้ง fail link และรวม output ของ suffix เข้ามา
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._out[self._fail[nxt]]:
+                    self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scores(self, text):
+        """คืน [(label, (ยาวสุด, รวมตัวอักษร)), ...] เรียงจากคะแนนมากไปน้อย"""
+        goto, fail, out = self._goto, self._fail, self._out
+        best = {}
+        state = 0
+        for ch in text.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for label_index, length in out[state]:
+                longest, total = best.get(label_index, (0, 0))
+                best[label_index] = (max(longest, length), total + length)
+
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+        return [(self.labels[i], score) for i, score in ranked]
+
+    def best(self, text):
+        ranked = self.scores(text)
+        return ranked[0][0] if ranked else None
@@ -0,0 +1,95 @@
+"""
+JSON ของ response / request ทั้งแอป (app.json — jsonify, request.get_json, โหมด ASGI)
+
+ค่าจากฐานข้อมูลแปลงแบบเดียวกันทุก route (route ไม่ต้องแปลงเอง):
+  date       → "YYYY-MM-DD"
+  datetime   → "YYYY-MM-DDTHH:MM:SS"   (ISO 8601)
+  timedelta  → "HH:MM"                 (MySQL TIME คืนมาเป็น timedelta, แบบเดียวกับ TIME_FORMAT '%H:%i')
+  time       → "HH:MM:SS"              (ISO 8601 — ไม่มีในแถวจาก MySQL)
+  Decimal    → "1234.50"               (สตริง ไม่เสียทศนิยมแบบ float)
+
+ใช้ orjson ถ้าติดตั้งไว้ (เร็วกว่า json ของ Python ราว 10 เท่าบนรายการยาว ๆ ดู bench/bench_json.py)
+ไม่มี → json ของ Python ได้ผลเหมือนกันทุกไบต์
+ทั้งสองแบบ: ไม่เว้นวรรค, ภาษาไทยเป็น UTF-8 ตรง ๆ (ไม่ escape เป็น \\uXXXX), key เรียงตามลำดับเดิม
+ยกเว้น app.debug (python api.py) จัดย่อหน้าให้อ่านง่าย
+"""
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from flask.json.provider import JSONProvider
+
+from schedule_index import format_minutes
+
+try:
+    import orjson
+except ImportError:          # ไม่บังคับติดตั้ง
+    orjson = None
+
+
+def _clock_text(value):
+    minutes = (value.days * 86400 + value.seconds) // 60
+    return format_minutes(minutes)
+
+
+# type → ตัวแปลง (datetime ก่อน date เพราะเป็น subclass กัน) — orjson แปลง date / datetime / time เอง
+_ENCODERS = {
+    timedelta: _clock_text,
+    Decimal: str,
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    time: time.isoformat,
+}
+
+
+def default(value):
+    """ชนิดที่ json ไม่รู้จัก → ค่าที่ encode ได้ (ชนิดอื่น TypeError เหมือน json ปกติ)"""
+    encode = _ENCODERS.get(type(value))
+    if encode is not None:
+        return encode(value)
+    for kind, encode in _ENCODERS.items():
+        if isinstance(value, kind):
+            return encode(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj, indent=False):
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default,
+                                option=orjson.OPT_INDENT_2 if indent else None)
+        except TypeError:
+            # ที่ orjson ไม่รับแต่ json รับ (เช่น key ของ dict เป็นตัวเลข, int เกิน 64 บิต) → ใช้ json แทน
+            pass
+    return _stdlib_dumps(obj, indent).encode("utf-8")
+
+
+def _stdlib_dumps(obj, indent=False):
+    if indent:
+        return json.dumps(obj, default=default, ensure_ascii=False, indent=2)
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(",", ":"))
+
+
+class ClinicJSONProvider(JSONProvider):
+    """ใช้แทน DefaultJSONProvider ของ Flask: app.json = ClinicJSONProvider(app)"""
+
+    compact = None           # None = ย่อหน้าเฉพาะตอน app.debug (เหมือน DefaultJSONProvider)
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault("default", default)
+            kwargs.setdefault("ensure_ascii", False)
+            return json.dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        # ส่งไบต์ให้ Response ตรง ๆ ไม่ต้อง decode แล้ว encode กลับ
+        return self._app.response_class(dumps_bytes(obj, indent), mimetype=self.mimetype)
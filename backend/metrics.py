@@ -0,0 +1,207 @@
+"""
+ตัวเก็บสถิติแบบเบา ๆ ส่งออกเป็น Prometheus text exposition format ที่ GET /metrics
+
+  clinic_http_requests_total{method, route, status}          จำนวนคำขอ
+  clinic_http_request_duration_seconds{method, route}        เวลาทั้งคำขอ (histogram)
+  clinic_http_request_db_seconds{method, route}              เวลาที่ใช้คุย DB ในคำขอนั้น (histogram)
+  clinic_http_request_queries{method, route}                 จำนวนคำสั่ง SQL ต่อคำขอ (histogram)
+  clinic_sql_n_plus_one_total{method, route}                 คำขอที่เจอ SELECT ซ้ำแบบ N+1
+  clinic_db_pool_wait_seconds                                เวลารอยืม connection จาก pool (histogram)
+  clinic_chat_intent_total{intent}                           intent ที่ detect_intent เดาได้
+  clinic_http_compress_bytes_in_total{route, encoding}       ไบต์ก่อนบีบ (ดู compression.py)
+  clinic_http_compress_bytes_out_total{route, encoding}      ไบต์หลังบีบ
+  clinic_http_compress_ratio{route, encoding}                ขนาดหลัง / ก่อนบีบ ต่อ response (histogram)
+  clinic_http_compress_cpu_seconds_total{route, encoding}    เวลา CPU ที่ใช้บีบ
+  clinic_db_pool_* / clinic_cache_* / clinic_feed_*          ค่าปัจจุบันจาก stats() ของแต่ละส่วน (gauge)
+
+route เป็น rule ของ Flask (เช่น /patients/<int:pid>/records) ไม่ใช่ path จริง → จำนวน label คงที่
+ค่าใช้จ่ายต่อคำขอ: อ่านนาฬิกาไม่กี่ครั้ง + lock สั้น ๆ ต่อ histogram เปิดไว้ใน production ได้
+สถิติแยกต่อ process (ถ้ารันหลาย worker ให้ scrape ทุก worker หรือรวมที่ฝั่ง Prometheus)
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+# ขอบบนของ bucket (วินาที) ครอบตั้งแต่อ่าน cache (~ms) ถึง query ช้า / pool เต็ม (หลายวินาที)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels_text(names, values):
+    if not names:
+        return ""
+    parts = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return repr(value) if value == value else "NaN"
+    return str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels_text(self.labels, k)} {_number(v)}" for k, v in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}        # label values → [จำนวนต่อ bucket (+Inf ท้ายสุด), ผลรวม]
+
+    def observe(self, value, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for key, (counts, total) in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels_text(names, key + (le,))} {running}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels_text(self.labels, key)} {running}")
+        return lines
+
+
+REQUESTS = Counter("clinic_http_requests_total", "จำนวนคำขอ HTTP", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("clinic_http_request_duration_seconds", "เวลาตอบคำขอทั้งหมด",
+                            ("method", "route"))
+REQUEST_DB_SECONDS = Histogram("clinic_http_request_db_seconds", "เวลาที่คุยกับ DB ต่อคำขอ",
+                               ("method", "route"))
+POOL_WAIT_SECONDS = Histogram("clinic_db_pool_wait_seconds", "เวลารอยืม connection จาก pool")
+REQUEST_QUERIES = Histogram("clinic_http_request_queries", "จำนวนคำสั่ง SQL ต่อคำขอ (ดู sql_trace.py)",
+                            ("method", "route"), buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100))
+N_PLUS_ONE = Counter("clinic_sql_n_plus_one_total", "คำขอที่มี SELECT เดียวกันซ้ำถึงเกณฑ์ SQL_N_PLUS_ONE",
+                     ("method", "route"))
+CHAT_INTENTS = Counter("clinic_chat_intent_total", "intent ที่ detect_intent เดาได้ (none = ไม่เจอ)",
+                       ("intent",))
+COMPRESS_BYTES_IN = Counter("clinic_http_compress_bytes_in_total", "ไบต์ของ response ก่อนบีบ",
+                            ("route", "encoding"))
+COMPRESS_BYTES_OUT = Counter("clinic_http_compress_bytes_out_total", "ไบต์ของ response หลังบีบ",
+                             ("route", "encoding"))
+COMPRESS_RATIO = Histogram("clinic_http_compress_ratio", "ขนาดหลังบีบ / ก่อนบีบ ต่อ response",
+                           ("route", "encoding"), buckets=(0.05, 0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1.0))
+COMPRESS_CPU_SECONDS = Counter("clinic_http_compress_cpu_seconds_total", "เวลา CPU ที่ใช้บีบ response",
+                               ("route", "encoding"))
+
+_METRICS = [REQUESTS, REQUEST_SECONDS, REQUEST_DB_SECONDS, REQUEST_QUERIES, N_PLUS_ONE,
+            POOL_WAIT_SECONDS, CHAT_INTENTS, COMPRESS_BYTES_IN, COMPRESS_BYTES_OUT, COMPRESS_RATIO,
+            COMPRESS_CPU_SECONDS]
+_GAUGES = []                 # [(prefix, ฟังก์ชันคืน dict ของ stats, ชื่อ label หรือ None)]
+
+
+def add_gauges(prefix, stats_fn, label=None):
+    """
+    ส่งออกตัวเลขจาก stats() ทุกครั้งที่ scrape เป็น gauge ชื่อ <prefix>_<key>
+    label ไม่ใช่ None → stats_fn คืน {ชื่อ: {key: ค่า}} แล้วใส่ชื่อเป็น label นั้น
+    """
+    _GAUGES.append((prefix, stats_fn, label))
+
+
+# ---------- เวลา DB ต่อคำขอ ----------
+_request_db = contextvars.ContextVar("clinic_request_db", default=None)
+
+
+def start_request():
+    """เริ่มนับเวลา DB ของคำขอปัจจุบัน (thread ของ Flask / task ของ ASGI)"""
+    holder = [0.0]
+    _request_db.set(holder)
+    return holder
+
+
+def add_db_time(seconds):
+    holder = _request_db.get()
+    if holder is not None:
+        holder[0] += seconds
+
+
+def observe_request(method, route, status, seconds, db_seconds):
+    REQUESTS.inc(method, route, str(status))
+    REQUEST_SECONDS.observe(seconds, method, route)
+    REQUEST_DB_SECONDS.observe(db_seconds, method, route)
+
+
+def init_app(app):
+    """เก็บสถิติทุก route ของ app (รวม blueprint) ด้วย before/after_request"""
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics = (time.perf_counter(), start_request())
+
+    @app.after_request
+    def _metrics_finish(response):
+        started = g.pop("_metrics", None)
+        if started is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            observe_request(request.method, rule, response.status_code,
+                            time.perf_counter() - started[0], started[1][0])
+        return response
+
+    @app.teardown_request
+    def _metrics_error(exc=None):
+        # exception ที่ไม่ถูกจับ → after_request ไม่ถูกเรียก นับเป็น 500 ตรงนี้
+        started = g.pop("_metrics", None)
+        if started is not None:
+            rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+            observe_request(request.method, rule, 500, time.perf_counter() - started[0], started[1][0])
+
+
+# ---------- ส่งออก ----------
+def render():
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+
+    for prefix, stats_fn, label in _GAUGES:
+        try:
+            stats = stats_fn()
+        except Exception as e:
+            print("metrics gauge error:", e)
+            continue
+        rows = {}
+        for name, values in (stats.items() if label else [(None, stats)]):
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    labels = _labels_text((label,), (name,)) if label else ""
+                    rows.setdefault(f"{prefix}_{key}", []).append(f"{prefix}_{key}{labels} {_number(value)}")
+        for metric_name, metric_lines in rows.items():
+            lines.append(f"# TYPE {metric_name} gauge")
+            lines.extend(metric_lines)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,391 @@
+"""
+ปรับ schema ของฐานข้อมูลแบบมีเวอร์ชัน + ตรวจว่า query หลักใช้ index ได้จริง
+
+ใช้จาก command line:
+  python migrations.py status                 migration ไหนรันแล้ว / ยังค้าง
+  python migrations.py up                     รันที่ยังค้างตามลำดับ (รันซ้ำได้ ข้ามที่รันแล้ว)
+  python migrations.py check                  EXPLAIN query หลักบน MySQL → exit 1 ถ้ามี full scan
+  python migrations.py check --sqlite [PATH]  ตรวจแบบเดียวกันบน SQLite (schema จาก sql/sqlite_dev.sql
+                                              หรือไฟล์ที่ bench/datagen.py สร้าง)
+
+เวอร์ชันที่รันแล้วเก็บในตาราง schema_migrations และกันรันพร้อมกันหลายเครื่องด้วย GET_LOCK
+ตารางหลัก (patient / doctor / appointment / treatment / payment) ต้องมีอยู่ก่อน — migration
+เพิ่มเฉพาะตาราง / คอลัมน์ / index ที่ backend นี้ต้องใช้
+
+ทุกขั้นตรวจจาก information_schema ก่อน (มีอยู่แล้วก็ข้าม) จึงรันบนฐานข้อมูลที่เคยรัน sql/*.sql
+ด้วยมือมาก่อนได้ และรันต่อได้ถ้าค้างกลางทาง (DDL ของ MySQL commit ทันที ย้อนกลับทั้ง migration ไม่ได้)
+
+เพิ่ม migration ใหม่: ต่อท้าย MIGRATIONS (ห้ามแก้ของเดิมที่ปล่อยไปแล้ว)
+index ที่เพิ่มต้องเพิ่มใน sql/sqlite_dev.sql ด้วย และ query หลักใหม่ให้เพิ่มใน HOT_QUERIES
+
+check บน MySQL ควรรันกับฐานข้อมูลที่มีข้อมูลใกล้ของจริง (เช่นจาก bench/datagen.py --mysql)
+ตารางที่มีไม่กี่แถว optimizer อาจเลือก full scan เพราะถูกกว่าจริง ๆ
+"""
+import os
+import re
+import sys
+
+from db import get_db
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql")
+LOCK_NAME = "clinic_migrations"
+LOCK_TIMEOUT = 60            # วินาทีที่รอ process อื่นที่กำลังรัน migration
+
+# ตารางเล็ก (ไม่กี่ร้อยแถว) ที่ scan ทั้งตารางได้
+SMALL_TABLES = {"doctor", "doctor_schedule", "doctor_schedule_exception"}
+
+
+class MigrationError(Exception):
+    """migration รันต่อไม่ได้ (เช่น มีข้อมูลซ้ำก่อนสร้าง unique key)"""
+
+
+# ---------- ขั้นตอนย่อย (แต่ละขั้นรับ cursor แบบ dictionary) ----------
+def _statements(text):
+    """แยกไฟล์ .sql เป็นคำสั่ง (ตัดบรรทัด comment --)"""
+    lines = [line for line in text.splitlines() if not line.strip().startswith("--")]
+    return [s.strip() for s in "\n".join(lines).split(";") if s.strip()]
+
+
+def sql_file(name):
+    """รันไฟล์ใน sql/ (ต้องเป็นคำสั่งที่รันซ้ำได้ เช่น CREATE TABLE IF NOT EXISTS)"""
+    def step(cur):
+        with open(os.path.join(SQL_DIR, name), encoding="utf-8") as f:
+            for statement in _statements(f.read()):
+                cur.execute(statement)
+    step.label = f"sql/{name}"
+    return step
+
+
+def _has_column(cur, table, column):
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column))
+    return bool(cur.fetchall())
+
+
+def _has_index(cur, table, name):
+    cur.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, name))
+    return bool(cur.fetchall())
+
+
+def ensure_column(table, column, definition):
+    def step(cur):
+        if not _has_column(cur, table, column):
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    step.label = f"column {table}.{column}"
+    return step
+
+
+def ensure_index(table, name, columns, unique=False):
+    def step(cur):
+        if not _has_index(cur, table, name):
+            kind = "UNIQUE INDEX" if unique else "INDEX"
+            cur.execute(f"ALTER TABLE {table} ADD {kind} {name} ({columns})")
+    step.label = f"{'unique ' if unique else ''}index {table}.{name} ({columns})"
+    return step
+
+
+def no_duplicates(table, column, index_name):
+    """หยุดก่อนสร้าง unique key ถ้ามีข้อมูลซ้ำอยู่เดิม (บอกว่าซ้ำที่ไหนแทน error ของ ALTER)"""
+    def step(cur):
+        if _has_index(cur, table, index_name):
+            return
+        cur.execute(f"""
+            SELECT {column} AS value, COUNT(*) AS n FROM {table}
+            WHERE {column} IS NOT NULL
+            GROUP BY {column} HAVING COUNT(*) > 1
+            LIMIT 10
+        """)
+        rows = cur.fetchall()
+        if rows:
+            sample = ", ".join(f"{r['value']} ({r['n']} แถว)" for r in rows)
+            raise MigrationError(f"{table}.{column} มีค่าซ้ำ ต้องแก้ข้อมูลก่อน: {sample}")
+    step.label = f"check duplicates {table}.{column}"
+    return step
+
+
+def _backfill_visit_summary(cur):
+    # เติมตารางสรุปครั้งแรกเท่านั้น (ตารางที่มีข้อมูลแล้วให้ใช้ python visit_summary.py backfill เอง)
+    cur.execute("SELECT 1 FROM patient_visit_summary LIMIT 1")
+    if cur.fetchall():
+        return
+    import visit_summary
+    visit_summary.backfill()
+
+
+_backfill_visit_summary.label = "backfill patient_visit_summary"
+
+
+# ---------- รายการ migration (version, ชื่อ, ขั้นตอน) ----------
+MIGRATIONS = [
+    (1, "doctor_schedule", [
+        sql_file("doctor_schedule.sql"),
+    ]),
+    (2, "patient_visit_summary", [
+        sql_file("patient_visit_summary.sql"),
+        _backfill_visit_summary,
+    ]),
+    # unique key ที่ POST /treatments ใช้แทนการ SELECT เช็คซ้ำก่อน INSERT (ดู flows.create_treatment)
+    (3, "treatment_constraints", [
+        ensure_column("treatment", "idempotency_key", "VARCHAR(64) NULL"),
+        no_duplicates("treatment", "appointment_id", "uq_treatment_appointment"),
+        ensure_index("treatment", "uq_treatment_appointment", "appointment_id", unique=True),
+        ensure_index("treatment", "uq_treatment_idempotency", "idempotency_key", unique=True),
+        no_duplicates("payment", "appointment_id", "uq_payment_appointment"),
+        ensure_index("payment", "uq_payment_appointment", "appointment_id", unique=True),
+    ]),
+    # index ของ query หลัก (ดู HOT_QUERIES)
+    (4, "hot_query_indexes", [
+        # GET /appointments?doctor_id=&date= / ตรวจชนคิวตอนนำเข้า
+        ensure_index("appointment", "idx_appointment_doctor_day",
+                     "doctor_id, appointment_date, status, appointment_time"),
+        # GET /appointments?date= และหน้าถัดไปของ cursor (เรียงตาม วัน, เวลา)
+        ensure_index("appointment", "idx_appointment_day", "appointment_date, appointment_time"),
+        # schedule_index.rebuild() อ่านเฉพาะนัด active (covering index)
+        ensure_index("appointment", "idx_appointment_status",
+                     "status, doctor_id, appointment_date, appointment_time"),
+        # ประวัติการรักษา / สรุปคนไข้ (ล่าสุดก่อน)
+        ensure_index("treatment", "idx_treatment_patient_date", "patient_id, treatment_date"),
+        # GET /payments/unpaid
+        ensure_index("payment", "idx_payment_status", "status"),
+    ]),
+    # POST /api/bot/next_slots?specialty= และ intent next_slot ของแชท
+    (5, "doctor_specialty", [
+        ensure_column("doctor", "specialty", "VARCHAR(100) NULL"),
+    ]),
+    # ดัชนีค้นหาคนไข้ดึงเฉพาะแถวที่ถูกแก้ (ดู patient_search.py)
+    (6, "patient_updated_at", [
+        ensure_column("patient", "updated_at",
+                      "TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+        ensure_index("patient", "idx_patient_updated_at", "updated_at"),
+    ]),
+]
+
+
+# ---------- ตัวรัน ----------
+def _ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          version     INT PRIMARY KEY,
+          name        VARCHAR(100) NOT NULL,
+          applied_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) DEFAULT CHARSET = utf8mb4
+    """)
+
+
+def _applied(cur):
+    cur.execute("SELECT version, name, applied_at FROM schema_migrations ORDER BY version")
+    return {r["version"]: r for r in cur.fetchall()}
+
+
+def status():
+    """คืน [(version, ชื่อ, applied_at หรือ None)]"""
+    conn = get_db()
+    cur = conn.cursor(dictionary=True)
+    try:
+        _ensure_table(cur)
+        applied = _applied(cur)
+    finally:
+        cur.close()
+        conn.close()
+    return [(version, name, applied[version]["applied_at"] if version in applied else None)
+            for version, name, _ in MIGRATIONS]
+
+
+def up(log=print):
+    """รัน migration ที่ยังค้าง คืนรายการ version ที่รันในครั้งนี้"""
+    conn = get_db()
+    cur = conn.cursor(dictionary=True)
+    done = []
+    try:
+        cur.execute("SELECT GET_LOCK(%s, %s) AS got", (LOCK_NAME, LOCK_TIMEOUT))
+        if not cur.fetchall()[0]["got"]:
+            raise MigrationError("มี process อื่นกำลังรัน migration อยู่")
+        try:
+            _ensure_table(cur)
+            applied = _applied(cur)
+            for version, name, steps in MIGRATIONS:
+                if version in applied:
+                    continue
+                log(f">>> {version:03d} {name}")
+                for step in steps:
+                    log(f"    {getattr(step, 'label', step.__name__)}")
+                    step(cur)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                            (version, name))
+                done.append(version)
+        finally:
+            cur.execute("SELECT RELEASE_LOCK(%s) AS released", (LOCK_NAME,))
+            cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+    return done
+
+
+# ---------- query หลักที่ต้องใช้ index ----------
+def _nth_sql(flow, n=0, answers=()):
+    """
+    เดิน flow (ดู flows.py) จนถึงคำสั่ง SQL ลำดับที่ n → (sql, params)
+    คำสั่งก่อนหน้า (ทั้ง call และ SQL) ตอบด้วยค่าจาก answers ตามลำดับ
+    """
+    answers = iter(answers)
+    result = None
+    seen = 0
+    try:
+        while True:
+            step = flow.send(result)
+            if step[0] in ("one", "all", "run", "many"):
+                if seen == n:
+                    return step[1], step[2]
+                seen += 1
+            result = next(answers, None)
+    finally:
+        flow.close()
+
+
+def _hot_queries():
+    """[(ชื่อ, sql, params)] — สร้างจากโค้ดจริงของ endpoint เพื่อไม่ให้ตรวจคนละคำสั่งกับที่ใช้งาน"""
+    import api
+    import flows
+    import patient_search
+    import schedule_index
+    from pagination import encode_cursor
+
+    day = "2025-11-13"
+    summary_row = {"visit_count": 1, "last_visit": None, "last_diagnosis": None,
+                   "unpaid_balance": 0, "unpaid_count": 0}
+    queries = [
+        ("appointments by doctor + date",
+         _nth_sql(flows.list_appointments({"doctor_id": "1", "date": day}))),
+        ("appointments by date (page 1)",
+         _nth_sql(flows.list_appointments({"date": day, "limit": "50"}))),
+        ("appointments next page",
+         _nth_sql(flows.list_appointments({"limit": "50",
+                                           "cursor": encode_cursor([day, "09:00:00", 100])}))),
+        ("appointments by doctor + status",
+         _nth_sql(flows.list_appointments({"doctor_id": "1", "status": "scheduled", "limit": "50"}))),
+        ("patients next page",
+         _nth_sql(flows.list_patients({"limit": "50", "cursor": encode_cursor([1000])}))),
+        ("patients search",
+         _nth_sql(flows.list_patients({"q": "สม"}), answers=[[30, 20, 10]])),
+        ("patient records (page 1)",
+         _nth_sql(flows.patient_records(1, {"limit": "20"}))),
+        ("patient records next page",
+         _nth_sql(flows.patient_records(1, {"limit": "20", "cursor": encode_cursor([day, 100])}))),
+        ("patient summary",
+         _nth_sql(flows.patient_summary(1))),
+        ("patient summary treatments",
+         _nth_sql(flows.patient_summary(1), n=1, answers=[dict(summary_row)])),
+        ("unpaid payments",
+         (api.UNPAID_PAYMENTS_SQL.format(ids_sql=""), ())),
+        ("schedule index rebuild",
+         (schedule_index.LOAD_SQL, (schedule_index.load_since(),))),
+        ("schedule index old day",
+         (schedule_index.DAY_SQL, (1, day))),
+        ("patient search refresh",
+         (patient_search.CHANGED_SQL, (2000, f"{day} 00:00:00"))),
+    ]
+    return [(name, sql, params) for name, (sql, params) in queries]
+
+
+_TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_KEYWORDS = {"where", "on", "join", "left", "right", "inner", "cross", "order", "group",
+             "limit", "using", "having", "for", "union"}
+
+
+def _aliases(sql):
+    """alias / ชื่อตาราง → ชื่อตาราง"""
+    names = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        names[table] = table
+        if alias and alias.lower() not in _KEYWORDS:
+            names[alias] = table
+    return names
+
+
+def _explain_mysql(sql, params):
+    """EXPLAIN บน MySQL → [(alias, รายละเอียด, full scan?)]"""
+    conn = get_db()
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute("EXPLAIN " + sql, params)
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+    return [(r["table"], f"type={r['type']} key={r['key']} rows={r['rows']}", r["type"] == "ALL")
+            for r in rows if r.get("table")]
+
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+def _sqlite_explainer(path):
+    import aiodb
+
+    raw = aiodb.SqliteDriver(path)._open()
+    raw.row_factory = None
+
+    def explain(sql, params):
+        """EXPLAIN QUERY PLAN บน SQLite → [(alias, รายละเอียด, full scan?)]"""
+        plan = raw.execute("EXPLAIN QUERY PLAN " + aiodb._sqlite_sql(sql),
+                           [aiodb._sqlite_param(p) for p in params]).fetchall()
+        result = []
+        for row in plan:
+            detail = row[-1]
+            m = _SQLITE_SCAN.match(detail)
+            if m:
+                result.append((m.group(1), detail, True))
+            elif detail.startswith(("SCAN ", "SEARCH ")):
+                result.append((detail.split()[1], detail, False))
+        return result
+
+    return explain
+
+
+def check(explain, log=print):
+    """EXPLAIN ทุก query ใน HOT_QUERIES คืนรายการที่ full scan ตารางใหญ่ [(ชื่อ query, ตาราง, รายละเอียด)]"""
+    failures = []
+    for name, sql, params in _hot_queries():
+        tables = _aliases(sql)
+        log(f">>> {name}")
+        for alias, detail, full_scan in explain(sql, params):
+            table = tables.get(alias, alias)
+            bad = full_scan and table not in SMALL_TABLES
+            log(f"    {'FULL SCAN ' if bad else ''}{table}: {detail}")
+            if bad:
+                failures.append((name, table, detail))
+    return failures
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "status":
+        for version, name, applied_at in status():
+            print(f"{version:03d} {name:<24} {applied_at or 'pending'}")
+    elif command == "up":
+        try:
+            ran = up()
+        except MigrationError as e:
+            print("migration error:", e)
+            sys.exit(1)
+        print(f">>> รัน migration แล้ว {len(ran)} รายการ" if ran else ">>> schema เป็นปัจจุบันแล้ว")
+    elif command == "check":
+        if "--sqlite" in sys.argv:
+            rest = sys.argv[sys.argv.index("--sqlite") + 1:]
+            explainer = _sqlite_explainer(rest[0] if rest else ":memory:")
+        else:
+            explainer = _explain_mysql
+        bad = check(explainer)
+        for name, table, detail in bad:
+            print(f"full scan: {name} → {table} ({detail})")
+        print(f">>> full scan {len(bad)} จุด")
+        sys.exit(1 if bad else 0)
+    else:
+        print("usage: python migrations.py status|up|check [--sqlite [PATH]]")
+        sys.exit(2)
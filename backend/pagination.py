@@ -0,0 +1,114 @@
+"""
+ตัวช่วยแบ่งหน้าแบบ keyset (cursor) และเลือกคอลัมน์ (?fields=) สำหรับ list endpoint
+
+  ?limit=50                 จำนวนแถวต่อหน้า (สูงสุด MAX_LIMIT)
+  ?cursor=<next_cursor>     หน้าถัดไป (ค่าจาก next_cursor ของหน้าก่อน)
+  ?fields=id,name,tel       เลือกเฉพาะคอลัมน์ที่ต้องใช้
+
+cursor คือค่าคอลัมน์ที่ใช้ ORDER BY ของแถวสุดท้าย (เข้ารหัส base64) ทำให้หน้าถัดไปใช้
+WHERE key > cursor (ดู keyset_where) แทน OFFSET — เร็วเท่าเดิมไม่ว่าจะอยู่หน้าไหน
+ไม่ส่ง limit มา = DEFAULT_LIMIT แถว — ไม่มีทางดึงทั้งตารางในคำขอเดียว
+หน้าจอที่ต้องการทั้งหมด (เช่นรายชื่อคนไข้) ให้ขอ ?limit=MAX_LIMIT แล้วตาม next_cursor จนเป็น null
+
+คอลัมน์ key ที่ใช้ทำ cursor ให้ SELECT เป็น _k0, _k1, ... แล้ว finish_page() จะตัดออกก่อนส่งกลับ
+"""
+import base64
+import json
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class BadPageRequest(ValueError):
+    """พารามิเตอร์ limit / cursor / fields ไม่ถูกต้อง (ตอบ 400)"""
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise BadPageRequest("cursor ไม่ถูกต้อง")
+    if not isinstance(values, list):
+        raise BadPageRequest("cursor ไม่ถูกต้อง")
+    return values
+
+
+def page_args(args, key_count, max_limit=MAX_LIMIT, default_limit=DEFAULT_LIMIT):
+    """อ่าน ?limit= และ ?cursor= → (limit (ไม่ส่ง = default_limit), ค่า key จาก cursor หรือ None)"""
+    raw_limit = (args.get("limit") or "").strip()
+    raw_cursor = (args.get("cursor") or "").strip()
+
+    limit = default_limit
+    if raw_limit:
+        try:
+            limit = int(raw_limit)
+        except ValueError:
+            raise BadPageRequest("limit ต้องเป็นตัวเลข")
+        if not 1 <= limit <= max_limit:
+            raise BadPageRequest(f"limit ต้องอยู่ระหว่าง 1–{max_limit}")
+
+    after = None
+    if raw_cursor:
+        after = decode_cursor(raw_cursor)
+        if len(after) != key_count:
+            raise BadPageRequest("cursor ไม่ถูกต้อง")
+
+    return limit, after
+
+
+def keyset_where(columns, values, op=">"):
+    """
+    เงื่อนไข "แถวที่อยู่ถัดจาก cursor" → (sql, params)
+
+    เขียนแบบกระจายเป็นช่วงของคอลัมน์แรก แทน row constructor (a, b) > (%s, %s)
+    ที่ MySQL มักใช้ index ไม่ได้ (กลายเป็น full scan ตั้งแต่หน้าที่สอง):
+        a >= %s AND (a > %s OR b > %s)
+    op = ">" (เรียงน้อยไปมาก) หรือ "<" (เรียงมากไปน้อย)
+    """
+    if len(columns) == 1:
+        return f"{columns[0]} {op} %s", [values[0]]
+    rest_sql, rest_params = keyset_where(columns[1:], values[1:], op)
+    if len(columns) > 2:
+        rest_sql = f"({rest_sql})"
+    first = columns[0]
+    return (f"{first} {op}= %s AND ({first} {op} %s OR {rest_sql})",
+            [values[0], values[0]] + rest_params)
+
+
+def pick_fields(args, available):
+    """อ่าน ?fields=a,b → รายชื่อคอลัมน์ (ไม่ส่ง = ทุกคอลัมน์ตามลำดับเดิม)"""
+    raw = (args.get("fields") or "").strip()
+    if not raw:
+        return list(available)
+    names = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in names if f not in available]
+    if unknown or not names:
+        raise BadPageRequest(f"fields ที่ใช้ได้: {', '.join(available)}")
+    return list(dict.fromkeys(names))
+
+
+def select_list(names, available, keys):
+    """สร้าง SELECT list จากคอลัมน์ที่เลือก + คอลัมน์ key สำหรับ cursor (_k0, _k1, ...)"""
+    cols = [f"{available[n]} AS {n}" for n in names]
+    cols += [f"{expr} AS _k{i}" for i, expr in enumerate(keys)]
+    return ",\n              ".join(cols)
+
+
+def finish_page(rows, limit, key_count):
+    """ตัดแถวเกิน (ที่ดึงมา limit+1 เพื่อดูว่ามีหน้าถัดไปไหม) + สร้าง next_cursor + ลบคอลัมน์ key"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last[f"_k{i}"] for i in range(key_count)])
+
+    for row in rows:
+        for i in range(key_count):
+            row.pop(f"_k{i}", None)
+    return rows, next_cursor
@@ -0,0 +1,217 @@
+"""
+ดัชนีค้นหาคนไข้ในหน่วยความจำ (trigram) สำหรับ /patients?q=
+
+ค้นได้จาก ชื่อ / นามสกุล / HN (เช่น HN001) / เบอร์โทร แบบ "มีคำนี้อยู่ในช่อง" เหมือน LIKE '%q%' เดิม
+รองรับภาษาไทย (ตัดเป็น trigram ตามตัวอักษร unicode หลัง normalize NFC)
+
+  - q ยาว >= 3 ตัว: เลือก posting list ของ trigram ที่สั้นที่สุด แล้วตรวจซ้ำด้วย substring
+  - q สั้นกว่านั้น: ไล่ตรวจทุกคน
+ทั้งสองแบบไล่จาก patient_id มากไปน้อย และหยุดทันทีที่ได้ครบ limit รายการ
+
+ทุก REFRESH_SECONDS ดึงเฉพาะคนไข้ที่เพิ่มใหม่ (patient_id > ตัวล่าสุดที่รู้จัก) หรือถูกแก้
+(updated_at >= ค่าล่าสุดที่เห็น — คอลัมน์จาก migration 6 อัปเดตเองทุกครั้งที่แก้แถว ไม่ว่าแก้จากที่ไหน)
+แล้วแทนที่ในดัชนี — แก้ชื่อ / เบอร์โทรแล้วค้นเจอด้วยค่าใหม่ภายในรอบถัดไป
+การลบคนไข้ไม่มี marker ให้เห็น ถ้าลบผ่านระบบให้เรียก remove()
+"""
+import os
+import threading
+import time as _time
+import unicodedata
+from bisect import bisect_left, insort
+
+from db import get_db
+
+# ดึงคนไข้ใหม่ / ที่ถูกแก้เข้าดัชนีทุก ๆ กี่วินาที (0 = ทุกครั้งที่ค้นหา)
+REFRESH_SECONDS = float(os.getenv("PATIENT_SEARCH_REFRESH", "30"))
+
+LOAD_SQL = """
+    SELECT patient_id, first_name, last_name, phone, updated_at
+    FROM patient
+    ORDER BY patient_id
+"""
+
+# UNION แทน OR ให้แต่ละฝั่งใช้ index ของตัวเอง (primary key / idx_patient_updated_at ดู migrations.py)
+# ไม่ ORDER BY — refresh ใส่ทีละแถวด้วย insort อยู่แล้ว
+# >= ไม่ใช่ > : แถวที่แก้ในวินาทีเดียวกับรอบก่อนต้องไม่หลุด (ดึงซ้ำได้ แทนที่ของเดิม)
+CHANGED_SQL = """
+    SELECT patient_id, first_name, last_name, phone, updated_at
+    FROM patient
+    WHERE patient_id > %s
+    UNION
+    SELECT patient_id, first_name, last_name, phone, updated_at
+    FROM patient
+    WHERE updated_at >= %s
+"""
+
+
+def normalize(text):
+    return unicodedata.normalize("NFC", str(text or "")).strip().lower()
+
+
+def hn_of(patient_id):
+    """รูปแบบเดียวกับ CONCAT('HN', LPAD(patient_id,3,'0'))"""
+    return f"hn{int(patient_id):03d}"
+
+
+def trigrams(text):
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class PatientSearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}        # patient_id -> (first, last, hn, phone) แบบ normalize แล้ว
+        self._grams = {}       # trigram -> [patient_id เรียงน้อยไปมาก]
+        self._ids = []         # patient_id ทั้งหมด เรียงน้อยไปมาก
+        self._max_id = 0
+        self._changed_at = None   # updated_at ล่าสุดที่ดึงมาแล้ว (ค่าจาก DB ไม่ใช่นาฬิกาของแอป)
+        self._loaded = False
+        self._refreshed_at = 0.0
+
+    # ---------- โหลด ----------
+    def _fetch(self, sql, params=()):
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            cur.execute(sql, params)
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    def _note_changed(self, rows):
+        stamps = [row[4] for row in rows if row[4] is not None]
+        if stamps and (self._changed_at is None or max(stamps) > self._changed_at):
+            self._changed_at = max(stamps)
+
+    def rebuild(self):
+        rows = self._fetch(LOAD_SQL)
+        with self._lock:
+            self._docs = {}
+            self._grams = {}
+            self._ids = []
+            self._max_id = 0
+            self._changed_at = None
+            # rows เรียงตาม patient_id อยู่แล้ว → append ได้เลยโดยไม่ต้อง insort
+            for pid, first, last, phone, _ in rows:
+                self._add(pid, first, last, phone, ordered=True)
+            self._note_changed(rows)
+            self._loaded = True
+            self._refreshed_at = _time.monotonic()
+
+    def refresh(self):
+        """ดึงเฉพาะคนไข้ที่เพิ่มใหม่หรือถูกแก้ตั้งแต่ครั้งก่อน แล้วแทนที่ของเดิมในดัชนี"""
+        if self._changed_at is None:
+            # ยังไม่มีแถวที่มี updated_at → โหลดใหม่ทั้งหมดแทน
+            self.rebuild()
+            return
+        rows = self._fetch(CHANGED_SQL, (self._max_id, self._changed_at))
+        with self._lock:
+            for pid, first, last, phone, _ in rows:
+                self._drop(pid)
+                self._add(pid, first, last, phone)
+            self._note_changed(rows)
+            self._refreshed_at = _time.monotonic()
+
+    def _ensure_fresh(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.rebuild()
+            return
+        if _time.monotonic() - self._refreshed_at >= REFRESH_SECONDS:
+            # กันหลาย thread ยิง refresh พร้อมกันตอนครบรอบ
+            self._refreshed_at = _time.monotonic()
+            self.refresh()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    # ---------- แก้ดัชนี (ต้องถือ lock) ----------
+    def _add(self, pid, first, last, phone, ordered=False):
+        doc = (normalize(first), normalize(last), hn_of(pid), normalize(phone))
+        self._docs[pid] = doc
+        grams = set()
+        for field in doc:
+            grams |= trigrams(field)
+        for g in grams:
+            posting = self._grams.setdefault(g, [])
+            if ordered:
+                posting.append(pid)
+            else:
+                insort(posting, pid)
+        if ordered:
+            self._ids.append(pid)
+        else:
+            insort(self._ids, pid)
+        self._max_id = max(self._max_id, pid)
+
+    def _drop(self, pid):
+        doc = self._docs.pop(pid, None)
+        if doc is None:
+            return
+        grams = set()
+        for field in doc:
+            grams |= trigrams(field)
+        for g in grams:
+            posting = self._grams[g]
+            del posting[bisect_left(posting, pid)]
+            if not posting:
+                del self._grams[g]
+        del self._ids[bisect_left(self._ids, pid)]
+
+    def upsert(self, patient_id, first_name, last_name, phone):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._drop(patient_id)
+            self._add(patient_id, first_name, last_name, phone)
+
+    def remove(self, patient_id):
+        with self._lock:
+            if self._loaded:
+                self._drop(patient_id)
+
+    # ---------- ค้นหา ----------
+    def search(self, q, limit=100, before=None):
+        """คืน patient_id ที่ตรงกับ q เรียงจากมากไปน้อย ไม่เกิน limit รายการ (before = เฉพาะ id ที่น้อยกว่านี้)"""
+        q = normalize(q)
+        if not q:
+            return []
+        self._ensure_fresh()
+
+        with self._lock:
+            if len(q) >= 3:
+                postings = [self._grams.get(g) for g in trigrams(q)]
+                if not all(postings):
+                    return []
+                candidates = min(postings, key=len)
+            else:
+                candidates = self._ids
+
+            end = len(candidates) if before is None else bisect_left(candidates, before)
+
+            out = []
+            docs = self._docs
+            for i in range(end - 1, -1, -1):
+                pid = candidates[i]
+                if any(q in field for field in docs[pid]):
+                    out.append(pid)
+                    if len(out) >= limit:
+                        break
+            return out
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": self._loaded,
+                "patients": len(self._docs),
+                "trigrams": len(self._grams),
+                "max_patient_id": self._max_id,
+            }
+
+
+patient_index = PatientSearchIndex()
@@ -0,0 +1,192 @@
+"""
+ปิดยอดชำระเงินหลายรายการในคราวเดียว (กระทบยอดโอนจาก bank statement ตอนปิดวัน)
+
+  POST /payments/settle             JSON: {"payments": [{"payment_id", "amount", "payment_method"}, ...]}
+  POST /payments/settle/statement   CSV จาก bank statement (อ่านแบบ stream ทีละบรรทัด)
+                                    คอลัมน์: payment_id (หรือ reference / ref — ใช้ตัวเลขชุดแรก),
+                                    amount (หรือ credit), payment_method (ไม่ใส่ = transfer)
+
+ทุกก้อน BATCH_SIZE รายการใช้ SELECT ... IN (...) FOR UPDATE หนึ่งครั้ง + UPDATE (CASE) หนึ่งครั้ง
+ทั้งหมดอยู่ใน transaction เดียว แล้วปรับตารางสรุปคนไข้ครั้งเดียวต่อคน
+ตอบเป็นผลรายรายการ: paid / rejected (ไม่พบ, ชำระไปแล้ว, ข้อมูลผิด, payment_id ซ้ำในชุดเดียวกัน)
+"""
+import csv
+import io
+import re
+from decimal import Decimal, InvalidOperation
+
+import cache
+import change_feed
+import visit_summary
+from flows import BEGIN, COMMIT, fetch, run, many
+
+BATCH_SIZE = 1000
+METHODS = ('cash', 'credit', 'transfer')
+
+# หัวคอลัมน์ของ bank statement ที่รับได้ → ชื่อที่ใช้ภายใน
+STATEMENT_COLUMNS = {
+    'payment_id': 'payment_id', 'reference': 'payment_id', 'ref': 'payment_id', 'เลขอ้างอิง': 'payment_id',
+    'amount': 'amount', 'credit': 'amount', 'จำนวนเงิน': 'amount',
+    'payment_method': 'payment_method', 'method': 'payment_method',
+}
+
+_DIGITS_RE = re.compile(r"\d+")
+
+
+class BadStatement(ValueError):
+    """ไฟล์ทั้งไฟล์อ่านไม่ได้ (ตอบ 400)"""
+
+
+def read_statement(stream):
+    """
+    อ่าน CSV จาก stream (เช่น request.stream) ทีละบรรทัด → [(เลขแถว, dict), ...]
+    ไม่อ่านทั้งไฟล์เข้าหน่วยความจำ เก็บเฉพาะสามช่องที่ใช้
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    try:
+        header = next(reader, None)
+    except UnicodeDecodeError:
+        raise BadStatement("ไฟล์ต้องเป็น UTF-8")
+    if not header:
+        raise BadStatement("ไม่มีข้อมูลให้ปิดยอด")
+
+    columns = [STATEMENT_COLUMNS.get(h.strip().lower()) for h in header]
+    if 'payment_id' not in columns or 'amount' not in columns:
+        raise BadStatement("CSV ต้องมีคอลัมน์ payment_id (หรือ reference) และ amount")
+
+    records = []
+    try:
+        for row_no, values in enumerate(reader, start=1):
+            if not any(v.strip() for v in values):
+                continue
+            records.append((row_no, {c: v for c, v in zip(columns, values) if c}))
+    except UnicodeDecodeError:
+        raise BadStatement("ไฟล์ต้องเป็น UTF-8")
+    return records
+
+
+def parse_entry(rec, default_method='cash'):
+    """dict หนึ่งรายการ → (payment_id, amount, method) หรือ raise ValueError(ข้อความ)"""
+    if not isinstance(rec, dict):
+        raise ValueError("แต่ละรายการต้องเป็น object")
+
+    raw_id = str(rec.get('payment_id') if rec.get('payment_id') is not None else "")
+    found = _DIGITS_RE.search(raw_id)
+    if not found:
+        raise ValueError("ต้องระบุ payment_id")
+    payment_id = int(found.group(0))
+
+    raw_amount = str(rec.get('amount') if rec.get('amount') is not None else "")
+    try:
+        amount = Decimal(raw_amount.replace(",", "").replace("฿", "").strip())
+    except InvalidOperation:
+        raise ValueError("amount ต้องเป็นตัวเลข")
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError("amount ต้องมากกว่า 0")
+
+    method = (str(rec.get('payment_method') or "").strip() or default_method).lower()
+    if method not in METHODS:
+        raise ValueError("payment_method ต้องเป็น cash / credit / transfer")
+    return payment_id, amount, method
+
+
+def _chunks(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def settle_payments(records, default_method='cash'):
+    """flow: records = [(เลขรายการ, dict), ...] → (body, status)"""
+    if not records:
+        return {'status': 'error', 'message': 'ไม่มีข้อมูลให้ปิดยอด'}, 400
+
+    report = {}
+    valid = []            # [(ref, payment_id, amount, method)]
+    seen = {}             # payment_id → ref แรกที่เจอ
+
+    def reject(ref, message, payment_id=None):
+        report[ref] = {'ref': ref, 'payment_id': payment_id, 'status': 'rejected', 'error': message}
+
+    for ref, rec in records:
+        try:
+            payment_id, amount, method = parse_entry(rec, default_method)
+        except ValueError as e:
+            reject(ref, str(e))
+            continue
+        if payment_id in seen:
+            reject(ref, f'payment_id ซ้ำกับรายการที่ {seen[payment_id]}', payment_id)
+            continue
+        seen[payment_id] = ref
+        valid.append((ref, payment_id, amount, method))
+
+    unpaid = {}           # patient_id → [ยอดค้างเดิมรวม, จำนวนรายการ]
+    paid = {}             # ref → payment_id
+    events = []           # (payment_id, patient_id, amount, appointment_id) ส่งให้ change feed หลัง commit
+    try:
+        if valid:
+            yield BEGIN
+            for chunk in _chunks(valid):
+                ids = [payment_id for _, payment_id, _, _ in chunk]
+                rows = yield fetch(f"""
+                    SELECT payment_id, patient_id, appointment_id, amount, status
+                    FROM payment
+                    WHERE payment_id IN ({', '.join(['%s'] * len(ids))})
+                    FOR UPDATE
+                """, ids)
+                current = {int(r["payment_id"]): r for r in rows}
+
+                apply = []
+                for ref, payment_id, amount, method in chunk:
+                    row = current.get(payment_id)
+                    if row is None:
+                        reject(ref, 'ไม่พบรายการชำระเงินนี้', payment_id)
+                    elif row["status"] != 'unpaid':
+                        reject(ref, f'รายการนี้มีสถานะ {row["status"]} แล้ว', payment_id)
+                    else:
+                        apply.append((payment_id, amount, method))
+                        events.append((payment_id, row["patient_id"], amount, row["appointment_id"]))
+                        totals = unpaid.setdefault(row["patient_id"], [Decimal(0), 0])
+                        totals[0] += Decimal(str(row["amount"]))
+                        totals[1] += 1
+                        paid[ref] = payment_id
+
+                if apply:
+                    cases = " ".join(["WHEN %s THEN %s"] * len(apply))
+                    yield run(f"""
+                        UPDATE payment
+                        SET amount = CASE payment_id {cases} END,
+                            payment_method = CASE payment_id {cases} END,
+                            payment_date = CURDATE(),
+                            status = 'paid'
+                        WHERE payment_id IN ({', '.join(['%s'] * len(apply))})
+                    """, [v for pid, amount, _ in apply for v in (pid, amount)]
+                       + [v for pid, _, method in apply for v in (pid, method)]
+                       + [pid for pid, _, _ in apply])
+
+            if unpaid:
+                yield many(visit_summary.PAID_SQL,
+                           [(total, count, patient_id) for patient_id, (total, count) in unpaid.items()])
+            yield COMMIT
+    except Exception as e:
+        print("settle_payments error:", e)
+        return {'status': 'error', 'message': 'ไม่สามารถบันทึกการชำระเงินได้ ไม่มีรายการใดถูกบันทึก'}, 500
+
+    for patient_id in unpaid:
+        cache.invalidate_patient(patient_id)
+    for payment_id, patient_id, amount, appointment_id in events:
+        change_feed.publish_payment('paid', payment_id, patient_id, 'paid', amount, appointment_id, 'unpaid')
+
+    for ref, payment_id in paid.items():
+        report[ref] = {'ref': ref, 'payment_id': payment_id, 'status': 'paid'}
+
+    return {
+        'status': 'success',
+        'message': f'บันทึกการชำระเงิน {len(paid)} จาก {len(records)} รายการ',
+        'data': {
+            'total': len(records),
+            'paid': len(paid),
+            'rejected': len(records) - len(paid),
+            'items': [report[ref] for ref, _ in records],
+        }
+    }, 200
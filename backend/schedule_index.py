@@ -0,0 +1,381 @@
+"""
+ดัชนีตารางนัดในหน่วยความจำ แยกตาม (doctor_id, วันที่)
+
+เก็บเวลานัดที่ยัง active (scheduled / rescheduled) เรียงตามนาทีของวัน
+ใช้ตรวจชนคิว (ต้องห่างกันอย่างน้อย gap นาที = ความยาวช่องของหมอ) ด้วย bisect
+โดยไม่ต้อง query ตาราง appointment ทุกครั้งที่จอง
+
+ทุก route ที่เปลี่ยนสถานะ/เวลานัดต้องอัปเดต index นี้ด้วย
+(create / update / cancel / no-show / completed) และ index จะ rebuild จาก DB ตอนเริ่มระบบ
+
+rebuild โหลดเฉพาะนัดตั้งแต่ LOAD_DAYS_BACK วันก่อนวันนี้ ส่วนวันที่เก่ากว่านั้น (เช่นนำเข้าปฏิทินเก่า)
+โหลดทีละ (หมอ, วัน) จาก DB ครั้งแรกที่ถูกตรวจ (DAY_SQL) — ทุกวันจึงตรวจชนได้เหมือนกัน
+SELECT ทำนอก lock — route ยังจอง / ตรวจชนได้ระหว่างโหลด การเขียนที่เกิดระหว่างนั้นถูกจดไว้
+แล้วเล่นซ้ำบนข้อมูลชุดใหม่ตอนสลับ (ดู rebuild)
+"""
+import os
+import threading
+import time as _time
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from functools import partial
+
+from db import get_db
+
+ACTIVE_STATUSES = ('scheduled', 'rescheduled')
+MIN_GAP = 15                 # นาที (ค่าเริ่มต้น ถ้าไม่ได้ส่ง gap ตามตารางเวลาหมอมา)
+
+# นัด active ตั้งแต่วันที่ %s (ใช้ index (status, doctor_id, appointment_date, appointment_time) ดู migrations.py)
+LOAD_SQL = """
+    SELECT appointment_id, doctor_id, appointment_date, appointment_time
+    FROM appointment
+    WHERE status IN ('scheduled','rescheduled')
+      AND appointment_date >= %s
+"""
+LOAD_DAYS_BACK = 1
+
+# นัด active ของหมอหนึ่งคนในวันเดียว — วันก่อน load_since() (ใช้ index idx_appointment_doctor_day)
+DAY_SQL = """
+    SELECT appointment_id, doctor_id, appointment_date, appointment_time
+    FROM appointment
+    WHERE status IN ('scheduled','rescheduled')
+      AND doctor_id = %s AND appointment_date = %s
+"""
+
+
+def load_since():
+    """วันแรกที่ rebuild โหลด (พารามิเตอร์ของ LOAD_SQL)"""
+    return date.today() - timedelta(days=LOAD_DAYS_BACK)
+
+# ถ้า > 0 จะ rebuild ใหม่เมื่อข้อมูลเก่ากว่ากี่วินาที (กรณีมีหลาย process เขียน DB พร้อมกัน)
+REFRESH_SECONDS = float(os.getenv("SCHEDULE_INDEX_TTL", "0"))
+
+
+def to_date(value):
+    """date / datetime / 'YYYY-MM-DD' → date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip()[:10])
+
+
+def to_minutes(value):
+    """เวลา (นาที / timedelta จาก MySQL TIME / time / 'HH:MM' / 'HH:MM:SS') → นาทีของวัน"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, timedelta):
+        return int(value.total_seconds()) // 60
+    if isinstance(value, (time, datetime)):
+        return value.hour * 60 + value.minute
+    parts = str(value).strip().split(":")
+    if len(parts) not in (2, 3):
+        raise ValueError(f"รูปแบบเวลาไม่ถูกต้อง: {value!r}")
+    hh, mm = int(parts[0]), int(parts[1])
+    if not (0 <= hh < 24 and 0 <= mm < 60):
+        raise ValueError(f"รูปแบบเวลาไม่ถูกต้อง: {value!r}")
+    return hh * 60 + mm
+
+
+def split_datetime(value):
+    """'YYYY-MM-DD HH:MM[:SS]' (หรือมี T คั่น) → (date, นาทีของวัน)"""
+    if isinstance(value, datetime):
+        return value.date(), value.hour * 60 + value.minute
+    text = str(value).strip().replace("T", " ")
+    day_part, _, time_part = text.partition(" ")
+    if not time_part:
+        raise ValueError(f"ต้องระบุทั้งวันและเวลา: {value!r}")
+    return to_date(day_part), to_minutes(time_part)
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class _Pending:
+    """ที่นั่งที่จองไว้ชั่วคราวระหว่างรอ INSERT/UPDATE ลง DB"""
+    __slots__ = ()
+
+
+class ScheduleIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()     # rebuild ทีละครั้ง
+        self._journals = []  # บันทึกการเขียนของ rebuild ที่กำลัง SELECT อยู่ (เล่นซ้ำตอนสลับข้อมูล)
+        self._days = {}      # (doctor_id, date) -> ([นาที เรียงน้อยไปมาก], [key ตามลำดับเดียวกัน])
+        self._where = {}     # key (appointment_id / _Pending) -> (doctor_id, date, นาที)
+        self._since = None   # วันแรกที่ rebuild ล่าสุดโหลดมา
+        self._old_days = set()   # (doctor_id, date) ก่อน _since ที่โหลดแล้ว (ดู _ensure_day)
+        self._loaded_at = None
+
+    # ---------- โหลดจาก DB ----------
+    def rebuild(self):
+        since = load_since()
+        self._load(LOAD_SQL, (since,), partial(self._swap, since))
+
+    def _load(self, sql, params, install):
+        """
+        SELECT นอก lock แล้ว install(rows) ใน lock
+        การเขียนระหว่าง SELECT (ผลอาจมีหรือไม่มีในแถวที่ได้) ถูกจดใน journal แล้วเล่นซ้ำหลัง install
+        — ลบแล้วใส่ใหม่ทุกครั้ง เล่นซ้ำกี่รอบก็ได้ผลเดียวกัน
+        """
+        journal = []
+        with self._lock:
+            self._journals.append(journal)
+        try:
+            rows = self._fetch(sql, params)
+        except BaseException:
+            with self._lock:
+                self._journals.remove(journal)
+            raise
+        with self._lock:
+            self._journals.remove(journal)
+            install(rows)
+            for key, loc in journal:
+                self._delete(key)
+                if loc is not None:
+                    self._insert(key, *loc)
+
+    def _fetch(self, sql, params):
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(sql, params)
+            return cur.fetchall()
+        finally:
+            cur.close()
+            conn.close()
+
+    def _swap(self, since, rows):
+        days = {}
+        where = {}
+        for r in rows:
+            if r["appointment_date"] is None or r["appointment_time"] is None:
+                continue
+            key = (int(r["doctor_id"]), to_date(r["appointment_date"]))
+            minute = to_minutes(r["appointment_time"])
+            days.setdefault(key, []).append((minute, r["appointment_id"]))
+            where[r["appointment_id"]] = (key[0], key[1], minute)
+
+        compiled = {}
+        for key, items in days.items():
+            items.sort()
+            compiled[key] = ([m for m, _ in items], [k for _, k in items])
+
+        # เก็บที่จองชั่วคราวที่ยังค้างอยู่ไว้ ไม่ให้หายตอน rebuild
+        pending = [(k, v) for k, v in self._where.items() if isinstance(k, _Pending)]
+        self._days = compiled
+        self._where = where
+        for k, (doctor_id, day, minute) in pending:
+            self._insert(k, doctor_id, day, minute)
+        self._since = since
+        self._old_days = set()
+        self._loaded_at = _time.monotonic()
+
+    def _ensure_day(self, doctor_id, day):
+        """วันก่อน load_since() ไม่อยู่ในข้อมูลของ rebuild → โหลดนัดของ (หมอ, วัน) นั้นจาก DB ครั้งแรกที่ใช้"""
+        if self._since is None or day >= self._since or (doctor_id, day) in self._old_days:
+            return
+        self._load(DAY_SQL, (doctor_id, day), partial(self._install_day, doctor_id, day))
+
+    def _install_day(self, doctor_id, day, rows):
+        for r in rows:
+            if r["appointment_time"] is None:
+                continue
+            self._delete(r["appointment_id"])
+            self._insert(r["appointment_id"], doctor_id, day, to_minutes(r["appointment_time"]))
+        self._old_days.add((doctor_id, day))
+
+    def ensure_loaded(self):
+        loaded_at = self._loaded_at
+        if loaded_at is not None and (REFRESH_SECONDS <= 0 or _time.monotonic() - loaded_at < REFRESH_SECONDS):
+            return
+        # โหลดครั้งแรกต้องรอ ส่วนรอบ refresh ถ้ามี thread อื่นโหลดอยู่ใช้ข้อมูลเดิมไปก่อน
+        if not self._load_lock.acquire(blocking=loaded_at is None):
+            return
+        try:
+            if self._loaded_at == loaded_at:
+                self.rebuild()
+        finally:
+            self._load_lock.release()
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    # ---------- ภายใน (ต้องถือ lock) ----------
+    def _insert(self, key, doctor_id, day, minute):
+        minutes, keys = self._days.setdefault((doctor_id, day), ([], []))
+        i = bisect_right(minutes, minute)
+        minutes.insert(i, minute)
+        keys.insert(i, key)
+        self._where[key] = (doctor_id, day, minute)
+        self._journal(key, (doctor_id, day, minute))
+
+    def _journal(self, key, loc):
+        # ที่จองชั่วคราว (_Pending) ไม่ต้องจด — rebuild คัดลอกจากข้อมูลปัจจุบันตอนสลับอยู่แล้ว
+        if self._journals and not isinstance(key, _Pending):
+            for journal in self._journals:
+                journal.append((key, loc))
+
+    def _delete(self, key):
+        self._journal(key, None)
+        loc = self._where.pop(key, None)
+        if loc is None:
+            return
+        doctor_id, day, minute = loc
+        minutes, keys = self._days[(doctor_id, day)]
+        i = bisect_left(minutes, minute)
+        while keys[i] != key:
+            i += 1
+        del minutes[i]
+        del keys[i]
+        if not minutes:
+            del self._days[(doctor_id, day)]
+
+    def _find(self, doctor_id, day, minute, exclude_id, gap):
+        entry = self._days.get((doctor_id, day))
+        if not entry:
+            return None
+        minutes, keys = entry
+        i = bisect_right(minutes, minute - gap)
+        while i < len(minutes) and minutes[i] < minute + gap:
+            if exclude_id is None or keys[i] != exclude_id:
+                return keys[i]
+            i += 1
+        return None
+
+    # ---------- ใช้จาก route ----------
+    def find_conflict(self, doctor_id, day, appt_time, exclude_id=None, gap=MIN_GAP):
+        """คืน key ของนัดที่ชน (ห่างกันน้อยกว่า gap นาที) หรือ None ถ้าไม่ชน"""
+        self.ensure_loaded()
+        doctor_id, day, minute = int(doctor_id), to_date(day), to_minutes(appt_time)
+        self._ensure_day(doctor_id, day)
+        with self._lock:
+            return self._find(doctor_id, day, minute, exclude_id, gap)
+
+    def reserve(self, doctor_id, day, appt_time, exclude_id=None, gap=MIN_GAP):
+        """
+        ตรวจชน + จองที่ไว้ในคราวเดียว (กันสองคำขอจองเวลาเดียวกันพร้อมกัน)
+        คืน (token, None) ถ้าจองได้ หรือ (None, key ที่ชน)
+        หลังบันทึก DB แล้วต้องเรียก confirm() หรือ cancel() เสมอ
+        """
+        self.ensure_loaded()
+        doctor_id, day, minute = int(doctor_id), to_date(day), to_minutes(appt_time)
+        self._ensure_day(doctor_id, day)
+        with self._lock:
+            clash = self._find(doctor_id, day, minute, exclude_id, gap)
+            if clash is not None:
+                return None, clash
+            token = _Pending()
+            self._insert(token, doctor_id, day, minute)
+            return token, None
+
+    def confirm(self, token, appointment_id, active=True):
+        """เปลี่ยนที่จองชั่วคราวเป็นนัดจริง (แทนที่ตำแหน่งเดิมของ appointment_id ถ้ามี)"""
+        with self._lock:
+            loc = self._where.get(token)
+            self._delete(token)
+            self._delete(appointment_id)
+            if active and loc is not None:
+                self._insert(appointment_id, *loc)
+
+    def cancel(self, token):
+        with self._lock:
+            self._delete(token)
+
+    def reserve_many(self, items, gaps, dry_run=False):
+        """
+        จองหลายนัดในคราวเดียว (นำเข้าแบบ bulk)
+          items = [(ref, doctor_id, date, นาที), ...]   ref คือเลขแถวของผู้เรียก
+          gaps  = {(doctor_id, date): ระยะห่างขั้นต่ำ}
+        แต่ละ (หมอ, วัน) เรียงตามเวลาแล้วกวาดรอบเดียวคู่กับนัดที่มีอยู่ (two-pointer)
+        ใน batch เดียวกัน แถวที่เวลาเร็วกว่าได้ก่อน (เวลาเท่ากัน → ref ที่มาก่อน)
+        คืน {ref: ("ok", token) | ("existing", key ที่ชน) | ("batch", ref ที่ชน)}
+        dry_run=True → ตรวจอย่างเดียว ไม่จอง (token = None)
+        """
+        self.ensure_loaded()
+        groups = {}
+        for ref, doctor_id, day, minute in items:
+            groups.setdefault((int(doctor_id), to_date(day)), []).append((minute, ref))
+        for key in groups:
+            self._ensure_day(*key)
+
+        results = {}
+        with self._lock:
+            for key, rows in groups.items():
+                gap = gaps.get(key, MIN_GAP)
+                rows.sort(key=lambda r: r[0])
+                minutes, keys = self._days.get(key, ((), ()))
+                j = 0
+                last = None            # (นาที, ref) ของแถวล่าสุดที่รับ
+                accepted = []
+                for minute, ref in rows:
+                    while j < len(minutes) and minutes[j] <= minute - gap:
+                        j += 1
+                    if j < len(minutes) and minutes[j] < minute + gap:
+                        results[ref] = ("existing", keys[j])
+                    elif last is not None and minute - last[0] < gap:
+                        results[ref] = ("batch", last[1])
+                    else:
+                        last = (minute, ref)
+                        accepted.append((minute, ref))
+
+                for minute, ref in accepted:
+                    token = None
+                    if not dry_run:
+                        token = _Pending()
+                        self._insert(token, key[0], key[1], minute)
+                    results[ref] = ("ok", token)
+        return results
+
+    def confirm_many(self, pairs):
+        """confirm() หลายรายการ: pairs = [(token, appointment_id), ...]"""
+        with self._lock:
+            for token, appointment_id in pairs:
+                self.confirm(token, appointment_id)
+
+    def cancel_many(self, tokens):
+        with self._lock:
+            for token in tokens:
+                self._delete(token)
+
+    def apply(self, appointment_id, doctor_id, day, appt_time, status):
+        """ซิงก์นัดหนึ่งรายการตามสถานะล่าสุด (active → ใส่/ย้าย, อื่น ๆ → เอาออก)"""
+        with self._lock:
+            self._delete(appointment_id)
+            if status in ACTIVE_STATUSES:
+                self._insert(appointment_id, int(doctor_id), to_date(day), to_minutes(appt_time))
+
+    def remove(self, appointment_id):
+        """เอานัดออกจาก index (cancelled / no_show / completed)"""
+        with self._lock:
+            self._delete(appointment_id)
+
+    def busy_minutes(self, doctor_id, day):
+        self.ensure_loaded()
+        doctor_id, day = int(doctor_id), to_date(day)
+        self._ensure_day(doctor_id, day)
+        with self._lock:
+            entry = self._days.get((doctor_id, day))
+            return list(entry[0]) if entry else []
+
+    def busy_range(self, doctor_ids, start, end):
+        """snapshot นาทีที่มีนัดของหลายหมอ ช่วงวันที่ start–end → {(doctor_id, date): [นาที]}"""
+        self.ensure_loaded()
+        wanted = {int(d) for d in doctor_ids}
+        start, end = to_date(start), to_date(end)
+        day = start
+        while self._since is not None and day <= end and day < self._since:
+            for doctor_id in wanted:
+                self._ensure_day(doctor_id, day)
+            day += timedelta(days=1)
+        with self._lock:
+            return {
+                key: list(minutes)
+                for key, (minutes, _) in self._days.items()
+                if key[0] in wanted and start <= key[1] <= end
+            }
+
+
+schedule = ScheduleIndex()
@@ -0,0 +1,469 @@
+"""
+ตัวรันสำหรับใช้งานจริง: prefork หลาย process × thread pool ต่อ process (ใช้แค่ Flask/Werkzeug ที่มีอยู่แล้ว)
+
+    python serve.py --bind 0.0.0.0:5000 --workers 4 --threads 10
+
+ตั้งค่าผ่าน argument หรือ environment variable:
+  SERVE_BIND              host:port (ค่าเริ่มต้น 127.0.0.1:5000)
+  SERVE_WORKERS           จำนวน process (ค่าเริ่มต้น = จำนวน core)
+  SERVE_THREADS           thread ต่อ process (ค่าเริ่มต้น = DB_POOL_SIZE)
+  SERVE_GRACEFUL_TIMEOUT  วินาทีที่รอคำขอค้างให้เสร็จตอน reload / หยุด (ค่าเริ่มต้น 30)
+  SERVE_PRELOAD           1 = import แอปใน master ก่อน fork (เริ่ม worker เร็วและใช้หน่วยความจำร่วมกัน
+                          แต่ reload จะไม่โหลดโค้ดใหม่)
+
+สัญญาณ (ส่งไปที่ master, pid แสดงตอนเริ่ม):
+  TERM / INT   หยุดรับ connection ใหม่ รอคำขอค้างเสร็จ (ไม่เกิน graceful timeout) แล้วปิด — INT ซ้ำ = ปิดทันที
+  HUP          reload: เริ่ม worker ชุดใหม่ (โหลดโค้ดใหม่) พอพร้อมครบแล้วค่อยปิดชุดเก่าแบบ graceful
+  worker ตายเอง → master เริ่มใหม่ให้ (ถ้าเริ่มไม่ขึ้นติดกันหลายครั้ง master จะหยุด)
+
+โมเดลการทำงาน
+  - master bind socket ครั้งเดียว worker ทุกตัว accept จาก socket เดียวกัน (kernel กระจาย connection ให้)
+    worker ที่ thread เต็มจะหยุด accept ชั่วคราว → connection ที่รอไปตกที่ worker ที่ว่าง
+  - master ไม่แตะฐานข้อมูล และ pool ใน db.py ล้าง connection ที่ติดมาหลัง fork เสมอ
+    → ทุก worker เปิด connection ของตัวเอง รวมสูงสุด workers × DB_POOL_SIZE (ต้องไม่เกิน max_connections)
+  - thread ต่อ process ≈ DB_POOL_SIZE (มากกว่านี้ก็ได้แค่รอ connection) ยกเว้น /events ที่ถือหนึ่ง thread
+    ตลอดที่จอเปิดค้าง: เผื่อ thread ตามจำนวนจอ หรือให้ /events ไปที่โหมด ASGI (asgi.py)
+  - ตอบแบบ HTTP/1.0 (ปิด connection ทุกคำขอ) ไม่ให้ keep-alive ที่ว่างอยู่กิน thread —
+    ให้ reverse proxy (เช่น nginx) ด้านหน้าถือ keep-alive กับ browser
+  - state ในหน่วยความจำแยกต่อ process (schedule index / cache / ETag / change feed / metrics)
+    master ส่งต่อ event ของ change_feed และการแก้ตารางเวลาหมอระหว่าง worker → ทุก worker ปรับ schedule
+    index, ล้าง cache คนไข้, เพิ่มเวอร์ชัน ETag และส่ง SSE ให้จอที่ต่ออยู่ครบ (ช้ากว่า worker ที่เขียนไม่กี่ ms)
+    ยังมีช่วงสั้น ๆ ที่สอง worker จองคิวเดียวกันพร้อมกันได้ก่อน event ถึงกัน —
+    ตั้ง SCHEDULE_INDEX_TTL ให้ rebuild จาก DB เป็นระยะเพื่อเก็บกวาด
+  - /metrics /sql/stats /db/stats /cache/stats เป็นค่าของ worker ที่ตอบคำขอนั้น
+    (header X-Worker-Pid บอกว่าเป็น worker ไหน)
+"""
+import argparse
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+BIND = os.getenv("SERVE_BIND", "127.0.0.1:5000")
+WORKERS = int(os.getenv("SERVE_WORKERS", "0")) or (os.cpu_count() or 1)
+THREADS = int(os.getenv("SERVE_THREADS", os.getenv("DB_POOL_SIZE", "10")))
+GRACEFUL_TIMEOUT = float(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30"))
+PRELOAD = os.getenv("SERVE_PRELOAD", "0") == "1"
+
+BACKLOG = 2048
+KILL_GRACE = 5               # วินาทีหลัง graceful timeout ก่อน master ส่ง KILL
+FAST_EXIT = 2.0              # worker ที่ตายภายในกี่วินาทีหลังเริ่ม ถือว่าเริ่มไม่ขึ้น
+MAX_FAST_EXITS = 5           # เริ่มไม่ขึ้นติดกันกี่ครั้งแล้ว master หยุด
+RELAY_SEND_TIMEOUT = 5       # วินาที ถ้า worker ไม่อ่าน event นานกว่านี้ข้ามไป
+
+
+# ---------- ฝั่ง worker ----------
+class _Handler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.0"
+    timeout = 30             # client ที่ส่งคำขอช้าเกินไม่ให้ถือ thread ไว้
+
+
+class _Server(BaseWSGIServer):
+    """BaseWSGIServer ที่รับ socket จาก master + thread pool ขนาดคงที่ (เต็มแล้วหยุด accept)"""
+    multithread = True
+
+    def __init__(self, listener, app, threads):
+        host, port = listener.getsockname()[:2]
+        super().__init__(host, port, app, handler=_Handler, fd=listener.fileno())
+        self.threads = threads
+        self._slots = threading.BoundedSemaphore(threads)
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="clinic-http")
+        self._stopping = False
+
+    def get_request(self):
+        # รอ thread ว่างก่อน accept — ระหว่างนี้ worker อื่นรับ connection ไปได้
+        while not self._slots.acquire(timeout=0.5):
+            if self._stopping:
+                raise OSError("server stopping")
+        try:
+            return super().get_request()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def process_request(self, request, client_address):
+        try:
+            self._executor.submit(self._handle, request, client_address)
+        except RuntimeError:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def stop(self):
+        """เรียกจาก signal handler: ให้ serve_forever จบ (ต้องเรียก shutdown จาก thread อื่น)"""
+        self._stopping = True
+        threading.Thread(target=self.shutdown, name="clinic-stop", daemon=True).start()
+
+    def drain(self, timeout):
+        """รอคำขอที่รับไว้แล้วให้เสร็จ (ไม่เกิน timeout วินาที) → True ถ้าเสร็จครบ"""
+        import change_feed
+
+        change_feed.feed.close()
+        self._executor.shutdown(wait=False)
+        deadline = time.monotonic() + timeout
+        free = 0
+        while free < self.threads:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._slots.acquire(timeout=min(remaining, 0.5)):
+                if remaining <= 0:
+                    return False
+                continue
+            free += 1
+        return True
+
+
+class _Relay:
+    """
+    ช่องทางระหว่าง worker กับ master (socketpair, JSON บรรทัดละข้อความ)
+      ส่งออก: event ของ change_feed / การล้างตารางเวลาหมอ ที่เกิดใน process นี้
+      รับเข้า: ของ worker อื่น → ปรับ state ในหน่วยความจำเหมือนเขียนเอง (ไม่ส่งต่อกลับ)
+    """
+
+    def __init__(self, sock):
+        self._sock = sock
+        self._send_lock = threading.Lock()
+        self._remote = threading.local()
+
+    def send(self, message):
+        line = json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+        with self._send_lock:
+            try:
+                self._sock.sendall(line.encode("utf-8"))
+            except OSError as e:
+                print("relay send error:", e)
+
+    def start(self):
+        import change_feed
+        from working_hours import hours
+
+        change_feed.feed.add_listener(self._on_event)
+        hours.add_listener(self._on_hours)
+        threading.Thread(target=self._read, name="clinic-relay", daemon=True).start()
+
+    def _is_remote(self):
+        return getattr(self._remote, "active", False)
+
+    def _on_event(self, event):
+        if not self._is_remote():
+            self.send({'event': {k: v for k, v in event.items() if k != 'seq'}})
+
+    def _on_hours(self):
+        if not self._is_remote():
+            self.send({'hours': True})
+
+    def _read(self):
+        for line in self._sock.makefile("rb"):
+            self._remote.active = True
+            try:
+                _apply_remote(json.loads(line))
+            except Exception as e:
+                print("relay apply error:", e)
+            finally:
+                self._remote.active = False
+
+
+def _apply_remote(message):
+    """ข้อความจาก worker อื่น → ทำเหมือน handler ของ process นี้เขียนเอง"""
+    import cache
+    import change_feed
+    from schedule_index import schedule
+    from working_hours import hours
+
+    if message.get('hours'):
+        hours.invalidate()
+        return
+    event = message.get('event')
+    if not event:
+        return
+    if event['type'] == 'appointment' and event['appointment_date'] and event['appointment_time']:
+        schedule.apply(event['appointment_id'], event['doctor_id'], event['appointment_date'],
+                       event['appointment_time'], event['status'])
+    if event.get('patient_id') is not None and (event['type'] == 'payment' or event['action'] == 'completed'):
+        cache.invalidate_patient(event['patient_id'])
+    # versions.observe (ETag) และ subscriber ของ /events ทำงานผ่าน listener ของฟีดตามปกติ
+    change_feed.feed.publish(event)
+
+
+def _load_app():
+    import api
+    return api.app
+
+
+def _worker_main(listener, relay_sock, threads, graceful_timeout, app=None):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)      # Ctrl-C ส่งถึงทั้งกลุ่ม → ให้ master สั่ง TERM เอง
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    if app is None:
+        app = _load_app()
+    pid = str(os.getpid())
+
+    @app.after_request
+    def _worker_header(response):
+        response.headers["X-Worker-Pid"] = pid
+        return response
+
+    relay = _Relay(relay_sock)
+    relay.start()
+
+    # โหลดดัชนีเบื้องหลัง (ลองใหม่เองถ้า DB ยังไม่พร้อม) — worker รับคำขอได้ทันที ดู /readyz
+    import health
+    health.start_warmup()
+
+    server = _Server(listener, app, threads)
+    signal.signal(signal.SIGTERM, lambda *_: server.stop())
+    relay.send({'ready': os.getpid()})
+    print(f">>> [worker {pid}] พร้อมรับคำขอ ({threads} threads)")
+
+    server.serve_forever(poll_interval=0.5)
+    if not server.drain(graceful_timeout):
+        print(f">>> [worker {pid}] ยังมีคำขอค้างเกิน {graceful_timeout:g} วินาที ปิดเลย")
+    print(f">>> [worker {pid}] ปิดแล้ว")
+
+
+# ---------- ฝั่ง master ----------
+class _Child:
+    __slots__ = ("pid", "sock", "generation", "started", "ready", "retire_at", "buffer")
+
+    def __init__(self, pid, sock, generation):
+        self.pid = pid
+        self.sock = sock
+        self.generation = generation
+        self.started = time.monotonic()
+        self.ready = False
+        self.retire_at = None        # เวลาที่สั่ง TERM (None = ยังทำงานอยู่)
+        self.buffer = b""
+
+
+class Master:
+    def __init__(self, listener, workers=WORKERS, threads=THREADS,
+                 graceful_timeout=GRACEFUL_TIMEOUT, app=None):
+        self.listener = listener
+        self.workers = max(1, int(workers))
+        self.threads = max(1, int(threads))
+        self.graceful_timeout = float(graceful_timeout)
+        self.app = app
+        self.children = {}
+        self.generation = 0
+        self.stopping = None         # เวลาที่เริ่มหยุด
+        self.exit_code = 0
+        self.fast_exits = 0
+        self._signals = []
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+
+    # ---------- เริ่ม / หยุด worker ----------
+    def spawn(self):
+        parent_sock, child_sock = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.set_wakeup_fd(-1)
+                self._selector.close()
+                os.close(self._wake_r)
+                os.close(self._wake_w)
+                parent_sock.close()
+                for child in self.children.values():
+                    child.sock.close()
+                _worker_main(self.listener, child_sock, self.threads, self.graceful_timeout, self.app)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+
+        child_sock.close()
+        parent_sock.settimeout(RELAY_SEND_TIMEOUT)
+        child = _Child(pid, parent_sock, self.generation)
+        self.children[pid] = child
+        self._selector.register(parent_sock, selectors.EVENT_READ, child)
+        return child
+
+    def _retire(self, child, sig=signal.SIGTERM):
+        if child.retire_at is None or sig == signal.SIGKILL:
+            child.retire_at = child.retire_at or time.monotonic()
+            try:
+                os.kill(child.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def stop(self):
+        if self.stopping is None:
+            print(f">>> [master {os.getpid()}] กำลังหยุด (รอคำขอค้างไม่เกิน {self.graceful_timeout:g} วินาที)")
+            self.stopping = time.monotonic()
+        for child in list(self.children.values()):
+            self._retire(child)
+
+    def reload(self):
+        self.generation += 1
+        print(f">>> [master {os.getpid()}] reload → worker ชุดที่ {self.generation}")
+        for _ in range(self.workers):
+            self.spawn()
+
+    # ---------- relay ----------
+    def _read_relay(self, child):
+        try:
+            data = child.sock.recv(65536)
+        except (BlockingIOError, socket.timeout):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._selector.unregister(child.sock)
+            return
+        child.buffer += data
+        *lines, child.buffer = child.buffer.split(b"\n")
+        for line in lines:
+            if line.startswith(b'{"ready"'):
+                child.ready = True
+                self._maybe_retire_old()
+                continue
+            for other in list(self.children.values()):
+                if other is not child and other.retire_at is None:
+                    try:
+                        other.sock.sendall(line + b"\n")
+                    except OSError as e:
+                        print(f"relay to worker {other.pid} error:", e)
+
+    def _maybe_retire_old(self):
+        current = [c for c in self.children.values() if c.generation == self.generation]
+        if len(current) < self.workers or not all(c.ready for c in current):
+            return
+        self.fast_exits = 0
+        for child in list(self.children.values()):
+            if child.generation < self.generation:
+                self._retire(child)
+
+    # ---------- ดูแล worker ----------
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            child = self.children.pop(pid, None)
+            if child is None:
+                continue
+            try:
+                self._selector.unregister(child.sock)
+            except (KeyError, ValueError):
+                pass
+            child.sock.close()
+
+            if child.retire_at is not None or self.stopping is not None:
+                continue
+            if child.generation != self.generation:
+                continue
+            print(f">>> [master] worker {pid} ตาย (status {status}) เริ่มใหม่")
+            if time.monotonic() - child.started < FAST_EXIT:
+                self.fast_exits += 1
+                if self.fast_exits >= MAX_FAST_EXITS:
+                    print(f">>> [master] worker เริ่มไม่ขึ้น {self.fast_exits} ครั้งติดกัน หยุดทำงาน")
+                    self.exit_code = 1
+                    self.stop()
+                    return
+                time.sleep(min(self.fast_exits, 5))
+            self.spawn()
+
+    def _enforce_timeouts(self):
+        now = time.monotonic()
+        for child in list(self.children.values()):
+            if child.retire_at is not None and now - child.retire_at > self.graceful_timeout + KILL_GRACE:
+                print(f">>> [master] worker {child.pid} ไม่ยอมปิด ส่ง KILL")
+                self._retire(child, signal.SIGKILL)
+
+    # ---------- signal ----------
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def _handle_signals(self):
+        while self._signals:
+            signum = self._signals.pop(0)
+            if signum in (signal.SIGTERM, signal.SIGINT):
+                if signum == signal.SIGINT and self.stopping is not None:
+                    for child in list(self.children.values()):
+                        self._retire(child, signal.SIGKILL)
+                self.stop()
+            elif signum == signal.SIGHUP and self.stopping is None:
+                self.reload()
+
+    def run(self):
+        os.set_blocking(self._wake_w, False)
+        signal.set_wakeup_fd(self._wake_w)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            signal.signal(signum, self._on_signal)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+
+        host, port = self.listener.getsockname()[:2]
+        print(f">>> [master {os.getpid()}] http://{host}:{port} workers={self.workers} threads={self.threads}")
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children or self.stopping is None:
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.data is None:
+                    os.read(self._wake_r, 512)
+                else:
+                    self._read_relay(key.data)
+            self._handle_signals()
+            self._reap()
+            self._enforce_timeouts()
+
+        self.listener.close()
+        print(f">>> [master {os.getpid()}] ปิดแล้ว")
+        return self.exit_code
+
+
+def bind(address):
+    """'host:port' → listening socket (non-blocking: worker หลายตัวรอ accept socket เดียวกัน)"""
+    host, _, port = address.rpartition(":")
+    host = host.strip("[]") or "0.0.0.0"
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, int(port)))
+    sock.listen(BACKLOG)
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="รัน backend แบบ prefork (ดูรายละเอียดใน docstring ของ serve.py)")
+    parser.add_argument("--bind", default=BIND, help="host:port")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--threads", type=int, default=THREADS)
+    parser.add_argument("--graceful-timeout", type=float, default=GRACEFUL_TIMEOUT)
+    parser.add_argument("--preload", action="store_true", default=PRELOAD)
+    args = parser.parse_args(argv)
+
+    listener = bind(args.bind)
+    # preload: import แอปก่อน fork — ห้ามแตะ DB ใน master (pool ถูกล้างหลัง fork อยู่แล้วแต่เปลืองเปล่า)
+    app = _load_app() if args.preload else None
+    return Master(listener, args.workers, args.threads, args.graceful_timeout, app).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+-- ตารางเวลาออกตรวจของแพทย์ (ใช้โดย working_hours.py) สร้างโดย python migrations.py up (version 1)
+-- ถ้ายังไม่มีตารางเหล่านี้ ระบบจะใช้ค่าเริ่มต้น 09:00–17:15 ทุกวัน ช่องละ 15 นาที (คิวสุดท้าย 17:00)
+
+-- เทมเพลตรายสัปดาห์: หนึ่งแถว = หนึ่งช่วงเวลา
+--   kind = 'work'  ช่วงออกตรวจ
+--   kind = 'break' ช่วงพัก (ปิดช่องที่ทับกับช่วงนี้)
+--   weekday: 0 = จันทร์ ... 6 = อาทิตย์ (ตาม Python date.weekday())
+--   หมอที่มีแถวในตารางนี้ วันไหนไม่มีช่วง 'work' ถือว่าไม่ออกตรวจ
+CREATE TABLE IF NOT EXISTS doctor_schedule (
+  schedule_id   INT AUTO_INCREMENT PRIMARY KEY,
+  doctor_id     INT NOT NULL,
+  weekday       TINYINT NOT NULL,
+  start_time    TIME NOT NULL,
+  end_time      TIME NOT NULL,
+  kind          ENUM('work','break') NOT NULL DEFAULT 'work',
+  slot_minutes  SMALLINT NOT NULL DEFAULT 15,
+  KEY idx_doctor_schedule_doctor (doctor_id, weekday)
+) DEFAULT CHARSET = utf8mb4;
+
+-- ข้อยกเว้นรายวัน (ลา / วันหยุด / เปิดตรวจเพิ่ม)
+--   doctor_id = NULL → ใช้กับแพทย์ทุกคน (เช่น วันหยุดนักขัตฤกษ์)
+--   kind = 'off'  ปิดช่วง start_time–end_time (ถ้า NULL ทั้งคู่ = หยุดทั้งวัน)
+--   kind = 'work' เปิดช่วง start_time–end_time แทนเทมเพลตของวันนั้น
+CREATE TABLE IF NOT EXISTS doctor_schedule_exception (
+  exception_id    INT AUTO_INCREMENT PRIMARY KEY,
+  doctor_id       INT NULL,
+  exception_date  DATE NOT NULL,
+  kind            ENUM('off','work') NOT NULL DEFAULT 'off',
+  start_time      TIME NULL,
+  end_time        TIME NULL,
+  note            VARCHAR(255) NULL,
+  KEY idx_doctor_schedule_exception_date (exception_date, doctor_id)
+) DEFAULT CHARSET = utf8mb4;
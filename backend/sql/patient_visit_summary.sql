@@ -0,0 +1,12 @@
+-- สรุปการมารักษาต่อคนไข้ (ใช้โดย visit_summary.py)
+-- อัปเดตใน transaction เดียวกับ POST /treatments และ PUT /payments/<id>/pay
+-- สร้างโดย python migrations.py up (version 2 ซึ่ง backfill ให้ครั้งแรก)
+CREATE TABLE IF NOT EXISTS patient_visit_summary (
+  patient_id      INT PRIMARY KEY,
+  last_visit      DATE NULL,
+  visit_count     INT NOT NULL DEFAULT 0,
+  last_diagnosis  TEXT NULL,
+  unpaid_balance  DECIMAL(10,2) NOT NULL DEFAULT 0.00,
+  unpaid_count    INT NOT NULL DEFAULT 0,
+  updated_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) DEFAULT CHARSET = utf8mb4;
@@ -0,0 +1,103 @@
+-- schema ขั้นต่ำสำหรับ driver sqlite ของ aiodb.py (ทดสอบโหมด ASGI โดยไม่มี MySQL)
+-- มีเฉพาะตาราง/คอลัมน์ที่ endpoint แบบ async และ bench/bench_load.py ใช้ ไม่ใช่ schema จริงของระบบ
+-- (schema จริงปรับผ่าน migrations.py)
+CREATE TABLE IF NOT EXISTS patient (
+  patient_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+  first_name   TEXT NOT NULL,
+  last_name    TEXT NOT NULL,
+  birth_date   TEXT NULL,
+  phone        TEXT NULL,
+  updated_at   TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- แทน ON UPDATE CURRENT_TIMESTAMP ของ MySQL (migration 6)
+CREATE TRIGGER IF NOT EXISTS trg_patient_updated_at
+AFTER UPDATE OF first_name, last_name, phone ON patient
+BEGIN
+  UPDATE patient SET updated_at = CURRENT_TIMESTAMP WHERE patient_id = NEW.patient_id;
+END;
+
+CREATE TABLE IF NOT EXISTS doctor (
+  doctor_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+  first_name   TEXT NOT NULL,
+  last_name    TEXT NOT NULL,
+  username     TEXT NULL,
+  password     TEXT NULL,
+  specialty    TEXT NULL
+);
+
+CREATE TABLE IF NOT EXISTS appointment (
+  appointment_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+  patient_id        INTEGER NOT NULL,
+  doctor_id         INTEGER NOT NULL,
+  appointment_date  TEXT NOT NULL,
+  appointment_time  TEXT NOT NULL,
+  status            TEXT NOT NULL DEFAULT 'scheduled'
+);
+
+CREATE TABLE IF NOT EXISTS treatment (
+  treatment_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+  patient_id      INTEGER NOT NULL,
+  doctor_id       INTEGER NOT NULL,
+  appointment_id  INTEGER NULL,
+  symptom         TEXT NULL,
+  diagnosis       TEXT NULL,
+  advice          TEXT NULL,
+  treatment_date  TEXT NOT NULL,
+  idempotency_key TEXT NULL UNIQUE,
+  UNIQUE (appointment_id)
+);
+
+CREATE TABLE IF NOT EXISTS payment (
+  payment_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+  patient_id      INTEGER NOT NULL,
+  appointment_id  INTEGER NULL,
+  amount          NUMERIC NOT NULL DEFAULT 0,
+  payment_method  TEXT NULL,
+  payment_date    TEXT NULL,
+  status          TEXT NOT NULL DEFAULT 'unpaid',
+  UNIQUE (appointment_id)
+);
+
+CREATE TABLE IF NOT EXISTS patient_visit_summary (
+  patient_id      INTEGER PRIMARY KEY,
+  last_visit      TEXT NULL,
+  visit_count     INTEGER NOT NULL DEFAULT 0,
+  last_diagnosis  TEXT NULL,
+  unpaid_balance  NUMERIC NOT NULL DEFAULT 0,
+  unpaid_count    INTEGER NOT NULL DEFAULT 0
+);
+
+-- ตารางเวลาออกตรวจ (ดู doctor_schedule.sql)
+CREATE TABLE IF NOT EXISTS doctor_schedule (
+  schedule_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+  doctor_id     INTEGER NOT NULL,
+  weekday       INTEGER NOT NULL,
+  start_time    TEXT NOT NULL,
+  end_time      TEXT NOT NULL,
+  kind          TEXT NOT NULL DEFAULT 'work',
+  slot_minutes  INTEGER NOT NULL DEFAULT 15
+);
+
+CREATE TABLE IF NOT EXISTS doctor_schedule_exception (
+  exception_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+  doctor_id       INTEGER NULL,
+  exception_date  TEXT NOT NULL,
+  kind            TEXT NOT NULL DEFAULT 'off',
+  start_time      TEXT NULL,
+  end_time        TEXT NULL,
+  note            TEXT NULL
+);
+
+-- index ของ query หลัก (ชุดเดียวกับ migration 4 ใน migrations.py)
+CREATE INDEX IF NOT EXISTS idx_appointment_doctor_day
+  ON appointment (doctor_id, appointment_date, status, appointment_time);
+CREATE INDEX IF NOT EXISTS idx_appointment_day ON appointment (appointment_date, appointment_time);
+CREATE INDEX IF NOT EXISTS idx_appointment_status
+  ON appointment (status, doctor_id, appointment_date, appointment_time);
+CREATE INDEX IF NOT EXISTS idx_treatment_patient_date ON treatment (patient_id, treatment_date);
+CREATE INDEX IF NOT EXISTS idx_payment_status ON payment (status);
+CREATE INDEX IF NOT EXISTS idx_doctor_schedule_doctor ON doctor_schedule (doctor_id, weekday);
+CREATE INDEX IF NOT EXISTS idx_doctor_schedule_exception_date
+  ON doctor_schedule_exception (exception_date, doctor_id);
+CREATE INDEX IF NOT EXISTS idx_patient_updated_at ON patient (updated_at);
@@ -0,0 +1,307 @@
+"""
+ติดตามทุกคำสั่ง SQL: route ไหนยิงกี่ query / คำสั่งไหนช้า / มี N+1 หรือไม่
+
+ทุก cursor ที่ได้จาก get_cursor() / get_db().cursor() ถูกห่อด้วย TracedCursor
+และ flow แบบ async (aiodb.run_flow) เรียก record() เอง → เก็บต่อคำสั่ง:
+  statement (normalize แล้ว: ค่าคงที่ / %s → ?, IN (?, ?, ...) → IN (...))
+  จำนวน parameter / จำนวนแถวที่ได้ (SELECT) หรือที่แก้ (INSERT/UPDATE) / เวลา (execute + fetch)
+
+ตั้งค่าผ่าน environment variable:
+  SQL_SLOW_MS          คำสั่งที่ใช้เวลาตั้งแต่นี้ขึ้นไปเขียนลง slow-query log (ค่าเริ่มต้น 200, 0 = ปิด)
+  SQL_SLOW_LOG         ไฟล์ของ slow-query log (JSON บรรทัดละรายการ; ไม่ตั้ง = stderr)
+  SQL_N_PLUS_ONE       SELECT เดียวกันในคำขอเดียวกันตั้งแต่กี่ครั้งถือว่าเป็น N+1 (ค่าเริ่มต้น 5, 0 = ปิด)
+  SQL_TRACE_HEADERS    1 = ใส่ X-SQL-Queries / X-SQL-Time-Ms / X-SQL-N-Plus-One ใน response
+                       (เปิดเองเมื่อรัน Flask แบบ debug)
+
+สรุปต่อคำสั่งตั้งแต่ process เริ่ม: GET /sql/stats  จำนวน query ต่อ route: clinic_http_request_queries ใน /metrics
+"""
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+
+import metrics
+
+SLOW_MS = float(os.getenv("SQL_SLOW_MS", "200"))
+SLOW_LOG = os.getenv("SQL_SLOW_LOG", "")
+N_PLUS_ONE = int(os.getenv("SQL_N_PLUS_ONE", "5"))
+TRACE_HEADERS = os.getenv("SQL_TRACE_HEADERS", "0") == "1"
+
+MAX_STATEMENTS = 1000        # จำนวน statement (หลัง normalize) ที่เก็บสรุปแยกไว้ ที่เกินรวมเป็น <other>
+
+
+# ---------- normalize ----------
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize(sql):
+    """ข้อความ SQL → รูปแบบเดียวกันไม่ว่าค่าจะเป็นอะไร ใช้จับกลุ่มคำสั่ง"""
+    text = _STRING.sub("?", sql)
+    text = _NUMBER.sub("?", text)
+    text = _PLACEHOLDER.sub("?", text)
+    text = _IN_LIST.sub("IN (...)", text)
+    text = _VALUES_LIST.sub(r"\1, ...", text)
+    return _SPACE.sub(" ", text).strip()
+
+
+def _param_count(params):
+    return len(params) if params else 0
+
+
+# ---------- สรุปรวมต่อ statement ----------
+class StatementStats:
+    def __init__(self, limit=MAX_STATEMENTS):
+        self._lock = threading.Lock()
+        self._limit = limit
+        self._stats = {}     # statement → [count, total_seconds, max_seconds, rows, slow]
+
+    def add(self, statement, rows, seconds, slow):
+        with self._lock:
+            entry = self._stats.get(statement)
+            if entry is None:
+                if len(self._stats) >= self._limit:
+                    statement = "<other>"
+                    entry = self._stats.get(statement)
+                if entry is None:
+                    entry = self._stats[statement] = [0, 0.0, 0.0, 0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+            entry[3] += rows
+            entry[4] += slow
+
+    def top(self, limit=50, order="total_ms"):
+        with self._lock:
+            items = [(s, list(e)) for s, e in self._stats.items()]
+        rows = [{
+            'statement': statement,
+            'count': count,
+            'total_ms': round(total * 1000, 3),
+            'avg_ms': round(total * 1000 / count, 3),
+            'max_ms': round(peak * 1000, 3),
+            'rows': row_count,
+            'slow': slow,
+        } for statement, (count, total, peak, row_count, slow) in items]
+        rows.sort(key=lambda r: r[order], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+statements = StatementStats()
+
+
+# ---------- slow-query log ----------
+_log_lock = threading.Lock()
+
+
+def _write_log(entry):
+    line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+    with _log_lock:
+        try:
+            if SLOW_LOG:
+                with open(SLOW_LOG, "a", encoding="utf-8") as f:
+                    f.write(line)
+            else:
+                sys.stderr.write(line)
+        except OSError as e:
+            print("slow query log error:", e)
+
+
+# ---------- ต่อคำขอ ----------
+class RequestTrace:
+    __slots__ = ("method", "route", "queries", "seconds", "selects")
+
+    def __init__(self, method, route):
+        self.method = method
+        self.route = route
+        self.queries = 0
+        self.seconds = 0.0
+        self.selects = Counter()     # SELECT (normalize แล้ว) → จำนวนครั้งในคำขอนี้
+
+    def repeated(self):
+        """SELECT ที่ซ้ำถึงเกณฑ์ N+1 → [(statement, จำนวนครั้ง)] มากสุดก่อน"""
+        if N_PLUS_ONE <= 0:
+            return []
+        return [(s, n) for s, n in self.selects.most_common() if n >= N_PLUS_ONE]
+
+
+_request = contextvars.ContextVar("clinic_sql_trace", default=None)
+
+
+def start_request(method, route):
+    trace = RequestTrace(method, route)
+    _request.set(trace)
+    return trace
+
+
+def record(sql, params_count, rows, seconds):
+    """บันทึกหนึ่งคำสั่ง (เรียกหลังอ่านผลเสร็จ)"""
+    statement = normalize(sql)
+    slow = SLOW_MS > 0 and seconds * 1000 >= SLOW_MS
+    statements.add(statement, rows, seconds, slow)
+
+    trace = _request.get()
+    if trace is not None:
+        trace.queries += 1
+        trace.seconds += seconds
+        if statement[:6].upper() == "SELECT":
+            trace.selects[statement] += 1
+
+    if slow:
+        _write_log({
+            'ts': datetime.now().isoformat(timespec="milliseconds"),
+            'kind': 'slow_query',
+            'ms': round(seconds * 1000, 3),
+            'rows': rows,
+            'params': params_count,
+            'route': trace.route if trace else None,
+            'method': trace.method if trace else None,
+            'statement': statement,
+        })
+
+
+def finish_request(trace, status=None, with_headers=TRACE_HEADERS):
+    """
+    จบคำขอ: นับ query ต่อ route เข้า metrics, เขียน N+1 ลง log
+    คืน header สำหรับ debug [(ชื่อ, ค่า)] (ว่างถ้าไม่ได้เปิด)
+    """
+    metrics.REQUEST_QUERIES.observe(trace.queries, trace.method, trace.route)
+    repeated = trace.repeated()
+    for statement, count in repeated:
+        metrics.N_PLUS_ONE.inc(trace.method, trace.route)
+        _write_log({
+            'ts': datetime.now().isoformat(timespec="milliseconds"),
+            'kind': 'n_plus_one',
+            'count': count,
+            'route': trace.route,
+            'method': trace.method,
+            'status': status,
+            'statement': statement,
+        })
+    return _headers(trace, repeated) if with_headers else []
+
+
+def _headers(trace, repeated):
+    headers = [("X-SQL-Queries", str(trace.queries)),
+               ("X-SQL-Time-Ms", f"{trace.seconds * 1000:.3f}")]
+    if repeated:
+        statement, count = repeated[0]
+        # header ต้องเป็น latin-1 → ตัดให้สั้นและแทนตัวอักษรอื่นด้วย ?
+        short = statement[:120].encode("ascii", "replace").decode("ascii")
+        headers.append(("X-SQL-N-Plus-One", f"{count}x {short}"))
+    return headers
+
+
+# ---------- cursor ----------
+class TracedCursor:
+    """
+    ห่อ cursor ของ mysql-connector: จับเวลา execute + fetch ต่อคำสั่งแล้ว record()
+    คำสั่งหนึ่งถือว่าจบเมื่อ fetchall / execute คำสั่งถัดไป / close
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._pending = None     # [sql, จำนวน parameter, แถวที่อ่านได้ หรือ None, เวลา]
+
+    def execute(self, operation, params=(), **kwargs):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.add_db_time(elapsed)
+            self._pending = [operation, _param_count(params), None, elapsed]
+
+    def executemany(self, operation, seq_params):
+        self._finish()
+        seq_params = list(seq_params)
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.add_db_time(elapsed)
+            self._pending = [operation, sum(_param_count(p) for p in seq_params), None, elapsed]
+            self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(1 if row is not None else 0, time.perf_counter() - started)
+        return row
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(len(rows), time.perf_counter() - started)
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def _fetched(self, rows, elapsed):
+        metrics.add_db_time(elapsed)
+        pending = self._pending
+        if pending is not None:
+            pending[2] = (pending[2] or 0) + rows
+            pending[3] += elapsed
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        sql, params_count, rows, elapsed = pending
+        if rows is None:
+            # ไม่ได้ fetch (INSERT / UPDATE) → ใช้จำนวนแถวที่แก้
+            try:
+                rows = max(self._cursor.rowcount or 0, 0)
+            except Exception:
+                rows = 0
+        try:
+            record(sql, params_count, rows, elapsed)
+        except Exception as e:
+            print("sql trace error:", e)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+# ---------- Flask ----------
+def init_app(app):
+    from flask import request
+
+    @app.before_request
+    def _trace_start():
+        rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        start_request(request.method, rule)
+
+    @app.after_request
+    def _trace_finish(response):
+        trace = _request.get()
+        if trace is not None:
+            _request.set(None)
+            for name, value in finish_request(trace, response.status_code, TRACE_HEADERS or app.debug):
+                response.headers[name] = value
+        return response
@@ -0,0 +1,59 @@
+"""
+fixture ของชุดทดสอบ: Flask + SQLite ในหน่วยความจำ (แบบเดียวกับ bench/bench_load.py)
+
+ข้อมูลสร้างครั้งเดียวต่อ session (สเกล tiny ประมาณ 1 วินาที) เพราะ index / cache ในโมดูล
+(schedule, patient_index, versions ...) เป็นตัวเดียวทั้งโปรเซส
+เทสที่เขียนข้อมูลจึงต้องเลือกหมอ / วันของตัวเองไม่ให้ชนกับเทสอื่น
+"""
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.join(BACKEND, "bench"))
+
+import datagen                       # noqa: E402
+import db                            # noqa: E402
+from bench_load import StandInPool   # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def raw():
+    """connection SQLite ตรง ๆ ไว้เตรียมข้อมูลและตรวจผลในเทส"""
+    conn, _meta = datagen.build_sqlite(":memory:", "tiny", 42)
+    db.pool = StandInPool(conn)
+    return conn
+
+
+@pytest.fixture(scope="session")
+def app(raw):
+    import api
+    api.app.config["TESTING"] = True
+    return api.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def future_day(days):
+    return (date.today() + timedelta(days=days)).isoformat()
+
+
+def open_day(client, doctor_id, start, need=4):
+    """
+    วันแรกตั้งแต่ start วันข้างหน้าที่หมอมีช่องว่างอย่างน้อย need ช่อง → (วันที่, [ช่องว่าง])
+    ดูจาก /api/bot/suggest_slots (หมอบางคนไม่ออกตรวจบางวัน)
+    """
+    for offset in range(start, start + 14):
+        day = future_day(offset)
+        res = client.post("/api/bot/suggest_slots", json={"doctor_id": doctor_id, "date": day})
+        assert res.status_code == 200
+        slots = res.get_json()["available_slots"]
+        if len(slots) >= need:
+            return day, slots
+    raise AssertionError(f"หมอ {doctor_id} ไม่มีวันว่างพอในสองสัปดาห์")
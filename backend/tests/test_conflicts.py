@@ -0,0 +1,105 @@
+"""ตรวจนัดชน: สร้าง / แก้ไข / นำเข้า / ตรวจผ่านบอท ต้องใช้ schedule index ชุดเดียวกัน"""
+from datetime import timedelta
+
+import schedule_index
+from conftest import future_day, open_day
+
+
+def _create(client, patient_id, doctor_id, day, time):
+    return client.post("/appointments", json={
+        "patient_id": patient_id, "doctor_id": doctor_id,
+        "appointment_date": day, "appointment_time": time,
+    })
+
+
+def _count(raw, doctor_id, day):
+    return raw.execute(
+        "SELECT COUNT(*) AS n FROM appointment WHERE doctor_id = ? AND appointment_date = ?",
+        (doctor_id, day)).fetchone()["n"]
+
+
+def test_create_rejects_same_slot(client):
+    day, slots = open_day(client, 1, 5)
+    slot = slots[0]
+
+    first = _create(client, 1, 1, day, slot)
+    assert first.status_code == 201
+
+    again = _create(client, 2, 1, day, slot)
+    assert again.status_code == 400
+    body = again.get_json()
+    assert body["status"] == "error"
+    assert body["suggested_time"] != slot
+
+
+def test_create_rejects_clash_before_index_window(client, raw):
+    """วันเก่ากว่าที่ rebuild โหลดไว้ ต้องโหลดวันนั้นมาตรวจ ไม่ใช่ปล่อยผ่าน"""
+    old = raw.execute(
+        "SELECT doctor_id, appointment_date, appointment_time FROM appointment"
+        " WHERE status IN ('scheduled', 'rescheduled') AND appointment_date < ?"
+        " ORDER BY appointment_date DESC LIMIT 1",
+        ((schedule_index.load_since() - timedelta(days=1)).isoformat(),)).fetchone()
+    assert old is not None
+    before = _count(raw, old["doctor_id"], old["appointment_date"])
+
+    res = _create(client, 3, old["doctor_id"], old["appointment_date"], old["appointment_time"][:5])
+    assert res.status_code == 400
+    assert _count(raw, old["doctor_id"], old["appointment_date"]) == before
+
+
+def test_update_rejects_moving_onto_taken_slot(client):
+    day, (first_slot, *rest) = open_day(client, 2, 5)
+    other_slot, spare_slot = rest[-1], rest[-2]
+
+    taken = _create(client, 4, 2, day, first_slot)
+    moving = _create(client, 5, 2, day, other_slot)
+    assert taken.status_code == moving.status_code == 201
+    moving_id = moving.get_json()["data"]["appointment_id"]
+
+    clash = client.put(f"/appointments/{moving_id}", json={"appointment_time": first_slot})
+    assert clash.status_code == 400
+
+    ok = client.put(f"/appointments/{moving_id}", json={"appointment_time": spare_slot})
+    assert ok.status_code == 200
+
+
+def test_import_rejects_existing_and_in_batch_clashes(client, raw):
+    day, slots = open_day(client, 3, 5)
+    existing = _create(client, 6, 3, day, slots[0])
+    assert existing.status_code == 201
+    existing_id = existing.get_json()["data"]["appointment_id"]
+
+    csv_body = (
+        "patient_id,doctor_id,appointment_date,appointment_time\n"
+        f"7,3,{day},{slots[0]}\n"
+        f"8,3,{day},{slots[2]}\n"
+        f"9,3,{day},{slots[2]}\n"
+    )
+    before = _count(raw, 3, day)
+
+    dry = client.post("/appointments/import?dry_run=1", data=csv_body, content_type="text/csv")
+    assert dry.status_code == 200
+    rows = dry.get_json()["data"]["rows"]
+    assert [r["status"] for r in rows] == ["rejected", "accepted", "rejected"]
+    assert rows[0]["conflict_appointment_id"] == existing_id
+    assert rows[2]["conflict_row"] == 2
+    assert _count(raw, 3, day) == before
+
+    real = client.post("/appointments/import", data=csv_body, content_type="text/csv")
+    assert real.status_code == 200
+    data = real.get_json()["data"]
+    assert (data["accepted"], data["rejected"]) == (1, 2)
+    assert _count(raw, 3, day) == before + 1
+
+    # แถวที่นำเข้าแล้วต้องอยู่ใน index ทันที
+    assert _create(client, 10, 3, day, slots[2]).status_code == 400
+
+
+def test_validate_rejects_bad_appointment_id(client):
+    day = future_day(8)
+    res = client.post("/api/bot/validate_appointment", json={
+        "patient_id": 1, "doctor_id": 4, "appointment_date": day, "appointment_time": "10:00",
+        "appointment_id": "abc",
+    })
+    assert res.status_code == 400
+    assert "appointment_id" in res.get_json()["errors"][0]
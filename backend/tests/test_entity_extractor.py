@@ -0,0 +1,30 @@
+"""ดึงวันที่ / เวลา / รหัสคนไข้จากข้อความ (วันอ้างอิงคงที่ ไม่ขึ้นกับวันที่รันเทส)"""
+from datetime import date
+
+import pytest
+
+from entity_extractor import extract_entities
+
+TODAY = date(2026, 10, 18)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("นัด 1/2/25", "2025-02-01"),
+    ("วันที่ 3 ม.ค. 68", "2025-01-03"),
+    ("นัด 1/2 เลื่อนเป็นพรุ่งนี้", "2026-10-19"),
+])
+def test_dates(text, expected):
+    assert extract_entities(text, today=TODAY)["date"] == expected
+
+
+@pytest.mark.parametrize("text", ["10.30 น.", "เวลา 10.30", "10:30"])
+def test_times(text):
+    assert extract_entities(text, today=TODAY)["time"] == "10:30"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("ราคา 1.50 บาท", {}),
+    ("คนไข้ 5 ค้าง 2.50 บาท", {"patient_id": 5}),
+])
+def test_money_is_not_a_time(text, expected):
+    assert extract_entities(text, today=TODAY) == expected
@@ -0,0 +1,50 @@
+"""ETag / 304: ตอบ 304 เมื่อข้อมูลไม่เปลี่ยน และต้องได้ข้อมูลใหม่ทันทีหลังมีการเขียน"""
+
+
+def _open_appointment(raw):
+    """ใบนัดที่ยังไม่บันทึกการรักษา (ไว้ยิง POST /treatments)"""
+    return raw.execute(
+        "SELECT a.appointment_id, a.patient_id FROM appointment a"
+        " LEFT JOIN treatment t ON t.appointment_id = a.appointment_id"
+        " WHERE a.status = 'scheduled' AND t.treatment_id IS NULL"
+        " ORDER BY a.appointment_date LIMIT 1").fetchone()
+
+
+def test_unchanged_list_is_304(client):
+    first = client.get("/patients", query_string={"limit": 5})
+    tag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    again = client.get("/patients", query_string={"limit": 5}, headers={"If-None-Match": tag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == tag
+
+
+def test_query_string_is_part_of_etag(client):
+    a = client.get("/patients", query_string={"limit": 5}).headers["ETag"]
+    b = client.get("/patients", query_string={"limit": 6}).headers["ETag"]
+    assert a != b
+    assert client.get("/patients", query_string={"limit": 6},
+                      headers={"If-None-Match": a}).status_code == 200
+
+
+def test_write_invalidates_records_etag(client, raw):
+    appt = _open_appointment(raw)
+    url = f"/patients/{appt['patient_id']}/records"
+
+    before = client.get(url)
+    assert before.status_code == 200
+    tag = before.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": tag}).status_code == 304
+
+    res = client.post("/treatments", json={
+        "appointment_id": appt["appointment_id"], "diagnosis": "ไข้หวัด", "advice": "พักผ่อน",
+    })
+    assert res.status_code == 201
+
+    after = client.get(url, headers={"If-None-Match": tag})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != tag
+    assert len(after.get_json()["data"]) == len(before.get_json()["data"]) + 1
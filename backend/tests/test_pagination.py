@@ -0,0 +1,74 @@
+"""แบ่งหน้าแบบ cursor: ไม่ส่ง limit ก็ได้หน้าเดียว, ตาม next_cursor แล้วได้ครบ ไม่ซ้ำ ไม่ข้าม"""
+import pytest
+
+from pagination import DEFAULT_LIMIT, BadPageRequest, decode_cursor, encode_cursor, keyset_where
+
+
+def test_cursor_round_trip():
+    values = ["2026-10-18", "09:30:00", 42]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+@pytest.mark.parametrize("token", ["not-base64!", encode_cursor({"a": 1})])
+def test_decode_cursor_rejects_garbage(token):
+    with pytest.raises(BadPageRequest):
+        decode_cursor(token)
+
+
+def test_keyset_where_expands_first_column():
+    sql, params = keyset_where(["a", "b"], [1, 2])
+    assert sql == "a >= %s AND (a > %s OR b > %s)"
+    assert params == [1, 1, 2]
+
+    sql, params = keyset_where(["a", "b", "c"], [1, 2, 3], op="<")
+    assert sql == "a <= %s AND (a < %s OR (b <= %s AND (b < %s OR c < %s)))"
+    assert params == [1, 1, 2, 2, 3]
+
+
+def test_list_without_limit_returns_one_page(client):
+    res = client.get("/patients")
+    assert res.status_code == 200
+    body = res.get_json()
+    assert len(body["data"]) == DEFAULT_LIMIT
+    assert body["next_cursor"]
+
+
+def test_walking_cursor_covers_every_row_once(client, raw):
+    expected = [r["appointment_id"] for r in raw.execute(
+        "SELECT appointment_id FROM appointment WHERE doctor_id = 5"
+        " ORDER BY appointment_date, appointment_time, appointment_id")]
+
+    seen, cursor = [], None
+    while True:
+        query = {"doctor_id": 5, "limit": 500, "fields": "id"}
+        if cursor:
+            query["cursor"] = cursor
+        res = client.get("/appointments", query_string=query)
+        assert res.status_code == 200
+        body = res.get_json()
+        assert all(set(row) == {"id"} for row in body["data"])
+        seen += [row["id"] for row in body["data"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(expected) > 500
+    assert seen == expected
+
+
+def test_fields_selects_columns(client):
+    res = client.get("/patients", query_string={"limit": 3, "fields": "id,name"})
+    assert res.status_code == 200
+    assert [set(row) for row in res.get_json()["data"]] == [{"id", "name"}] * 3
+
+
+@pytest.mark.parametrize("query", [
+    {"limit": "0"},
+    {"limit": "501"},
+    {"limit": "abc"},
+    {"cursor": "not-base64!"},
+    {"cursor": encode_cursor([1, 2])},
+    {"fields": "id,password"},
+])
+def test_bad_page_arguments_are_400(client, query):
+    assert client.get("/patients", query_string=query).status_code == 400
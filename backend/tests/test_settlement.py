@@ -0,0 +1,71 @@
+"""ปิดยอดหลายรายการ: ผลรายรายการ, สถานะใน DB และตารางสรุปยอดค้างของคนไข้"""
+
+
+def _unpaid(raw, count):
+    """payment ที่ค้างชำระ คนละคนไข้กัน"""
+    return raw.execute(
+        "SELECT MIN(payment_id) AS payment_id, patient_id FROM payment WHERE status = 'unpaid'"
+        " GROUP BY patient_id ORDER BY patient_id DESC LIMIT ?", (count,)).fetchall()
+
+
+def _payment(raw, payment_id):
+    return raw.execute("SELECT status, amount, payment_method FROM payment WHERE payment_id = ?",
+                       (payment_id,)).fetchone()
+
+
+def _summary(raw, patient_id):
+    return raw.execute("SELECT unpaid_balance, unpaid_count FROM patient_visit_summary WHERE patient_id = ?",
+                       (patient_id,)).fetchone()
+
+
+def test_settle_reports_each_item(client, raw):
+    target, = _unpaid(raw, 1)
+    pid = target["payment_id"]
+    amount = _payment(raw, pid)["amount"]
+    summary = _summary(raw, target["patient_id"])
+    already_paid = raw.execute("SELECT payment_id FROM payment WHERE status = 'paid' LIMIT 1").fetchone()
+
+    res = client.post("/payments/settle", json={"payments": [
+        {"payment_id": pid, "amount": str(amount), "payment_method": "credit"},
+        {"payment_id": pid, "amount": str(amount)},
+        {"payment_id": 999999, "amount": "100"},
+        {"payment_id": already_paid["payment_id"], "amount": "100"},
+        {"payment_id": pid, "amount": "-5"},
+    ]})
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    assert [i["status"] for i in data["items"]] == ["paid"] + ["rejected"] * 4
+    assert (data["total"], data["paid"], data["rejected"]) == (5, 1, 4)
+    assert all(i["error"] for i in data["items"][1:])
+
+    row = _payment(raw, pid)
+    assert (row["status"], row["payment_method"]) == ("paid", "credit")
+
+    after = _summary(raw, target["patient_id"])
+    assert after["unpaid_count"] == summary["unpaid_count"] - 1
+    assert float(after["unpaid_balance"]) == float(summary["unpaid_balance"]) - float(amount)
+
+
+def test_settle_from_statement_csv(client, raw):
+    targets = _unpaid(raw, 2)
+    lines = ["reference,credit"]
+    for t in targets:
+        lines.append(f"INV-{t['payment_id']},{_payment(raw, t['payment_id'])['amount']}")
+    lines.append("INV-999999,100")
+
+    res = client.post("/payments/settle/statement", data="\n".join(lines) + "\n", content_type="text/csv")
+    assert res.status_code == 200
+    data = res.get_json()["data"]
+    assert (data["paid"], data["rejected"]) == (2, 1)
+    for t in targets:
+        row = _payment(raw, t["payment_id"])
+        assert (row["status"], row["payment_method"]) == ("paid", "transfer")
+
+
+def test_statement_without_amount_column_is_400(client):
+    res = client.post("/payments/settle/statement", data="reference\nINV-1\n", content_type="text/csv")
+    assert res.status_code == 400
+
+
+def test_empty_batch_is_400(client):
+    assert client.post("/payments/settle", json={"payments": []}).status_code == 400
@@ -0,0 +1,116 @@
+"""
+ตัวนับเวอร์ชันของข้อมูลแยกตามส่วน (partition) ใช้ทำ ETag ให้ GET รายการ
+→ client ส่ง If-None-Match มา ถ้ายังไม่มีอะไรเปลี่ยนตอบ 304 ได้ทันทีโดยไม่ query และไม่ serialize
+
+  /appointments               ("appointment", doctor_id หรือ None, วันที่ หรือ None) ตามตัวกรองที่ส่งมา
+  /payments/unpaid            ("payment",)
+  /patients                   ("patient",)
+  /patients/<pid>/records     ("records", pid)
+
+ตัวนับเพิ่มจาก event ของ change_feed (ทุก route ที่เขียนข้อมูล publish หลัง commit อยู่แล้ว)
+ใบนัดหนึ่งรายการเพิ่มทุกส่วนที่ครอบคลุม: (หมอ, วัน) / (หมอ, *) / (*, วัน) / (*, *) ทั้งค่าใหม่และค่าเดิมก่อนย้าย
+
+ETag = epoch ของ process + ช่วงเวลา ETAG_MAX_AGE วินาที + เวอร์ชัน + hash ของ query string
+  - worker อื่น (หลาย process) ให้ ETag ไม่ตรงกัน → ตอบ 200 ตามปกติ ไม่ผิด
+  - รันด้วย serve.py: event ที่ worker อื่นเขียนถูกส่งต่อมาเพิ่มเวอร์ชันที่นี่ด้วย
+  - ข้อมูลที่เปลี่ยนจากนอกระบบนี้ (เพิ่มคนไข้ / process อื่นที่ไม่ได้รันผ่าน serve.py)
+    จะเห็นไม่เกิน ETAG_MAX_AGE วินาที
+    (0 = ไม่ตัดช่วงเวลา ใช้เมื่อมี process เดียวที่เขียน DB)
+"""
+import hashlib
+import os
+import threading
+import time
+
+import change_feed
+from schedule_index import to_date
+
+ETAG_MAX_AGE = float(os.getenv("ETAG_MAX_AGE", "30"))
+
+
+class VersionCounters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def get(self, key):
+        return self._counts.get(key, 0)
+
+    def bump(self, keys):
+        with self._lock:
+            for key in keys:
+                self._counts[key] = self._counts.get(key, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {'partitions': len(self._counts), 'bumps': sum(self._counts.values())}
+
+
+versions = VersionCounters()
+
+
+PATIENTS = ("patient",)
+PAYMENTS = ("payment",)
+
+
+def records_key(patient_id):
+    return ("records", int(patient_id))
+
+
+def appointments_key(args):
+    """ส่วนของ /appointments ตามตัวกรอง ?doctor_id= / ?date= (None ถ้าค่าผิด → ให้ endpoint ตอบ 400 เอง)"""
+    doctor_id = (args.get("doctor_id") or "").strip()
+    day = (args.get("date") or "").strip()
+    try:
+        return ("appointment", int(doctor_id) if doctor_id else None, to_date(day).isoformat() if day else None)
+    except ValueError:
+        return None
+
+
+def _appointment_keys(doctor_id, day):
+    return {("appointment", d, x) for d in (doctor_id, None) for x in (day, None)}
+
+
+def observe(event):
+    """แปลง event ของ change_feed เป็นส่วนที่ต้องเพิ่มเวอร์ชัน"""
+    keys = set()
+    if event['type'] == 'appointment':
+        keys |= _appointment_keys(event['doctor_id'], event['appointment_date'])
+        if event['previous_doctor_id'] is not None or event['previous_date'] is not None:
+            keys |= _appointment_keys(event['previous_doctor_id'] or event['doctor_id'],
+                                      event['previous_date'] or event['appointment_date'])
+        if event['action'] == 'completed' and event['patient_id'] is not None:
+            # บันทึกการรักษา → ประวัติการรักษา + lastVisit ในรายชื่อคนไข้
+            keys.add(records_key(event['patient_id']))
+            keys.add(PATIENTS)
+    elif event['type'] == 'payment':
+        keys.add(PAYMENTS)
+    versions.bump(keys)
+
+
+change_feed.feed.add_listener(observe)
+
+
+def etag(key, query_string=b""):
+    """ETag ของคำขอ GET (อ่านเวอร์ชันก่อน query เสมอ → ถ้ามีการเขียนระหว่างนั้น ครั้งหน้าจะไม่ตรง)"""
+    bucket = int(time.time() // ETAG_MAX_AGE) if ETAG_MAX_AGE > 0 else 0
+    if isinstance(query_string, str):
+        query_string = query_string.encode("utf-8")
+    digest = hashlib.blake2b(repr(key).encode("utf-8") + b"?" + query_string, digest_size=8).hexdigest()
+    return f'W/"{change_feed.EPOCH}.{bucket:x}.{versions.get(key):x}.{digest}"'
+
+
+def matches(if_none_match, tag):
+    """เทียบ header If-None-Match กับ ETag (weak comparison ตาม RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = tag[2:] if tag.startswith("W/") else tag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
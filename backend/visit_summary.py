@@ -0,0 +1,151 @@
+"""
+ตารางสรุปต่อคนไข้ (patient_visit_summary): มาล่าสุดเมื่อไหร่ / มากี่ครั้ง / วินิจฉัยล่าสุด / ยอดค้างชำระ
+
+แทนการ JOIN treatment + GROUP BY ทุกครั้งที่เปิดรายชื่อคนไข้
+record_paid รับ cursor ของ transaction ที่กำลังทำอยู่ (ไม่ commit เอง)
+
+ใช้จาก command line:
+  python visit_summary.py backfill   คำนวณใหม่จาก treatment / payment ทั้งหมด
+  python visit_summary.py verify     เทียบกับค่าที่คำนวณสด แสดงคนไข้ที่ไม่ตรง
+"""
+import sys
+
+from db import get_db
+
+# คำนวณสดจากตารางจริง ใช้ทั้งตอน backfill และ verify
+_AGGREGATE_SQL = """
+    SELECT
+      p.patient_id,
+      tv.last_visit,
+      COALESCE(tv.visit_count, 0) AS visit_count,
+      (SELECT t2.diagnosis
+         FROM treatment t2
+        WHERE t2.patient_id = p.patient_id
+        ORDER BY t2.treatment_date DESC, t2.treatment_id DESC
+        LIMIT 1) AS last_diagnosis,
+      COALESCE(pu.unpaid_balance, 0) AS unpaid_balance,
+      COALESCE(pu.unpaid_count, 0) AS unpaid_count
+    FROM patient p
+    LEFT JOIN (
+      SELECT patient_id, MAX(treatment_date) AS last_visit, COUNT(*) AS visit_count
+      FROM treatment
+      GROUP BY patient_id
+    ) tv ON tv.patient_id = p.patient_id
+    LEFT JOIN (
+      SELECT patient_id, SUM(amount) AS unpaid_balance, COUNT(*) AS unpaid_count
+      FROM payment
+      WHERE status = 'unpaid'
+      GROUP BY patient_id
+    ) pu ON pu.patient_id = p.patient_id
+"""
+
+
+# SQL แยกไว้ให้ flow แบบ async (flows.py / payment_settlement.py) ใช้ชุดเดียวกัน
+# การมารักษา + รายการค้างชำระใหม่ในคำสั่งเดียว (POST /treatments) — ส่ง unpaid_count = 0 ถ้าไม่ได้สร้าง payment ใหม่
+# MySQL ประเมิน SET ซ้ายไปขวา → ต้องอัปเดต last_diagnosis ก่อน last_visit
+TREATMENT_SQL = """
+    INSERT INTO patient_visit_summary
+      (patient_id, last_visit, visit_count, last_diagnosis, unpaid_balance, unpaid_count)
+    VALUES (%s, %s, 1, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+      last_diagnosis = IF(last_visit IS NULL OR VALUES(last_visit) >= last_visit,
+                          VALUES(last_diagnosis), last_diagnosis),
+      last_visit     = IF(last_visit IS NULL OR VALUES(last_visit) >= last_visit,
+                          VALUES(last_visit), last_visit),
+      visit_count    = visit_count + 1,
+      unpaid_balance = unpaid_balance + VALUES(unpaid_balance),
+      unpaid_count   = unpaid_count + VALUES(unpaid_count)
+"""
+
+PAID_SQL = """
+    UPDATE patient_visit_summary
+    SET unpaid_balance = unpaid_balance - %s,
+        unpaid_count   = GREATEST(unpaid_count - %s, 0)
+    WHERE patient_id = %s
+"""
+
+
+def record_paid(cur, patient_id, unpaid_amount, count=1):
+    """รายการที่เคยค้าง count รายการ (ยอดรวม unpaid_amount) ถูกชำระแล้ว"""
+    cur.execute(PAID_SQL, (unpaid_amount, count, patient_id))
+
+
+def backfill():
+    """คำนวณตารางสรุปใหม่ทั้งหมด คืนจำนวนแถวที่เขียน"""
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        conn.start_transaction()
+        cur.execute(f"""
+            INSERT INTO patient_visit_summary
+              (patient_id, last_visit, visit_count, last_diagnosis, unpaid_balance, unpaid_count)
+            SELECT * FROM ({_AGGREGATE_SQL}) agg
+            ON DUPLICATE KEY UPDATE
+              last_visit     = VALUES(last_visit),
+              visit_count    = VALUES(visit_count),
+              last_diagnosis = VALUES(last_diagnosis),
+              unpaid_balance = VALUES(unpaid_balance),
+              unpaid_count   = VALUES(unpaid_count)
+        """)
+        written = cur.rowcount
+        conn.commit()
+        return written
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def verify():
+    """คืนรายการ (patient_id, ค่าที่คำนวณสด, ค่าในตารางสรุป) ที่ไม่ตรงกัน"""
+    conn = get_db()
+    cur = conn.cursor(dictionary=True)
+    try:
+        cur.execute(f"""
+            SELECT
+              agg.*,
+              s.patient_id     AS s_patient_id,
+              s.last_visit     AS s_last_visit,
+              s.visit_count    AS s_visit_count,
+              s.last_diagnosis AS s_last_diagnosis,
+              s.unpaid_balance AS s_unpaid_balance,
+              s.unpaid_count   AS s_unpaid_count
+            FROM ({_AGGREGATE_SQL}) agg
+            LEFT JOIN patient_visit_summary s ON s.patient_id = agg.patient_id
+        """)
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+    columns = ("last_visit", "visit_count", "last_diagnosis", "unpaid_balance", "unpaid_count")
+    mismatches = []
+    for r in rows:
+        expected = {c: r[c] for c in columns}
+        if r["s_patient_id"] is None:
+            # ไม่มีแถวสรุป ถือว่าถูกถ้าคนไข้ยังไม่เคยมีข้อมูลเลย
+            if r["visit_count"] == 0 and r["unpaid_count"] == 0:
+                continue
+            mismatches.append((r["patient_id"], expected, None))
+            continue
+        actual = {c: r["s_" + c] for c in columns}
+        if expected != actual:
+            mismatches.append((r["patient_id"], expected, actual))
+    return mismatches
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "backfill":
+        print(f">>> เขียนตารางสรุปแล้ว ({backfill()} rows affected)")
+    elif command == "verify":
+        bad = verify()
+        for patient_id, expected, actual in bad:
+            print(f"patient {patient_id}: expected={expected} actual={actual}")
+        print(f">>> ไม่ตรง {len(bad)} คน")
+        sys.exit(1 if bad else 0)
+    else:
+        print("usage: python visit_summary.py backfill|verify")
+        sys.exit(2)
@@ -0,0 +1,253 @@
+"""
+ตารางเวลาออกตรวจของแพทย์ (เทมเพลตรายสัปดาห์ + ข้อยกเว้นรายวัน) อ่านจาก DB
+
+ดูโครงสร้างตารางที่ sql/doctor_schedule.sql (สร้างด้วย python migrations.py up)
+เทมเพลตจะถูก compile ครั้งเดียวเป็น DayPlan (bitmap ช่องเวลาที่เปิดตรวจ) แล้ว cache ไว้
+ทั้ง availability และการตรวจชนคิวอ่านจาก DayPlan โดยตรง ไม่ต้อง parse เวลาใหม่ทุกคำขอ
+
+หมอที่ยังไม่มีเทมเพลตใช้ค่าเริ่มต้น 09:00–17:15 ทุกวัน ช่องละ 15 นาที (คิวสุดท้าย 17:00 เหมือนเดิม)
+"""
+import os
+import threading
+import time as _time
+
+from db import get_db
+from schedule_index import to_date, to_minutes, format_minutes
+
+DEFAULT_START = 9 * 60
+DEFAULT_END = 17 * 60 + 15
+DEFAULT_SLOT = 15
+
+# โหลดเทมเพลตใหม่ทุก ๆ กี่วินาที (เผื่อแก้จาก process อื่น), 0 = โหลดครั้งเดียว
+REFRESH_SECONDS = float(os.getenv("WORKING_HOURS_TTL", "300"))
+
+ER_NO_SUCH_TABLE = 1146
+
+
+class DayPlan:
+    """
+    ช่องเวลาของหนึ่งวัน: ช่องที่ i เริ่มที่ start + i*step
+    open_mask bit i = 1 ถ้าช่องนั้นอยู่ในช่วงออกตรวจทั้งช่อง และไม่ทับช่วงพัก
+    """
+
+    def __init__(self, windows, breaks=(), step=DEFAULT_SLOT):
+        self.step = int(step)
+        windows = [(s, e) for s, e in windows if e > s]
+        if not windows:
+            self.start = 0
+            self.size = 0
+            self.open_mask = 0
+            self.labels = []
+            return
+
+        self.start = min(s for s, _ in windows)
+        end = max(e for _, e in windows)
+        self.size = (end - self.start) // self.step
+        self.labels = [format_minutes(self.start + i * self.step) for i in range(self.size)]
+
+        mask = 0
+        for i in range(self.size):
+            s = self.start + i * self.step
+            e = s + self.step
+            if not any(ws <= s and e <= we for ws, we in windows):
+                continue
+            if any(bs < e and s < be for bs, be in breaks):
+                continue
+            mask |= 1 << i
+        self.open_mask = mask
+
+    def slot_of(self, minute):
+        i = (minute - self.start) // self.step
+        return i if 0 <= i < self.size and minute >= self.start else None
+
+    def is_open(self, minute):
+        i = self.slot_of(minute)
+        return i is not None and bool(self.open_mask >> i & 1)
+
+    def busy_mask(self, minutes, gap=None):
+        """bitmap ของช่องที่ชนกับนัดใน minutes (|ช่อง - นัด| < gap, ค่าเริ่มต้น gap = ความยาวช่อง)"""
+        gap = self.step if gap is None else gap
+        mask = 0
+        for m in minutes:
+            lo = -(-(m - gap + 1 - self.start) // self.step)      # ceil
+            hi = (m + gap - 1 - self.start) // self.step           # floor
+            lo = max(lo, 0)
+            hi = min(hi, self.size - 1)
+            if lo <= hi:
+                mask |= ((1 << (hi - lo + 1)) - 1) << lo
+        return mask
+
+    def free_mask(self, minutes, gap=None):
+        return self.open_mask & ~self.busy_mask(minutes, gap)
+
+    def labels_of(self, mask):
+        out = []
+        while mask:
+            low = mask & -mask
+            out.append(self.labels[low.bit_length() - 1])
+            mask ^= low
+        return out
+
+    def nearest(self, mask, minute):
+        """ช่องใน mask ที่ใกล้ minute ที่สุด → 'HH:MM' หรือ None"""
+        best = None
+        while mask:
+            low = mask & -mask
+            i = low.bit_length() - 1
+            dist = abs(self.start + i * self.step - minute)
+            if best is None or dist < best[0]:
+                best = (dist, i)
+            mask ^= low
+        return self.labels[best[1]] if best else None
+
+
+DEFAULT_PLAN = DayPlan([(DEFAULT_START, DEFAULT_END)], step=DEFAULT_SLOT)
+
+
+class WorkingHours:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._weekly = {}       # doctor_id -> {weekday: DayPlan}
+        self._steps = {}        # doctor_id -> slot_minutes
+        self._exceptions = {}   # date -> [(doctor_id|None, kind, start, end)]
+        self._dated = {}        # (doctor_id, date) -> DayPlan ที่รวมข้อยกเว้นแล้ว
+        self._loaded_at = None
+        self._listeners = []    # เรียกทุกครั้งที่ invalidate (serve.py ใช้บอก worker อื่น)
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    # ---------- โหลด / ล้าง cache ----------
+    def _fetch(self, cur, sql):
+        try:
+            cur.execute(sql)
+            return cur.fetchall()
+        except Exception as e:
+            if getattr(e, "errno", None) == ER_NO_SUCH_TABLE:
+                return []
+            raise
+
+    def reload(self):
+        conn = get_db()
+        cur = conn.cursor(dictionary=True)
+        try:
+            templates = self._fetch(cur, """
+                SELECT doctor_id, weekday, start_time, end_time, kind, slot_minutes
+                FROM doctor_schedule
+            """)
+            exceptions = self._fetch(cur, """
+                SELECT doctor_id, exception_date, kind, start_time, end_time
+                FROM doctor_schedule_exception
+            """)
+        finally:
+            cur.close()
+            conn.close()
+
+        raw = {}
+        steps = {}
+        for r in templates:
+            doctor_id = int(r["doctor_id"])
+            day = raw.setdefault(doctor_id, {}).setdefault(int(r["weekday"]), ([], []))
+            span = (to_minutes(r["start_time"]), to_minutes(r["end_time"]))
+            (day[1] if r["kind"] == "break" else day[0]).append(span)
+            if r["kind"] != "break":
+                steps.setdefault(doctor_id, int(r["slot_minutes"] or DEFAULT_SLOT))
+
+        weekly = {}
+        for doctor_id, days in raw.items():
+            step = steps.get(doctor_id, DEFAULT_SLOT)
+            weekly[doctor_id] = {wd: DayPlan(w, b, step) for wd, (w, b) in days.items()}
+
+        exc = {}
+        for r in exceptions:
+            start = to_minutes(r["start_time"]) if r["start_time"] is not None else None
+            end = to_minutes(r["end_time"]) if r["end_time"] is not None else None
+            doctor_id = int(r["doctor_id"]) if r["doctor_id"] is not None else None
+            exc.setdefault(to_date(r["exception_date"]), []).append((doctor_id, r["kind"], start, end))
+
+        self._weekly = weekly
+        self._steps = steps
+        self._exceptions = exc
+        self._dated = {}
+        self._loaded_at = _time.monotonic()
+
+    def ensure_loaded(self):
+        loaded_at = self._loaded_at
+        if loaded_at is not None and (REFRESH_SECONDS <= 0 or _time.monotonic() - loaded_at < REFRESH_SECONDS):
+            return
+        with self._lock:
+            if self._loaded_at == loaded_at:
+                self.reload()
+
+    def invalidate(self):
+        """เรียกหลังแก้ตารางเวลาใน DB ให้โหลดใหม่ตอนใช้ครั้งถัดไป"""
+        self._loaded_at = None
+        for fn in self._listeners:
+            try:
+                fn()
+            except Exception as e:
+                print("working_hours listener error:", e)
+
+    # ---------- ใช้จาก route ----------
+    def slot_minutes(self, doctor_id):
+        self.ensure_loaded()
+        return self._steps.get(int(doctor_id), DEFAULT_SLOT)
+
+    def plan_for(self, doctor_id, day):
+        """DayPlan ของหมอในวันนั้น (เทมเพลต + ข้อยกเว้น)"""
+        self.ensure_loaded()
+        doctor_id, day = int(doctor_id), to_date(day)
+
+        plan = self._dated.get((doctor_id, day))
+        if plan is not None:
+            return plan
+
+        weekly = self._weekly.get(doctor_id)
+        base = DEFAULT_PLAN if weekly is None else weekly.get(day.weekday(), None)
+        rules = [e for e in self._exceptions.get(day, ()) if e[0] is None or e[0] == doctor_id]
+        if not rules:
+            return base if base is not None else _closed(self.slot_minutes(doctor_id))
+
+        plan = self._compile_exceptions(doctor_id, day, rules)
+        self._dated[(doctor_id, day)] = plan
+        return plan
+
+    def _compile_exceptions(self, doctor_id, day, rules):
+        step = self.slot_minutes(doctor_id)
+        extra = [(s, e) for _, kind, s, e in rules if kind == "work" and s is not None and e is not None]
+        if extra:
+            windows, breaks = extra, []
+        elif doctor_id in self._weekly:
+            windows, breaks = self._template_spans(doctor_id, day.weekday())
+        else:
+            windows, breaks = [(DEFAULT_START, DEFAULT_END)], []
+
+        for _, kind, s, e in rules:
+            if kind != "off":
+                continue
+            if s is None or e is None:
+                return _closed(step)
+            breaks = breaks + [(s, e)]
+        return DayPlan(windows, breaks, step)
+
+    def _template_spans(self, doctor_id, weekday):
+        plan = self._weekly[doctor_id].get(weekday)
+        if plan is None:
+            return [], []
+        # ดึงช่วงที่เปิดกลับมาจาก open_mask (รวมช่องติดกันเป็นช่วงเดียว)
+        spans = []
+        for i in range(plan.size):
+            if plan.open_mask >> i & 1:
+                s = plan.start + i * plan.step
+                if spans and spans[-1][1] == s:
+                    spans[-1] = (spans[-1][0], s + plan.step)
+                else:
+                    spans.append((s, s + plan.step))
+        return spans, []
+
+
+def _closed(step):
+    return DayPlan([], step=step)
+
+
+hours = WorkingHours()
@@ -2,6 +2,49 @@ import React, { useState, useEffect } from 'react';
 import { User, FileText, Calendar, DollarSign, Users, Activity, ClipboardList, Printer, LogOut, Lock, Search } from 'lucide-react';
 
 const API = 'http://127.0.0.1:5000';
+const PAGE_LIMIT = 500; // = MAX_LIMIT ของ backend (pagination.py)
+
+// คอลัมน์ของ /patients ที่แต่ละหน้าจอแสดง (?fields=) — รายการแบบการ์ด/ตาราง กับ dropdown เลือกผู้ป่วย
+const PATIENT_CARD_FIELDS = 'id,name,hn,age,tel,lastVisit';
+const PATIENT_OPTION_FIELDS = 'id,name,hn';
+
+// list endpoint แบ่งหน้าเสมอ → ขอทีละ PAGE_LIMIT แถวแล้วตาม next_cursor จนครบ
+const fetchAllPages = async (path, errorMessage, fields) => {
+  const rows = [];
+  let cursor = null;
+  do {
+    const sep = path.includes('?') ? '&' : '?';
+    const query = `limit=${PAGE_LIMIT}`
+      + (fields ? `&fields=${fields}` : '')
+      + (cursor ? `&cursor=${encodeURIComponent(cursor)}` : '');
+    const res = await fetch(`${API}${path}${sep}${query}`);
+    const json = await res.json();
+    if (!res.ok || json.status !== 'success') throw new Error(json.message || errorMessage);
+    rows.push(...(json.data || []));
+    cursor = json.next_cursor;
+  } while (cursor);
+  return rows;
+};
+
+// รายชื่อผู้ป่วยทั้งหมดเฉพาะคอลัมน์ fields — โหลดครั้งแรกที่ enabled (แท็บที่ใช้ถูกเปิด)
+const usePatientList = (fields, enabled) => {
+  const [rows, setRows] = useState(null); // null = ยังไม่โหลด
+  const [error, setError] = useState('');
+  const [started, setStarted] = useState(false);
+
+  useEffect(() => {
+    if (!enabled || started) return;
+    setStarted(true);
+    fetchAllPages('/patients', 'โหลดรายชื่อผู้ป่วยไม่สำเร็จ', fields)
+      .then(setRows)
+      .catch((err) => {
+        setError(err.message || 'เชื่อมต่อเซิร์ฟเวอร์ไม่ได้');
+        setRows([]);
+      });
+  }, [fields, enabled, started]);
+
+  return { rows: rows || [], setRows, loaded: rows !== null, loading: enabled && rows === null, error };
+};
 
 /* --------------------------- Login --------------------------- */
 const Login = ({ onLogin }) => {
@@ -123,26 +166,14 @@ const DoctorDashboard = ({ onLogout, userData }) => {
   const [selectedPatient, setSelectedPatient] = useState(null);
   const [searchTerm, setSearchTerm] = useState('');
 
-  // Patients
-  const [patients, setPatients] = useState([]);
-  const [loadingPatients, setLoadingPatients] = useState(true);
-  const [patientsError, setPatientsError] = useState('');
-
-  useEffect(() => {
-    const load = async () => {
-      try {
-        const res = await fetch(`${API}/patients`);
-        const json = await res.json();
-        if (!res.ok) throw new Error(json.message || 'โหลดรายชื่อผู้ป่วยไม่สำเร็จ');
-        setPatients(json.data || []);
-      } catch (err) {
-        setPatientsError(err.message || 'เชื่อมต่อเซิร์ฟเวอร์ไม่ได้');
-      } finally {
-        setLoadingPatients(false);
-      }
-    };
-    load();
-  }, []);
+  // Patients — แท็บเวชระเบียนใช้คอลัมน์ของการ์ด แท็บอื่นใช้แค่ dropdown (โหลดครั้งแรกที่เปิดแท็บ)
+  const patientCards = usePatientList(PATIENT_CARD_FIELDS, activeTab === 'records');
+  const patientPicks = usePatientList(PATIENT_OPTION_FIELDS, activeTab !== 'records' && !patientCards.loaded);
+  const patients = patientCards.rows;
+  const loadingPatients = patientCards.loading;
+  const patientsError = patientCards.error;
+  // โหลดการ์ดไว้แล้วก็ใช้เป็น dropdown ได้เลย ไม่ต้องดึงซ้ำ
+  const patientOptions = patientCards.loaded ? patientCards.rows : patientPicks.rows;
 
   // Records (fetch-on-demand + cache)
   const [recordsByPatient, setRecordsByPatient] = useState({});
@@ -154,10 +185,8 @@ const DoctorDashboard = ({ onLogout, userData }) => {
     try {
       setRecordsErrorByPatient((x) => ({ ...x, [pid]: '' }));
       setLoadingRecordsId(pid);
-      const res = await fetch(`${API}/patients/${pid}/records`);
-      const json = await res.json();
-      if (!res.ok || json.status !== 'success') throw new Error(json.message || 'โหลดเวชระเบียนไม่สำเร็จ');
-      setRecordsByPatient((prev) => ({ ...prev, [pid]: json.data || [] }));
+      const rows = await fetchAllPages(`/patients/${pid}/records`, 'โหลดเวชระเบียนไม่สำเร็จ');
+      setRecordsByPatient((prev) => ({ ...prev, [pid]: rows }));
     } catch (err) {
       setRecordsErrorByPatient((x) => ({ ...x, [pid]: err.message || 'เกิดข้อผิดพลาด' }));
     } finally {
@@ -198,7 +227,7 @@ const DoctorDashboard = ({ onLogout, userData }) => {
     if (!formData.treatmentPatient || !formData.treatmentDiagnosis || !formData.treatmentPlan) {
       alert('กรุณากรอกข้อมูลให้ครบถ้วน'); return;
     }
-    const patient = patients.find((p) => p.id === parseInt(formData.treatmentPatient, 10));
+    const patient = patientOptions.find((p) => p.id === parseInt(formData.treatmentPatient, 10));
     const newRecord = {
       id: medicalRecords.length + 1,
       patientId: patient.id,
@@ -222,7 +251,7 @@ const DoctorDashboard = ({ onLogout, userData }) => {
   const handleAddLabResult = (e) => {
     e.preventDefault();
     if (!formData.labPatient || !formData.labResult) { alert('กรุณากรอกข้อมูลให้ครบถ้วน'); return; }
-    const patient = patients.find((p) => p.id === parseInt(formData.labPatient, 10));
+    const patient = patientOptions.find((p) => p.id === parseInt(formData.labPatient, 10));
     const newLab = {
       id: labResults.length + 1,
       patientId: patient.id,
@@ -381,7 +410,7 @@ const DoctorDashboard = ({ onLogout, userData }) => {
                   required
                 >
                   <option value="">เลือกผู้ป่วย...</option>
-                  {patients.map((p) => (
+                  {patientOptions.map((p) => (
                     <option key={p.id} value={p.id}>{p.name} ({p.hn})</option>
                   ))}
                 </select>
@@ -438,7 +467,7 @@ const DoctorDashboard = ({ onLogout, userData }) => {
                   required
                 >
                   <option value="">เลือกผู้ป่วย...</option>
-                  {patients.map((p) => (
+                  {patientOptions.map((p) => (
                     <option key={p.id} value={p.id}>{p.name} ({p.hn})</option>
                   ))}
                 </select>
@@ -510,7 +539,7 @@ const DoctorDashboard = ({ onLogout, userData }) => {
                       required
                     >
                       <option value="">เลือกผู้ป่วย...</option>
-                      {patients.map((p) => (
+                      {patientOptions.map((p) => (
                         <option key={p.id} value={p.id}>{p.name} ({p.hn})</option>
                       ))}
                     </select>
@@ -552,7 +581,7 @@ const DoctorDashboard = ({ onLogout, userData }) => {
                 {filteredLabs.map((lab) => (
                   <div key={lab.id} className="border rounded-lg p-4">
                     <h3 className="font-bold text-lg mb-3">
-                      {lab.patientName} ({patients.find((p) => p.id === lab.patientId)?.hn})
+                      {lab.patientName} ({patientOptions.find((p) => p.id === lab.patientId)?.hn})
                     </h3>
                     <div className="bg-blue-50 p-4 rounded-lg">
                       <p className="font-medium mb-2">{lab.testType} - {lab.date}</p>
@@ -613,25 +642,14 @@ const StaffDashboard = ({ onLogout, userData }) => {
   const [activeTab, setActiveTab] = useState('patients');
   const [searchTerm, setSearchTerm] = useState('');
 
-  const [patients, setPatients] = useState([]);
-  const [loadingPatients, setLoadingPatients] = useState(true);
-  const [patientsError, setPatientsError] = useState('');
-
-  useEffect(() => {
-    const load = async () => {
-      try {
-        const res = await fetch(`${API}/patients`);
-        const json = await res.json();
-        if (!res.ok) throw new Error(json.message || 'โหลดรายชื่อผู้ป่วยไม่สำเร็จ');
-        setPatients(json.data || []);
-      } catch (err) {
-        setPatientsError(err.message || 'เชื่อมต่อเซิร์ฟเวอร์ไม่ได้');
-      } finally {
-        setLoadingPatients(false);
-      }
-    };
-    load();
-  }, []);
+  // ทะเบียนผู้ป่วยใช้คอลัมน์ของตาราง แท็บนัดหมาย / ชำระเงินใช้แค่ dropdown (โหลดครั้งแรกที่เปิดแท็บ)
+  const patientCards = usePatientList(PATIENT_CARD_FIELDS, activeTab === 'patients');
+  const patientPicks = usePatientList(PATIENT_OPTION_FIELDS, activeTab !== 'patients' && !patientCards.loaded);
+  const patients = patientCards.rows;
+  const setPatients = patientCards.setRows;
+  const loadingPatients = patientCards.loading;
+  const patientsError = patientCards.error;
+  const patientOptions = patientCards.loaded ? patientCards.rows : patientPicks.rows;
 
   const [appointments, setAppointments] = useState([
     { id: 1, patientName: 'สมชาย ใจดี', date: '2025-10-20', time: '09:00', type: 'ตรวจรักษาทั่วไป', status: 'รอพบแพทย์' },
@@ -862,7 +880,7 @@ const StaffDashboard = ({ onLogout, userData }) => {
                 <form onSubmit={handleAddAppointment} className="grid grid-cols-2 gap-4">
                   <select value={formData.appointPatient} onChange={(e) => handleFormChange('appointPatient', e.target.value)} className="border rounded-lg px-4 py-2" required>
                     <option value="">เลือกผู้ป่วย *</option>
-                    {patients.map((p) => <option key={p.id} value={p.name}>{p.name} ({p.hn})</option>)}
+                    {patientOptions.map((p) => <option key={p.id} value={p.name}>{p.name} ({p.hn})</option>)}
                   </select>
                   <select value={formData.appointType} onChange={(e) => handleFormChange('appointType', e.target.value)} className="border rounded-lg px-4 py-2">
                     <option>ตรวจรักษาทั่วไป</option>
@@ -910,7 +928,7 @@ const StaffDashboard = ({ onLogout, userData }) => {
                 <form onSubmit={handleAddPayment} className="space-y-4">
                   <select value={formData.paymentPatient} onChange={(e) => handleFormChange('paymentPatient', e.target.value)} className="w-full border rounded-lg px-4 py-2" required>
                     <option value="">เลือกผู้ป่วย *</option>
-                    {patients.map((p) => <option key={p.id} value={p.name}>{p.name} ({p.hn})</option>)}
+                    {patientOptions.map((p) => <option key={p.id} value={p.name}>{p.name} ({p.hn})</option>)}
                   </select>
                   <select value={formData.paymentService} onChange={(e) => handleFormChange('paymentService', e.target.value)} className="w-full border rounded-lg px-4 py-2">
                     <option>ตรวจรักษาทั่วไป</option>